@@ -114,6 +114,7 @@ function RecommendPage() {
                     
                     <div className="rec-content">
                       <h3 className="rec-product">{rec.product_id}</h3>
+                      {rec.category && <p className="rec-category">{rec.category}</p>}
                       
                       <div className="rec-details">
                         <div className="detail">
@@ -16,20 +16,27 @@ function TrainPage() {
     setTrainProgress(0);
 
     try {
-      // Simulate progress
-      const progressInterval = setInterval(() => {
-        setTrainProgress((prev) => {
-          if (prev >= 90) {
-            clearInterval(progressInterval);
-            return prev;
-          }
-          return prev + Math.random() * 30;
-        });
-      }, 300);
+      // Training runs as a background job; poll its status until it finishes
+      let response;
+      try {
+        response = await axios.post('http://127.0.0.1:8000/api/train/');
+      } catch (err) {
+        if (err.response?.status !== 409) throw err;
+        response = err.response;  // Follow the job that is already running
+      }
+      const statusUrl = `http://127.0.0.1:8000/api/train/${response.data.job_id}/`;
+
+      let job;
+      do {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await axios.get(statusUrl)).data;
+        setTrainProgress(job.progress * 100);
+      } while (job.status === 'queued' || job.status === 'running');
+
+      if (job.status === 'failed') {
+        throw new Error(job.error);
+      }
 
-      const response = await axios.post('http://127.0.0.1:8000/api/train/');
-      
-      clearInterval(progressInterval);
       setTrainProgress(100);
       setMessage('✅ Models trained successfully! Your AI models are ready to make recommendations.');
       
@@ -122,4 +122,21 @@ STATIC_URL = 'static/'
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Recommendation response cache.
+# BACKEND 'local' keeps an in-process LRU of MAX_ENTRIES responses; any other
+# value names a cache alias in CACHES (e.g. a shared Redis or memcached cache).
+# TTL is in seconds, or None to keep responses until the model or data changes.
+
+RECOMMENDATION_CACHE = {
+    'BACKEND': 'local',
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,
+}
+
+# Estimator family trained by POST /api/train: 'random_forest', 'shallow_forest',
+# 'hist_gradient_boosting' or 'logistic_regression' (see src/models.py BACKENDS).
+# Compare them with `python -m harvestiq.src.compare_backends`.
+
+MODEL_BACKEND = 'random_forest'
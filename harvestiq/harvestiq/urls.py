@@ -16,8 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from recommender.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('recommender.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class RecommenderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'recommender'
\ No newline at end of file
+    name = 'recommender'
+
+    def ready(self):
+        from . import catalog  # noqa: F401  Connects the Product change signals
\ No newline at end of file
@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_CACHE_SETTINGS = {
+    'BACKEND': 'local',   # 'local' for the in-process LRU, or a Django cache alias from CACHES
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,           # Seconds; None keeps entries until evicted or invalidated
+}
+
+def cache_key(customer_id, model_version, data_version):
+    """
+    Build the cache key of one recommendation response.
+
+    The customer ID comes from the URL, so the key is hashed to stay valid for
+    every cache backend (memcached rejects spaces and long keys).
+    """
+    raw = f'{customer_id}\x00{model_version}\x00{data_version}'
+    return 'harvestiq:recommend:' + hashlib.sha1(raw.encode()).hexdigest()
+
+class LocalRecommendationCache:
+    """
+    In-process LRU cache of recommendation responses with an optional TTL.
+
+    Entries are keyed by customer, model version and data version, so a new
+    model or new transactions never return a stale response. The first lookup
+    under a new (model version, data version) pair also drops every older
+    entry at once instead of waiting for them to be evicted.
+    """
+
+    def __init__(self, max_entries=10000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _check_generation(self, model_version, data_version):
+        generation = (model_version, data_version)
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, customer_id, model_version, data_version):
+        """
+        Return the cached response, or None on a miss.
+
+        Parameters:
+        - customer_id: Customer ID
+        - model_version: Version of the models serving the request
+        - data_version: Version of the transaction data
+
+        Returns:
+        - dict or None: Cached response body
+        """
+        key = cache_key(customer_id, model_version, data_version)
+        with self._lock:
+            self._check_generation(model_version, data_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, customer_id, model_version, data_version, response):
+        """
+        Store a response, evicting the least recently used entries beyond max_entries.
+
+        Parameters:
+        - customer_id: Customer ID
+        - model_version: Version of the models that produced the response
+        - data_version: Version of the transaction data it was computed from
+        - response: Response body
+        """
+        key = cache_key(customer_id, model_version, data_version)
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._check_generation(model_version, data_version)
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached response."""
+        with self._lock:
+            self._entries.clear()
+
+class DjangoRecommendationCache:
+    """
+    Recommendation cache stored in one of Django's configured caches.
+
+    Size limits and eviction are those of the backend (LocMemCache evicts least
+    recently used entries beyond OPTIONS['MAX_ENTRIES']). Responses of older
+    model or data versions are never looked up again and expire with the TTL.
+    """
+
+    def __init__(self, alias='default', ttl=None):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def _cache(self):
+        # caches[...] returns a per-thread connection
+        return caches[self.alias]
+
+    def get(self, customer_id, model_version, data_version):
+        return self._cache.get(cache_key(customer_id, model_version, data_version))
+
+    def set(self, customer_id, model_version, data_version, response):
+        self._cache.set(cache_key(customer_id, model_version, data_version), response, timeout=self.ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+def create_recommendation_cache(config=None):
+    """
+    Create the cache described by a RECOMMENDATION_CACHE-style dict.
+
+    Parameters:
+    - config: Keys BACKEND, MAX_ENTRIES and TTL (default: settings.RECOMMENDATION_CACHE)
+
+    Returns:
+    - LocalRecommendationCache or DjangoRecommendationCache
+    """
+    if config is None:
+        config = getattr(settings, 'RECOMMENDATION_CACHE', {})
+    config = {**DEFAULT_CACHE_SETTINGS, **config}
+    if config['BACKEND'] == 'local':
+        return LocalRecommendationCache(max_entries=config['MAX_ENTRIES'], ttl=config['TTL'])
+    return DjangoRecommendationCache(alias=config['BACKEND'], ttl=config['TTL'])
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_recommendation_cache():
+    """Return the recommendation cache shared by all requests in this process."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_recommendation_cache()
+    return _cache
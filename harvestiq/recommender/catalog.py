@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+import pandas as pd
+from django.db import DatabaseError
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from src.catalog import ProductCatalog
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Transaction columns the catalog is derived from
+CATALOG_COLUMNS = ['product_id', 'product_category', 'purchase_date', 'surplus_flag']
+
+class CatalogProvider:
+    """
+    Process-wide product catalog, rebuilt only when its inputs change.
+
+    Surplus ratios (and fallback categories and flags) come from the
+    transactions and are recomputed when the data version changes. Product
+    rows then override category and surplus flag. Saving or deleting a Product
+    in this process invalidates the catalog immediately; changes made by other
+    processes are noticed within check_interval seconds.
+    """
+
+    def __init__(self, check_interval=30.0):
+        self.check_interval = check_interval
+        self._catalog = None
+        self._base = None
+        self._data_version = None
+        self._products_version = None
+        self._last_check = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _current_products_version(self):
+        try:
+            state = Product.objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+        except DatabaseError:
+            return None  # Product table not created; the catalog comes from transactions only
+        return f"{state['count']}-{state['updated'].isoformat() if state['updated'] else 0}"
+
+    def _load_products(self):
+        try:
+            return pd.DataFrame.from_records(
+                Product.objects.values_list('product_id', 'category', 'surplus_flag'),
+                columns=['product_id', 'category', 'surplus_flag'])
+        except DatabaseError:
+            return pd.DataFrame(columns=['product_id', 'category', 'surplus_flag'])
+
+    def get(self, data_version, load_history):
+        """
+        Return the catalog for the given transaction data.
+
+        Parameters:
+        - data_version: Version of the transaction data
+        - load_history: Callable returning transactions with CATALOG_COLUMNS,
+          only called when the data version changed
+
+        Returns:
+        - ProductCatalog: Current catalog
+        """
+        now = time.monotonic()
+        catalog = self._catalog
+        stale = catalog is None or self._dirty or data_version != self._data_version
+        if not stale and now - self._last_check < self.check_interval:
+            return catalog
+
+        with self._lock:
+            self._last_check = now
+            products_version = self._current_products_version()
+            if (self._catalog is not None and not self._dirty and data_version == self._data_version
+                    and products_version == self._products_version):
+                return self._catalog
+
+            if self._base is None or data_version != self._data_version:
+                self._base = ProductCatalog.from_transactions(load_history(), version=data_version)
+                self._data_version = data_version
+            self._dirty = False
+            self._products_version = products_version
+            self._catalog = self._base.with_products(self._load_products(),
+                                                     version=f'{data_version}:{products_version}')
+            logger.info("Product catalog rebuilt with %d products", len(self._catalog))
+            return self._catalog
+
+    def invalidate(self):
+        """Rebuild the catalog on the next request."""
+        self._dirty = True
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_catalog_provider():
+    """Return the catalog provider shared by all requests in this process."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = CatalogProvider()
+    return _provider
+
+@receiver([post_save, post_delete], sender=Product)
+def _product_changed(sender, **kwargs):
+    get_catalog_provider().invalidate()
@@ -0,0 +1,175 @@
+import datetime
+import pandas as pd
+from django.db import connection
+from django.db.models import Avg, Count, IntegerField, Max, Min, Sum
+from django.db.models.functions import Cast
+from .models import Transaction
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+PAIR_COLUMNS = ['customer_id', 'product_id', 'cp_total_purchases', 'cp_avg_quantity', 'cp_purchase_count',
+                'cp_last_purchase_date', 'cp_recency_days', 'cp_days_since_first', 'cp_avg_interval',
+                'cp_last_month']
+CUSTOMER_COLUMNS = ['total_purchases', 'avg_quantity', 'num_unique_products', 'last_purchase_date', 'recency_days']
+PRODUCT_COLUMNS = ['product_total_sales', 'product_avg_price', 'product_surplus_ratio']
+
+def _aware(prediction_date):
+    """Treat a naive cutoff as UTC, the time zone transactions are stored in."""
+    prediction_date = pd.Timestamp(prediction_date)
+    if prediction_date.tzinfo is None:
+        prediction_date = prediction_date.tz_localize(datetime.timezone.utc)
+    return prediction_date.to_pydatetime()
+
+def _naive(values):
+    """
+    Database dates as naive UTC datetimes, like the transaction files.
+
+    SQLite returns the stored text, other backends aware datetimes.
+    """
+    return pd.to_datetime(pd.Series(values), utc=True, format='ISO8601').dt.tz_localize(None)
+
+def _fetch_chunks(queryset, chunk_size):
+    """
+    Run a values() queryset and yield its rows as DataFrames of at most chunk_size rows.
+
+    Rows are fetched through a chunked (server-side where supported) cursor and
+    converted column-wise, skipping the ORM's per-row conversion.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
+def _fetch(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    chunks = list(_fetch_chunks(queryset, chunk_size))
+    if not chunks:
+        sql_columns = list(queryset.query.values_select) + list(queryset.query.annotation_select)
+        return pd.DataFrame(columns=sql_columns)
+    return pd.concat(chunks, ignore_index=True)
+
+class DatabaseFeatureExtractor:
+    """
+    Builds the feature_engineering frame from the Transaction table.
+
+    The customer, product and customer-product aggregations run as GROUP BY
+    queries in the database; only their results are transferred. Pair rows
+    are fetched in chunks ordered by customer and product, so memory use
+    depends on the number of customers and products plus one chunk of pairs,
+    never on the number of transactions.
+    """
+
+    def __init__(self, queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.queryset = Transaction.objects.all() if queryset is None else queryset
+        self.chunk_size = chunk_size
+
+    def _history(self, prediction_date):
+        return self.queryset.filter(purchase_date__lte=_aware(prediction_date)).order_by()
+
+    def customer_features(self, prediction_date):
+        """
+        Customer-level features at prediction_date.
+
+        Parameters:
+        - prediction_date: Feature cutoff (naive dates are taken as UTC)
+
+        Returns:
+        - pd.DataFrame: One row per customer_id, sorted by customer_id
+        """
+        prediction_date = pd.Timestamp(prediction_date).tz_localize(None)
+        customers = _fetch(self._history(prediction_date).values('customer_id').annotate(
+            total_purchases=Sum('quantity'),
+            avg_quantity=Avg('quantity'),
+            num_unique_products=Count('product_id', distinct=True),
+            last_purchase_date=Max('purchase_date'),
+        ).order_by('customer_id'), self.chunk_size)
+        customers['avg_quantity'] = customers['avg_quantity'].astype('float64')
+        customers['last_purchase_date'] = _naive(customers['last_purchase_date'])
+        customers['recency_days'] = (prediction_date - customers['last_purchase_date']).dt.days
+        return customers
+
+    def product_features(self, prediction_date):
+        """
+        Product-level features at prediction_date, as product_level_features builds them.
+
+        Parameters:
+        - prediction_date: Feature cutoff (naive dates are taken as UTC)
+
+        Returns:
+        - pd.DataFrame: One row per product_id, sorted by product_id
+        """
+        products = _fetch(self._history(prediction_date).values('product_id').annotate(
+            product_total_sales=Sum('quantity'),
+            product_avg_price=Avg('price'),
+            product_surplus_ratio=Avg(Cast('surplus_flag', IntegerField())),
+        ).order_by('product_id'), self.chunk_size)
+        # Decimal on backends with a native numeric type
+        products['product_avg_price'] = products['product_avg_price'].astype('float64')
+        products['product_surplus_ratio'] = products['product_surplus_ratio'].astype('float64')
+        return products
+
+    def iter_features(self, prediction_date, product_features=None):
+        """
+        Yield the feature frame of feature_engineering in chunks of customer-product pairs.
+
+        Parameters:
+        - prediction_date: Feature cutoff (naive dates are taken as UTC)
+        - product_features: Precomputed product-level features (default: queried)
+
+        Yields:
+        - pd.DataFrame: Up to chunk_size feature rows, in (customer_id, product_id) order
+        """
+        cutoff = pd.Timestamp(prediction_date).tz_localize(None)
+        customers = self.customer_features(cutoff)
+        if product_features is None:
+            product_features = self.product_features(cutoff)
+        customer_index = pd.Index(customers['customer_id'])
+        product_index = pd.Index(product_features['product_id'])
+
+        pairs = self._history(cutoff).values('customer_id', 'product_id').annotate(
+            cp_total_purchases=Sum('quantity'),
+            cp_purchase_count=Count('pk'),
+            cp_first_purchase_date=Min('purchase_date'),
+            cp_last_purchase_date=Max('purchase_date'),
+        ).order_by('customer_id', 'product_id')
+
+        for features in _fetch_chunks(pairs, self.chunk_size):
+            first = _naive(features.pop('cp_first_purchase_date'))
+            features['cp_last_purchase_date'] = _naive(features['cp_last_purchase_date'])
+            features['cp_avg_quantity'] = features['cp_total_purchases'] / features['cp_purchase_count']
+            features['cp_recency_days'] = (cutoff - features['cp_last_purchase_date']).dt.days
+            features['cp_days_since_first'] = (features['cp_last_purchase_date'] - first).dt.days
+            features['cp_avg_interval'] = (
+                features['cp_days_since_first'] / (features['cp_purchase_count'] - 1)
+            ).where(features['cp_purchase_count'] > 1, 0.0)
+            features['cp_last_month'] = features['cp_last_purchase_date'].dt.month
+            features = features[PAIR_COLUMNS]
+
+            customer_rows = customer_index.get_indexer(features['customer_id'])
+            product_rows = product_index.get_indexer(features['product_id'])
+            joined = {col: customers[col].to_numpy()[customer_rows] for col in CUSTOMER_COLUMNS}
+            joined.update({col: product_features[col].to_numpy()[product_rows] for col in PRODUCT_COLUMNS})
+            features = pd.concat([features, pd.DataFrame(joined, index=features.index)], axis=1)
+
+            # Every pair has its customer and product in the history; kept for parity
+            yield features.fillna(0)
+
+    def to_features(self, prediction_date, product_features=None):
+        """
+        Build the whole feature frame; equal to feature_engineering on the same transactions.
+
+        Parameters:
+        - prediction_date: Feature cutoff (naive dates are taken as UTC)
+        - product_features: Precomputed product-level features (default: queried)
+
+        Returns:
+        - pd.DataFrame: Feature-engineered data
+        """
+        chunks = list(self.iter_features(prediction_date, product_features))
+        if not chunks:
+            raise ValueError("No transactions before the prediction date")
+        return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,282 @@
+import codecs
+import io
+import os
+import time
+from decimal import Decimal
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import pandas as pd
+from django.db import IntegrityError, connection, transaction
+from .models import Customer, Product, Transaction
+
+REQUIRED_COLUMNS = ['customer_id', 'product_id', 'purchase_date', 'quantity', 'price']
+OPTIONAL_COLUMNS = ['product_category', 'product_name', 'surplus_flag']
+
+# Transaction fields written by the ingestor, in insert order
+TRANSACTION_FIELDS = ['customer', 'product', 'quantity', 'purchase_date', 'price', 'surplus_flag']
+
+FORMATS = ('csv', 'ndjson')
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+def detect_format(name=None, content_type=None):
+    """
+    Guess the upload format from a file name or content type.
+
+    Parameters:
+    - name: File name, e.g. 'transactions.ndjson'
+    - content_type: MIME type, e.g. 'application/x-ndjson'
+
+    Returns:
+    - str: 'csv' or 'ndjson'
+    """
+    ext = os.path.splitext(name or '')[1].lower()
+    if ext in ('.ndjson', '.jsonl', '.json') or (content_type or '').endswith(('ndjson', 'jsonl', 'json')):
+        return 'ndjson'
+    return 'csv'
+
+def iter_chunks(source, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parse an upload incrementally into DataFrames of at most chunk_size rows.
+
+    Parameters:
+    - source: Path or binary/text file object
+    - fmt: 'csv' or 'ndjson'
+    - chunk_size: Rows per chunk
+
+    Yields:
+    - pd.DataFrame: Raw rows of one chunk
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if hasattr(source, 'read') and not isinstance(source, io.TextIOBase):
+        # pandas' JSON reader needs text; CSV accepts either
+        source = codecs.getreader('utf-8')(source) if fmt == 'ndjson' else source
+    if fmt == 'csv':
+        reader = pd.read_csv(source, chunksize=chunk_size,
+                             dtype={'customer_id': object, 'product_id': object, 'product_category': object})
+    else:
+        reader = pd.read_json(source, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+    with reader:
+        yield from reader
+
+def _parse_flags(values):
+    """Read surplus flags given as booleans, 0/1 or 'true'/'false' strings."""
+    if values.dtype == object:
+        return values.astype(str).str.strip().str.lower().isin(['1', 'true', 't', 'yes']).to_numpy()
+    return values.fillna(0).astype(bool).to_numpy()
+
+def _parse_dates(values):
+    """Parse purchase dates as aware UTC datetimes, each distinct value once."""
+    codes, uniques = pd.factorize(values)
+    if (codes < 0).any():
+        raise ValueError("purchase_date is missing")
+    return pd.DatetimeIndex(pd.to_datetime(uniques, utc=True)).take(codes)
+
+def _text(values):
+    """Object Series of str, which converts to Python lists without copying strings."""
+    if values.dtype != object:
+        values = values.astype(str)
+    return pd.Series(values.to_numpy(dtype=object), dtype=object)
+
+def _clean_chunk(chunk):
+    """Validate columns and coerce types of one raw chunk."""
+    missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    try:
+        clean = pd.DataFrame({
+            'customer_id': _text(chunk['customer_id']),
+            'product_id': _text(chunk['product_id']),
+            # USE_TZ is on, so dates are stored as aware UTC datetimes
+            'purchase_date': _parse_dates(chunk['purchase_date']),
+            'quantity': pd.to_numeric(chunk['quantity']).astype('int64').to_numpy(),
+            'price': pd.to_numeric(chunk['price']).round(2).to_numpy(),
+            'surplus_flag': _parse_flags(chunk['surplus_flag']) if 'surplus_flag' in chunk else False,
+        })
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid transaction values: {exc}") from exc
+    clean['product_category'] = (_text(chunk['product_category'].fillna('')) if 'product_category' in chunk
+                                 else '')
+    clean['product_name'] = _text(chunk['product_name']) if 'product_name' in chunk else clean['product_id']
+    return clean
+
+def _decimals(values):
+    """Prices as Decimals, which DecimalField passes through; each distinct value is converted once."""
+    codes, uniques = pd.factorize(values)
+    return np.array([Decimal(f'{value:.2f}') for value in uniques], dtype=object)[codes].tolist()
+
+@contextmanager
+def deferred_indexes(model):
+    """
+    Drop a model's non-unique indexes for a bulk load and rebuild them afterwards.
+
+    Building an index once over the loaded table is much cheaper than updating
+    it on every insert. Queries that rely on the indexes are slow while the
+    load runs, so use this for offline loads only.
+
+    Parameters:
+    - model: Django model whose table is loaded
+    """
+    table = model._meta.db_table
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+        indexes = {name: info['columns'] for name, info in constraints.items()
+                   if info['index'] and not info['primary_key'] and not info['unique']}
+        for name in indexes:
+            cursor.execute(f"DROP INDEX {quote(name)}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, columns in indexes.items():
+                cursor.execute(f"CREATE INDEX {quote(name)} ON {quote(table)} "
+                               f"({', '.join(quote(column) for column in columns)})")
+
+class TransactionIngestor:
+    """
+    Streams transaction rows into the Customer, Product and Transaction tables.
+
+    Chunk by chunk, customers and products not seen before are inserted, then
+    the chunk's transactions. Product category and surplus flag are tracked
+    from the latest row of each product and upserted once when the upload
+    ends. Only one chunk is held in memory at a time. The whole upload is one
+    database transaction, so a bad row anywhere leaves the tables untouched
+    and the upload can simply be retried.
+
+    Rows are written with bulk_create in the backend's largest batches.
+    Values are converted column-wise before instances are built, e.g. each
+    distinct price to Decimal once rather than DecimalField converting every float.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=None):
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size  # bulk_create batch size (default: the backend's maximum)
+        self._known_customers = set()
+        self._latest_products = None  # Latest name/category/surplus_flag per product_id
+        self.rows = 0
+
+    def _insert(self, model, field_names, rows, ignore_conflicts=False):
+        if not rows:
+            return
+        attnames = [model._meta.get_field(name).attname for name in field_names]
+        model.objects.bulk_create([model(**dict(zip(attnames, row))) for row in rows],
+                                  batch_size=self.batch_size, ignore_conflicts=ignore_conflicts)
+
+    def ingest_chunk(self, chunk):
+        """
+        Write one chunk of raw rows.
+
+        Parameters:
+        - chunk: DataFrame with REQUIRED_COLUMNS and optionally OPTIONAL_COLUMNS
+
+        Returns:
+        - int: Transactions inserted
+        """
+        chunk = _clean_chunk(chunk)
+        if chunk.empty:
+            return 0
+
+        new_customers = [customer_id for customer_id in chunk['customer_id'].unique().tolist()
+                         if customer_id not in self._known_customers]
+
+        latest = (chunk[['product_id', 'product_name', 'product_category', 'surplus_flag', 'purchase_date']]
+                  .sort_values('purchase_date', kind='stable').drop_duplicates('product_id', keep='last')
+                  .set_index('product_id'))
+        if self._latest_products is None:
+            new_products = latest
+            self._latest_products = latest
+        else:
+            new_products = latest[~latest.index.isin(self._latest_products.index)]
+            combined = pd.concat([self._latest_products, latest]).sort_values('purchase_date', kind='stable')
+            self._latest_products = combined[~combined.index.duplicated(keep='last')]
+
+        with transaction.atomic():
+            # Customers and products may exist from earlier uploads; transactions never conflict
+            self._insert(Customer, ['customer_id'], [(customer_id,) for customer_id in new_customers],
+                         ignore_conflicts=True)
+            self._insert(Product, ['product_id', 'name', 'category', 'surplus_flag'],
+                         list(zip(new_products.index.tolist(), new_products['product_name'].tolist(),
+                                  new_products['product_category'].tolist(),
+                                  new_products['surplus_flag'].tolist())),
+                         ignore_conflicts=True)
+            self._insert(Transaction, TRANSACTION_FIELDS,
+                         list(zip(chunk['customer_id'].tolist(), chunk['product_id'].tolist(),
+                                  chunk['quantity'].tolist(), list(chunk['purchase_date'].dt.to_pydatetime()),
+                                  _decimals(chunk['price']), chunk['surplus_flag'].tolist())))
+
+        self._known_customers.update(new_customers)
+        self.rows += len(chunk)
+        return len(chunk)
+
+    def update_products(self):
+        """
+        Upsert the latest category and surplus flag of every product seen so far.
+
+        Returns:
+        - int: Products updated
+        """
+        if self._latest_products is None:
+            return 0
+        products = self._latest_products
+        Product.objects.bulk_create(
+            [Product(product_id=product_id, name=name, category=category, surplus_flag=surplus_flag)
+             for product_id, name, category, surplus_flag in zip(
+                 products.index.tolist(), products['product_name'].tolist(),
+                 products['product_category'].tolist(), products['surplus_flag'].tolist())],
+            batch_size=self.batch_size, update_conflicts=True, unique_fields=['product_id'],
+            update_fields=['category', 'surplus_flag', 'updated_at']
+        )
+        return len(products)
+
+    def ingest(self, source, fmt='csv', defer_indexes=False, atomic=True):
+        """
+        Stream a whole upload into the database.
+
+        Parameters:
+        - source: Path or file object
+        - fmt: 'csv' or 'ndjson'
+        - defer_indexes: Drop the transaction indexes and disable foreign key
+          checks during the load, then rebuild the indexes and check the
+          loaded rows once at the end (for offline bulk loads). With atomic,
+          both happen inside the upload's transaction, so a failed check
+          rolls back the rows and restores the indexes
+        - atomic: Write the upload in one database transaction. With False each
+          chunk commits on its own; a failure then reports how many rows were
+          committed and the row offset to resume from
+
+        Returns:
+        - dict: Rows, customers, products, seconds and rows_per_second
+        """
+        start = time.perf_counter()
+        # Customers and products are written before their transactions, so the
+        # foreign keys hold; they are verified once after the load. SQLite can
+        # only switch the checks off outside a transaction.
+        checks = connection.constraint_checks_disabled() if defer_indexes else nullcontext()
+        with checks, transaction.atomic() if atomic else nullcontext():
+            try:
+                with deferred_indexes(Transaction) if defer_indexes else nullcontext():
+                    for chunk in iter_chunks(source, fmt, self.chunk_size):
+                        self.ingest_chunk(chunk)
+                if defer_indexes:
+                    try:
+                        connection.check_constraints(table_names=[Transaction._meta.db_table])
+                    except IntegrityError as exc:
+                        raise ValueError(f"Invalid transaction references: {exc}") from exc
+            except ValueError as exc:
+                if atomic:
+                    raise
+                # Chunks already committed keep their products up to date
+                self.update_products()
+                raise ValueError(f"{exc} ({self.rows} rows committed; resume from row {self.rows})") from exc
+            products = self.update_products()
+        seconds = time.perf_counter() - start
+        return {
+            'rows': self.rows,
+            'customers': len(self._known_customers),
+            'products': products,
+            'seconds': seconds,
+            'rows_per_second': self.rows / seconds if seconds else 0.0,
+        }
@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import pandas as pd
+from django.conf import settings
+from src.embeddings import EMBEDDING_COLUMNS
+from src.models import DEFAULT_BACKEND
+from src.storage import convert_csv_to_store, data_version, load_transactions, store_source_version
+from .metrics import TRAINING_JOBS, TRAINING_STAGE_SECONDS
+from .registry import get_registry
+from .utils import DATA_PATH, STORE_PATH, generate_dummy_data, preprocess_data, HarvestIQModels
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; fall back to the in-process guard only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = 'harvestiq/models/jobs'
+LOCK_PATH = 'harvestiq/models/.train.lock'
+
+STAGES = ['prepare_data', 'preprocess', 'train_models', 'train_embeddings', 'publish']
+
+JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+class TrainingInProgress(Exception):
+    """Raised when a training job is submitted while another one is running."""
+
+    def __init__(self, job_id=None):
+        super().__init__("A training job is already running.")
+        self.job_id = job_id
+
+class TrainingJob:
+    """
+    Status record of one training run, persisted as JSON so that any worker
+    process can serve the status endpoint.
+    """
+
+    def __init__(self, job_id, jobs_dir=JOBS_DIR):
+        self.job_id = job_id
+        self.path = os.path.join(jobs_dir, f'{job_id}.json')
+        self.record = {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'seconds': None,
+            'progress': 0.0,
+            'stages': [{'name': name, 'status': 'pending', 'started_at': None, 'seconds': None}
+                       for name in STAGES],
+            'training': None,
+            'model_version': None,
+            'error': None,
+        }
+
+    def save(self):
+        """Atomically write the status record."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.record, f)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Record start, end and duration of a pipeline stage.
+
+        Parameters:
+        - name: One of STAGES
+        """
+        entry = next(stage for stage in self.record['stages'] if stage['name'] == name)
+        entry.update(status='running', started_at=_now())
+        self.save()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            entry.update(status='failed', seconds=time.perf_counter() - start)
+            raise
+        entry.update(status='done', seconds=time.perf_counter() - start)
+        TRAINING_STAGE_SECONDS.observe(entry['seconds'], stage=name)
+        done = sum(stage['status'] == 'done' for stage in self.record['stages'])
+        self.record['progress'] = done / len(STAGES)
+        self.save()
+
+def run_training_pipeline(job):
+    """
+    Generate/convert data, preprocess, train and publish models, reporting each stage.
+
+    Parameters:
+    - job: TrainingJob to report progress to
+
+    Returns:
+    - str: Published model version
+    """
+    with job.stage('prepare_data'):
+        # Generate data if not exists
+        if not os.path.exists(DATA_PATH):
+            os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
+            generate_dummy_data().to_csv(DATA_PATH, index=False)
+        # Convert when the store is missing or was built from an earlier version of the CSV
+        if store_source_version(STORE_PATH) != data_version(DATA_PATH):
+            convert_csv_to_store(DATA_PATH, STORE_PATH)
+
+    with job.stage('preprocess'):
+        preprocessed = preprocess_data(STORE_PATH)
+        data_7d = preprocessed['7d']
+        data_14d = preprocessed['14d']
+
+    models = HarvestIQModels(backend=getattr(settings, 'MODEL_BACKEND', DEFAULT_BACKEND))
+    with job.stage('train_models'):
+        job.record['training'] = models.train_parallel(data_7d, data_14d)
+
+    with job.stage('train_embeddings'):
+        # Same history as the ranking models (preprocess_data's default prediction date)
+        models.train_embeddings(load_transactions(STORE_PATH, columns=EMBEDDING_COLUMNS,
+                                                  end_date=pd.to_datetime('2024-11-01')))
+
+    with job.stage('publish'):
+        return get_registry().publish(models)
+
+class TrainingJobRunner:
+    """
+    Runs training jobs one at a time on a background thread.
+
+    Only one job may be active: within a process this is tracked directly, and
+    across worker processes an exclusive lock on LOCK_PATH is held for the
+    whole run, so concurrent runs never race to write the models directory.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, lock_path=LOCK_PATH, pipeline=run_training_pipeline):
+        self.jobs_dir = jobs_dir
+        self.lock_path = lock_path
+        self.pipeline = pipeline
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='harvestiq-train')
+        self._lock = threading.Lock()
+        self._active = None
+
+    def _acquire_file_lock(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.seek(0)
+                job_id = lock_file.read().strip() or None
+                lock_file.close()
+                raise TrainingInProgress(job_id)
+        return lock_file
+
+    def submit(self):
+        """
+        Queue a training run and return immediately.
+
+        Returns:
+        - TrainingJob: The queued job
+
+        Raises:
+        - TrainingInProgress: If a run is already active in any worker
+        """
+        with self._lock:
+            if self._active is not None:
+                raise TrainingInProgress(self._active.job_id)
+
+            lock_file = self._acquire_file_lock()
+            job = TrainingJob(uuid.uuid4().hex, self.jobs_dir)
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(job.job_id)
+            lock_file.flush()
+            job.save()
+            self._active = job
+
+        self._executor.submit(self._run, job, lock_file)
+        return job
+
+    def _run(self, job, lock_file):
+        job.record.update(status='running', started_at=_now())
+        job.save()
+        start = time.perf_counter()
+        try:
+            job.record['model_version'] = self.pipeline(job)
+            job.record['status'] = 'succeeded'
+        except Exception as exc:
+            logger.exception("Training job %s failed", job.job_id)
+            job.record.update(status='failed', error=str(exc))
+        finally:
+            job.record.update(finished_at=_now(), seconds=time.perf_counter() - start)
+            job.save()
+            TRAINING_JOBS.inc(status=job.record['status'])
+            with self._lock:
+                self._active = None
+            lock_file.close()  # Releases the cross-process lock
+
+    def get(self, job_id):
+        """
+        Return the status record of a job, or None if it is unknown.
+
+        Parameters:
+        - job_id: Job ID returned by submit
+
+        Returns:
+        - dict or None: Job status
+        """
+        if not JOB_ID_RE.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.jobs_dir, f'{job_id}.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_job_runner():
+    """Return the training job runner of this process."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = TrainingJobRunner()
+    return _runner
@@ -0,0 +1,34 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from recommender.ingest import DEFAULT_CHUNK_SIZE, FORMATS, TransactionIngestor, detect_format
+
+class Command(BaseCommand):
+    help = "Bulk load transactions from a CSV or NDJSON file into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to load, or '-' to read from stdin")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help="Input format (default: guessed from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Rows parsed and written per chunk")
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help="Drop the transaction indexes and foreign key checks during the load and "
+                                 "rebuild them afterwards (offline loads; queries are slow meanwhile)")
+        parser.add_argument('--commit-chunks', action='store_true',
+                            help="Commit each chunk on its own instead of loading the file in one transaction")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(None if path == '-' else path)
+        source = sys.stdin.buffer if path == '-' else path
+
+        try:
+            summary = TransactionIngestor(chunk_size=options['chunk_size']).ingest(
+                source, fmt, defer_indexes=options['defer_indexes'], atomic=not options['commit_chunks'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {summary['rows']} transactions ({summary['customers']} customers, "
+            f"{summary['products']} products) in {summary['seconds']:.1f}s "
+            f"({summary['rows_per_second']:,.0f} rows/s)"))
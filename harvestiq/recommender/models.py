@@ -12,6 +12,7 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     category = models.CharField(max_length=100)
     surplus_flag = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)  # Lets every worker notice catalog changes
 
     def __str__(self):
         return f"Product {self.product_id}: {self.name}"
@@ -22,6 +23,7 @@ class Transaction(models.Model):
     quantity = models.IntegerField()
     purchase_date = models.DateTimeField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    surplus_flag = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Transaction: {self.customer} - {self.product} - {self.quantity} on {self.purchase_date}"
\ No newline at end of file
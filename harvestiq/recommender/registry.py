@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from src.models import publish_models, resolve_model_version
+from .utils import HarvestIQModels
+from .metrics import MODEL_INFO, MODEL_LOADS
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = 'harvestiq/models/'
+
+ModelSnapshot = namedtuple('ModelSnapshot', ['models', 'version'])
+
+class ModelRegistry:
+    """
+    Process-wide holder of the live model set.
+
+    Models are unpickled once per process. When a newer version is published on
+    disk, it is loaded on a background thread and swapped in with a single
+    reference assignment; requests keep using the previous snapshot meanwhile.
+    """
+
+    def __init__(self, path=MODEL_PATH, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._last_check = 0.0
+
+    def _load(self, version, directory):
+        models = HarvestIQModels()
+        try:
+            models.load_models(directory)
+        except Exception:
+            MODEL_LOADS.inc(result='failure')
+            raise
+        MODEL_LOADS.inc(result='success')
+        logger.info("Loaded models version %s", version)
+        return ModelSnapshot(models, version)
+
+    def get(self):
+        """
+        Return the current model snapshot.
+
+        The first call loads the models; later calls return immediately and, at
+        most every check_interval seconds, look for a newer version on disk.
+
+        Returns:
+        - ModelSnapshot: (models, version)
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    version, directory = resolve_model_version(self.path)
+                    if version is None:
+                        raise FileNotFoundError("No trained models found. Please train models first.")
+                    self._snapshot = self._load(version, directory)
+                    self._last_check = time.monotonic()
+                    MODEL_INFO.replace(1, version=version)
+                return self._snapshot
+
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            version, directory = resolve_model_version(self.path)
+            if version is not None and version != snapshot.version:
+                self._reload_in_background(version, directory)
+        return snapshot
+
+    def _reload_in_background(self, version, directory):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(version, directory), daemon=True).start()
+
+    def _reload(self, version, directory):
+        try:
+            snapshot = self._load(version, directory)
+            # A newer set may have been published while this one was loading
+            if resolve_model_version(self.path)[0] == version:
+                self._snapshot = snapshot
+                MODEL_INFO.replace(1, version=version)
+        except Exception:
+            # Keep serving the previous models; the next check retries
+            logger.exception("Failed to load models version %s", version)
+        finally:
+            self._reloading = False
+
+    def publish(self, models):
+        """
+        Publish freshly trained models and serve them from this process right away.
+
+        Parameters:
+        - models: Trained HarvestIQModels
+
+        Returns:
+        - str: New model version
+        """
+        version = publish_models(models, self.path)
+        self._snapshot = ModelSnapshot(models, version)
+        MODEL_INFO.replace(1, version=version)
+        return version
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Return the registry shared by all requests in this process."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
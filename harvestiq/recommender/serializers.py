@@ -19,6 +19,7 @@ class TransactionSerializer(serializers.ModelSerializer):
 # Serializer for recommendation response
 class RecommendationSerializer(serializers.Serializer):
     product_id = serializers.CharField()
+    category = serializers.CharField()
     purchase_probability_7d = serializers.FloatField()
     purchase_probability_14d = serializers.FloatField()
     recommended_quantity = serializers.FloatField()
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import TrainModelsView, RecommendView
+from .views import TrainModelsView, TrainJobStatusView, TransactionIngestView, RecommendView
 
 urlpatterns = [
     path('train/', TrainModelsView.as_view(), name='train_models'),
+    path('train/<str:job_id>/', TrainJobStatusView.as_view(), name='train_job_status'),
+    path('ingest/', TransactionIngestView.as_view(), name='ingest_transactions'),
     path('recommend/<str:customer_id>/', RecommendView.as_view(), name='recommend'),
 ]
\ No newline at end of file
@@ -1,11 +1,22 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, mean_absolute_error
 import joblib
+import json
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from src.storage import load_transactions, store_path_for
+from src.candidate_index import CandidateIndex
+from src.preprocessing import create_horizon_labels
+from src.models import BACKENDS, DEFAULT_BACKEND, resolve_model_version
+from src.recommendations import top_n_indices
+from src.embeddings import EmbeddingTables, ImplicitALS
+from src.tree_engine import compile_models, feature_matrix, is_compilable, load_compiled, save_compiled
 
 # Copy from generate_data.py
 def generate_dummy_data(num_customers=1000, num_products=50, num_transactions=10000):
@@ -40,21 +51,22 @@ def generate_dummy_data(num_customers=1000, num_products=50, num_transactions=10
     df['purchase_date'] = pd.to_datetime(df['purchase_date'])
     return df
 
+DATA_PATH = 'harvestiq/data/transactions.csv'
+STORE_PATH = store_path_for(DATA_PATH)
+
 # Copy preprocessing functions
-def load_data(filepath):
-    df = pd.read_csv(filepath, parse_dates=['purchase_date'])
-    return df
+def load_data(filepath, columns=None, start_date=None, end_date=None):
+    return load_transactions(filepath, columns=columns, start_date=start_date, end_date=end_date)
 
 def feature_engineering(df, prediction_date):
-    historical_df = df[df['purchase_date'] <= prediction_date].copy()
-    historical_df = historical_df.sort_values(['customer_id', 'purchase_date'])
+    historical_df = df[df['purchase_date'] <= prediction_date]
     customer_features = historical_df.groupby('customer_id').agg(
         total_purchases=('quantity', 'sum'),
         avg_quantity=('quantity', 'mean'),
         num_unique_products=('product_id', 'nunique'),
-        last_purchase_date=('purchase_date', 'max'),
-        recency_days=('purchase_date', lambda x: (prediction_date - x.max()).days)
+        last_purchase_date=('purchase_date', 'max')
     ).reset_index()
+    customer_features['recency_days'] = (prediction_date - customer_features['last_purchase_date']).dt.days
     product_features = historical_df.groupby('product_id').agg(
         product_total_sales=('quantity', 'sum'),
         product_avg_price=('price', 'mean'),
@@ -64,11 +76,16 @@ def feature_engineering(df, prediction_date):
         cp_total_purchases=('quantity', 'sum'),
         cp_avg_quantity=('quantity', 'mean'),
         cp_purchase_count=('quantity', 'count'),
-        cp_last_purchase_date=('purchase_date', 'max'),
-        cp_recency_days=('purchase_date', lambda x: (prediction_date - x.max()).days),
-        cp_days_since_first=('purchase_date', lambda x: (x.max() - x.min()).days if len(x) > 1 else 0),
-        cp_avg_interval=('purchase_date', lambda x: np.mean(np.diff(sorted(x))) if len(x) > 1 else 0)
+        cp_first_purchase_date=('purchase_date', 'min'),
+        cp_last_purchase_date=('purchase_date', 'max')
     ).reset_index()
+    interaction_features['cp_recency_days'] = (prediction_date - interaction_features['cp_last_purchase_date']).dt.days
+    interaction_features['cp_days_since_first'] = (
+        interaction_features['cp_last_purchase_date'] - interaction_features.pop('cp_first_purchase_date')
+    ).dt.days
+    interaction_features['cp_avg_interval'] = (
+        interaction_features['cp_days_since_first'] / (interaction_features['cp_purchase_count'] - 1)
+    ).where(interaction_features['cp_purchase_count'] > 1, 0.0)
     interaction_features['cp_last_month'] = interaction_features['cp_last_purchase_date'].dt.month
     features = interaction_features.merge(customer_features, on='customer_id', how='left')
     features = features.merge(product_features, on='product_id', how='left')
@@ -88,22 +105,27 @@ def create_labels(df, features, prediction_date, window_days):
     labeled_features['will_buy'] = (labeled_features['future_purchases'] > 0).astype(int)
     return labeled_features
 
-def preprocess_data(filepath, prediction_date_str='2024-11-01'):
-    df = load_data(filepath)
+def preprocess_data(filepath, prediction_date_str='2024-11-01', horizons=(7, 14)):
     prediction_date = pd.to_datetime(prediction_date_str)
+    df = load_data(filepath, end_date=prediction_date + timedelta(days=max(horizons)))
     features = feature_engineering(df, prediction_date)
-    features_7d = create_labels(df, features, prediction_date, 7)
-    features_7d['window'] = 7
-    features_14d = create_labels(df, features, prediction_date, 14)
-    features_14d['window'] = 14
-    return {'7d': features_7d, '14d': features_14d}
+    labeled = create_horizon_labels(df, features, prediction_date, horizons)
+    for horizon, labeled_features in labeled.items():
+        labeled_features['window'] = horizon
+    return {f'{horizon}d': labeled_features for horizon, labeled_features in labeled.items()}
 
 # Copy models class
 class HarvestIQModels:
-    def __init__(self):
-        self.classifier_7d = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.classifier_14d = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.regressor = RandomForestRegressor(n_estimators=100, random_state=42)
+    def __init__(self, backend=DEFAULT_BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend {backend!r}; choose from {sorted(BACKENDS)}")
+        self.backend = backend
+        make_classifier, make_regressor = BACKENDS[backend]
+        self.classifier_7d = make_classifier()
+        self.classifier_14d = make_classifier()
+        self.regressor = make_regressor()
+        self.compiled = None
+        self.embeddings = None
 
     def prepare_features(self, df):
         drop_cols = ['customer_id', 'product_id', 'cp_last_purchase_date', 'last_purchase_date',
@@ -114,6 +136,7 @@ class HarvestIQModels:
         return X, y_class, y_reg
 
     def train_classifiers(self, data_7d, data_14d):
+        self.compiled = None
         X_7d, y_7d, _ = self.prepare_features(data_7d)
         X_train_7d, X_test_7d, y_train_7d, y_test_7d = train_test_split(X_7d, y_7d, test_size=0.2, random_state=42)
         self.classifier_7d.fit(X_train_7d, y_train_7d)
@@ -128,6 +151,7 @@ class HarvestIQModels:
         print(f"14-day Classifier AUC: {auc_14d:.4f}")
 
     def train_regressor(self, data_7d, data_14d):
+        self.compiled = None
         pos_7d = data_7d[data_7d['will_buy'] == 1]
         pos_14d = data_14d[data_14d['will_buy'] == 1]
         pos_data = pd.concat([pos_7d, pos_14d])
@@ -138,7 +162,60 @@ class HarvestIQModels:
         mae = mean_absolute_error(y_test_reg, y_pred_reg)
         print(f"Regressor MAE: {mae:.4f}")
 
+    def train_parallel(self, data_7d, data_14d, n_jobs=None):
+        # Shared feature matrix and split; the three models fit concurrently
+        self.compiled = None
+        X, y_7d, _ = self.prepare_features(data_7d)
+        _, y_14d, _ = self.prepare_features(data_14d)
+        keys = ['customer_id', 'product_id']
+        if not data_7d[keys].reset_index(drop=True).equals(data_14d[keys].reset_index(drop=True)):
+            raise ValueError("data_7d and data_14d must hold the same customer-product rows")
+        X = X.astype(np.float32)
+        train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+        X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+        pos_7d = np.flatnonzero(y_7d.to_numpy() == 1)
+        pos_14d = np.flatnonzero(y_14d.to_numpy() == 1)
+        y_reg = np.concatenate([data_7d['future_quantity'].to_numpy()[pos_7d],
+                                data_14d['future_quantity'].to_numpy()[pos_14d]])
+        X_train_reg, X_test_reg, y_train_reg, y_test_reg = train_test_split(
+            X.iloc[np.concatenate([pos_7d, pos_14d])], y_reg, test_size=0.2, random_state=42)
+        tasks = {
+            'classifier_7d': (self.classifier_7d, X_train, y_7d.iloc[train_idx], X_test, y_7d.iloc[test_idx]),
+            'classifier_14d': (self.classifier_14d, X_train, y_14d.iloc[train_idx], X_test, y_14d.iloc[test_idx]),
+            'regressor': (self.regressor, X_train_reg, y_train_reg, X_test_reg, y_test_reg),
+        }
+        cores_per_model = max(1, (n_jobs or os.cpu_count()) // len(tasks))
+
+        def fit(model, X_fit, y_fit, X_eval, y_eval):
+            start = time.perf_counter()
+            if 'n_jobs' not in model.get_params(deep=False):
+                model.fit(X_fit, y_fit)
+            else:
+                default_n_jobs = model.n_jobs
+                model.set_params(n_jobs=cores_per_model)
+                try:
+                    model.fit(X_fit, y_fit)
+                finally:
+                    model.set_params(n_jobs=default_n_jobs)
+            seconds = time.perf_counter() - start
+            if hasattr(model, 'predict_proba'):
+                return {'auc': roc_auc_score(y_eval, model.predict_proba(X_eval)[:, 1]), 'seconds': seconds}
+            return {'mae': mean_absolute_error(y_eval, model.predict(X_eval)), 'seconds': seconds}
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = {name: pool.submit(fit, *task) for name, task in tasks.items()}
+            results = {name: future.result() for name, future in futures.items()}
+        print(f"7-day Classifier AUC: {results['classifier_7d']['auc']:.4f} ({results['classifier_7d']['seconds']:.2f}s)")
+        print(f"14-day Classifier AUC: {results['classifier_14d']['auc']:.4f} ({results['classifier_14d']['seconds']:.2f}s)")
+        print(f"Regressor MAE: {results['regressor']['mae']:.4f} ({results['regressor']['seconds']:.2f}s)")
+        return results
+
     def predict(self, features_df, window):
+        if self.compiled is not None:
+            X = feature_matrix(features_df, self.compiled['regressor'].feature_names)
+            if window not in (7, 14):
+                raise ValueError("Window must be 7 or 14")
+            return self.compiled[f'classifier_{window}d'].predict(X), self.compiled['regressor'].predict(X)
         X = features_df.drop(columns=['customer_id', 'product_id', 'cp_last_purchase_date', 'last_purchase_date'], errors='ignore')
         if window == 7:
             prob = self.classifier_7d.predict_proba(X)[:, 1]
@@ -149,22 +226,83 @@ class HarvestIQModels:
         qty = self.regressor.predict(X)
         return prob, qty
 
+    def predict_batch(self, features_df, timer=None):
+        timer = timer or (lambda stage: nullcontext())
+        if self.compiled is not None:
+            X = feature_matrix(features_df, self.compiled['regressor'].feature_names)
+            with timer('predict_7d'):
+                prob_7d = self.compiled['classifier_7d'].predict(X)
+            with timer('predict_14d'):
+                prob_14d = self.compiled['classifier_14d'].predict(X)
+            with timer('predict_quantity'):
+                qty = self.compiled['regressor'].predict(X)
+            return prob_7d, prob_14d, qty
+        X = features_df.drop(columns=['customer_id', 'product_id', 'cp_last_purchase_date', 'last_purchase_date'], errors='ignore')
+        with timer('predict_7d'):
+            prob_7d = self.classifier_7d.predict_proba(X)[:, 1]
+        with timer('predict_14d'):
+            prob_14d = self.classifier_14d.predict_proba(X)[:, 1]
+        with timer('predict_quantity'):
+            qty = self.regressor.predict(X)
+        return prob_7d, prob_14d, qty
+
+    def train_embeddings(self, historical_df, **params):
+        self.embeddings = ImplicitALS(**params).fit(historical_df)
+        return self.embeddings
+
     def save_models(self, path='harvestiq/models/'):
         os.makedirs(path, exist_ok=True)
         joblib.dump(self.classifier_7d, f'{path}classifier_7d.pkl')
         joblib.dump(self.classifier_14d, f'{path}classifier_14d.pkl')
         joblib.dump(self.regressor, f'{path}regressor.pkl')
+        with open(f'{path}meta.json', 'w') as f:
+            json.dump({'backend': self.backend}, f)
+        self.compile()
+        if self.compiled is not None:
+            save_compiled(self.compiled, path)
+        else:
+            shutil.rmtree(f'{path}compiled', ignore_errors=True)
+        if self.embeddings is not None:
+            self.embeddings.save(f'{path}embeddings')
+
+    def compile(self):
+        self.compiled = compile_models(self) if is_compilable(self) else None
 
     def load_models(self, path='harvestiq/models/'):
+        _, path = resolve_model_version(path)
+        if path is None:
+            raise FileNotFoundError("No trained models found. Please train models first.")
         self.classifier_7d = joblib.load(f'{path}classifier_7d.pkl')
         self.classifier_14d = joblib.load(f'{path}classifier_14d.pkl')
         self.regressor = joblib.load(f'{path}regressor.pkl')
+        try:
+            with open(f'{path}meta.json') as f:
+                self.backend = json.load(f)['backend']
+        except FileNotFoundError:
+            self.backend = DEFAULT_BACKEND
+        self.compiled = load_compiled(path)
+        embeddings_path = f'{path}embeddings'
+        self.embeddings = EmbeddingTables.load(embeddings_path) if os.path.isdir(embeddings_path) else None
 
 # Copy recommender class
 class HarvestIQRecommender:
-    def __init__(self, model_path='harvestiq/models/'):
-        self.models = HarvestIQModels()
-        self.models.load_models(model_path)
+    def __init__(self, model_path='harvestiq/models/', models=None):
+        if models is None:
+            models = HarvestIQModels()
+            models.load_models(model_path)
+        self.models = models
+        self.candidate_index = None
+        self.catalog = None
+        self.cooccurrence = None
+        self.num_cooccurrence_candidates = 20
+        self.num_retrieval_candidates = 200
+        self.timer = None
+
+    def _stage(self, name):
+        return self.timer(name) if self.timer is not None else nullcontext()
+
+    def build_candidate_index(self, historical_df, prediction_date, data_version=None):
+        self.candidate_index = CandidateIndex.build(historical_df, prediction_date, data_version)
 
     def generate_candidate_products(self, historical_df, customer_id, prediction_date):
         customer_products = historical_df[historical_df['customer_id'] == customer_id]['product_id'].unique()
@@ -204,7 +342,7 @@ class HarvestIQRecommender:
                 'cp_last_purchase_date': cp_hist['purchase_date'].max(),
                 'cp_recency_days': (prediction_date - cp_hist['purchase_date'].max()).days,
                 'cp_days_since_first': (cp_hist['purchase_date'].max() - cp_hist['purchase_date'].min()).days if len(cp_hist) > 1 else 0,
-                'cp_avg_interval': np.mean(np.diff(sorted(cp_hist['purchase_date']))) if len(cp_hist) > 1 else 0,
+                'cp_avg_interval': (cp_hist['purchase_date'].max() - cp_hist['purchase_date'].min()).days / (len(cp_hist) - 1) if len(cp_hist) > 1 else 0.0,
                 'cp_last_month': cp_hist['purchase_date'].max().month,
             }
             features.update(customer_features)
@@ -219,22 +357,50 @@ class HarvestIQRecommender:
         score = weighted_prob * avg_qty * surplus_bonus
         return score
 
+    def add_retrieved_candidates(self, candidates, customer_id):
+        retrieved = []
+        if self.models.embeddings is not None:
+            retrieved.append(self.models.embeddings.retrieve_one(
+                customer_id, n=self.num_retrieval_candidates, exclude=candidates['product_id'])['product_id'])
+        if self.cooccurrence is not None:
+            retrieved.append(self.cooccurrence.candidates(
+                candidates['product_id'], weights=candidates['cp_purchase_count'],
+                n=self.num_cooccurrence_candidates)['product_id'])
+        if not retrieved:
+            return candidates
+        product_ids = pd.unique(np.concatenate([ids.to_numpy(dtype=object) for ids in retrieved]))
+        if len(product_ids) == 0:
+            return candidates
+        unseen = self.candidate_index.unseen(customer_id, product_ids)
+        return pd.concat([candidates, unseen], ignore_index=True)
+
     def recommend_for_customer(self, historical_df, customer_id, prediction_date, top_n=10):
-        candidates = self.generate_candidate_products(historical_df, customer_id, prediction_date)
+        with self._stage('candidates'):
+            if self.candidate_index is not None and self.candidate_index.prediction_date == prediction_date:
+                candidates = self.candidate_index.get(customer_id)
+                if not candidates.empty:
+                    candidates = self.add_retrieved_candidates(candidates, customer_id)
+            else:
+                candidates = self.generate_candidate_products(historical_df, customer_id, prediction_date)
         if candidates.empty:
             return pd.DataFrame()
-        prob_7d, qty_7d = self.models.predict(candidates, 7)
-        prob_14d, qty_14d = self.models.predict(candidates, 14)
-        scores = []
-        for i in range(len(candidates)):
-            score = self.compute_recommendation_score(
-                prob_7d[i], prob_14d[i], qty_7d[i], qty_14d[i], candidates.iloc[i]['product_surplus_ratio']
-            )
-            scores.append(score)
-        candidates['score'] = scores
-        candidates['prob_7d'] = prob_7d
-        candidates['prob_14d'] = prob_14d
-        candidates['qty_7d'] = qty_7d
-        candidates['qty_14d'] = qty_14d
-        recommendations = candidates.sort_values('score', ascending=False).head(top_n)
-        return recommendations[['customer_id', 'product_id', 'score', 'prob_7d', 'prob_14d', 'qty_7d', 'qty_14d']]
\ No newline at end of file
+        prob_7d, prob_14d, qty = self.models.predict_batch(candidates, timer=self.timer)
+        with self._stage('scoring'):
+            if self.catalog is not None:
+                surplus_ratio = self.catalog.surplus_ratios(candidates['product_id'])
+            else:
+                surplus_ratio = candidates['product_surplus_ratio'].to_numpy()
+            scores = self.compute_recommendation_score(prob_7d, prob_14d, qty, qty, surplus_ratio)
+            top = top_n_indices(scores, top_n)
+        recommendations = candidates[['customer_id', 'product_id']].iloc[top].assign(
+            score=scores[top],
+            prob_7d=prob_7d[top],
+            prob_14d=prob_14d[top],
+            qty_7d=qty[top],
+            qty_14d=qty[top]
+        ).reset_index(drop=True)
+        if self.catalog is not None:
+            attributes = self.catalog.lookup(recommendations['product_id'])
+            recommendations['category'] = attributes['category'].to_numpy()
+            recommendations['surplus_flag'] = attributes['surplus_flag'].to_numpy()
+        return recommendations
\ No newline at end of file
@@ -1,60 +1,135 @@
+from django.http import HttpResponse
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .utils import generate_dummy_data, preprocess_data, HarvestIQModels, HarvestIQRecommender
+from .utils import DATA_PATH, STORE_PATH, HarvestIQRecommender
+from .jobs import TrainingInProgress, get_job_runner
+from .registry import get_registry
+from .cache import get_recommendation_cache
+from .catalog import CATALOG_COLUMNS, get_catalog_provider
+from .ingest import FORMATS, TransactionIngestor, detect_format
+from .metrics import (CACHE_REQUESTS, CATALOG_PRODUCTS, CONTENT_TYPE, FEATURE_TABLE_ROWS, REGISTRY,
+                      instrumented, stage_timer)
 from .serializers import RecommendationSerializer
+from src.candidate_index import get_candidate_index
+from src.cooccurrence import get_cooccurrence_index
+from src.storage import FEATURE_COLUMNS, data_version, load_transactions
 import pandas as pd
 import os
 
 class TrainModelsView(APIView):
+    @instrumented('train')
     def post(self, request):
-        # Generate data if not exists
-        data_path = 'harvestiq/data/transactions.csv'
-        if not os.path.exists(data_path):
-            os.makedirs('harvestiq/data', exist_ok=True)
-            df = generate_dummy_data()
-            df.to_csv(data_path, index=False)
+        # Training runs in the background; the client polls the returned status URL
+        try:
+            job = get_job_runner().submit()
+        except TrainingInProgress as exc:
+            return Response({"error": "A training job is already running.", "job_id": exc.job_id},
+                            status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "job_id": job.job_id,
+            "status": job.record['status'],
+            "status_url": reverse('train_job_status', args=[job.job_id])
+        }, status=status.HTTP_202_ACCEPTED)
 
-        # Preprocess
-        preprocessed = preprocess_data(data_path)
-        data_7d = preprocessed['7d']
-        data_14d = preprocessed['14d']
+class TrainJobStatusView(APIView):
+    @instrumented('train_status')
+    def get(self, request, job_id):
+        job = get_job_runner().get(job_id)
+        if job is None:
+            return Response({"error": "Training job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job, status=status.HTTP_200_OK)
 
-        # Train models
-        models = HarvestIQModels()
-        models.train_classifiers(data_7d, data_14d)
-        models.train_regressor(data_7d, data_14d)
-        models.save_models()
+class TransactionIngestView(APIView):
+    @instrumented('ingest')
+    def post(self, request):
+        # Multipart uploads are spooled to a temporary file by Django; raw bodies
+        # (text/csv, application/x-ndjson) are read straight from the request stream
+        if request.content_type.startswith('multipart/'):
+            source = request.FILES.get('file')
+            name = source.name if source is not None else None
+        else:
+            source = request.stream
+            name = None
+        if source is None:
+            return Response({"error": "No transactions uploaded."}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"message": "Models trained and saved successfully."}, status=status.HTTP_200_OK)
+        # 'format' is reserved by DRF for response format negotiation
+        fmt = request.query_params.get('fmt') or detect_format(name, request.content_type)
+        if fmt not in FORMATS:
+            return Response({"error": f"Unsupported format {fmt!r}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # All or nothing: a rejected upload leaves no rows behind and can be retried as is
+            summary = TransactionIngestor().ingest(source, fmt)
+        except ValueError as exc:
+            return Response({"error": str(exc), "rows_committed": 0}, status=status.HTTP_400_BAD_REQUEST)
+        get_catalog_provider().invalidate()
+        return Response(summary, status=status.HTTP_201_CREATED)
 
 class RecommendView(APIView):
+    @instrumented('recommend')
     def get(self, request, customer_id):
-        data_path = 'harvestiq/data/transactions.csv'
+        data_path = STORE_PATH if os.path.isdir(STORE_PATH) else DATA_PATH
         if not os.path.exists(data_path):
             return Response({"error": "Data not found. Please train models first."}, status=status.HTTP_404_NOT_FOUND)
+        stage = stage_timer('recommend')
 
-        df = pd.read_csv(data_path, parse_dates=['purchase_date'])
+        # Models are loaded once per process and hot-swapped when a new version is published
+        with stage('load_models'):
+            snapshot = get_registry().get()
+        current_data_version = data_version(data_path)
         prediction_date = pd.to_datetime('2024-11-01')  # Same as training
 
-        recommender = HarvestIQRecommender()
-        recommendations = recommender.recommend_for_customer(df, customer_id, prediction_date, top_n=5)
-
-        if recommendations.empty:
-            return Response({"recommendations": []}, status=status.HTTP_200_OK)
-
-        # Prepare response
-        recs = []
-        for _, row in recommendations.iterrows():
-            # Get surplus_flag from data
-            surplus_flag = df[df['product_id'] == row['product_id']]['surplus_flag'].iloc[0] if not df[df['product_id'] == row['product_id']].empty else False
-            rec = {
-                "product_id": row['product_id'],
-                "purchase_probability_7d": float(row['prob_7d']),
-                "purchase_probability_14d": float(row['prob_14d']),
-                "recommended_quantity": float((row['qty_7d'] + row['qty_14d']) / 2),
-                "surplus_flag": bool(surplus_flag)
-            }
-            recs.append(rec)
-
-        return Response({"recommendations": recs}, status=status.HTTP_200_OK)
\ No newline at end of file
+        # Product attributes are looked up in memory; the catalog refreshes when products or data change
+        with stage('load_catalog'):
+            catalog = get_catalog_provider().get(current_data_version, lambda: load_transactions(
+                data_path, columns=CATALOG_COLUMNS, end_date=prediction_date))
+        CATALOG_PRODUCTS.set(len(catalog))
+
+        # Responses are cached per model and catalog version, so retraining, new data
+        # or product changes invalidate them
+        cache = get_recommendation_cache()
+        cached = cache.get(customer_id, snapshot.version, catalog.version)
+        CACHE_REQUESTS.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return Response(cached, status=status.HTTP_200_OK)
+
+        recommender = HarvestIQRecommender(models=snapshot.models)
+        recommender.catalog = catalog
+        recommender.timer = stage
+        # Candidate features for all customers are built once per data version and shared;
+        # history is only read (up to the prediction date) when the index is rebuilt
+        with stage('load_candidates'):
+            recommender.candidate_index = get_candidate_index(prediction_date, current_data_version, lambda: load_transactions(
+                data_path, columns=FEATURE_COLUMNS, end_date=prediction_date))
+        FEATURE_TABLE_ROWS.set(len(recommender.candidate_index))
+        # Products bought in the same baskets as the customer's history let never-bought
+        # (e.g. surplus) products be recommended
+        with stage('load_cooccurrence'):
+            recommender.cooccurrence = get_cooccurrence_index(current_data_version, data_path, end_date=prediction_date)
+        recommendations = recommender.recommend_for_customer(None, customer_id, prediction_date, top_n=5)
+
+        with stage('response'):
+            # Prepare response
+            recs = []
+            for row in recommendations.itertuples(index=False):
+                rec = {
+                    "product_id": row.product_id,
+                    "category": row.category,
+                    "purchase_probability_7d": float(row.prob_7d),
+                    "purchase_probability_14d": float(row.prob_14d),
+                    "recommended_quantity": float((row.qty_7d + row.qty_14d) / 2),
+                    "surplus_flag": bool(row.surplus_flag)
+                }
+                recs.append(rec)
+
+            body = {"recommendations": recs, "model_version": snapshot.version}
+            cache.set(customer_id, snapshot.version, catalog.version, body)
+        return Response(body, status=status.HTTP_200_OK)
+
+def metrics(request):
+    """Metrics of this worker process in the Prometheus text format."""
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,179 @@
+import glob
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import pandas as pd
+from .catalog import ProductCatalog
+from .models import HarvestIQModels
+from .preprocessing import feature_engineering, load_data, product_level_features
+from .recommendations import recommendation_score
+from .storage import FEATURE_COLUMNS
+
+# Models (and catalog) loaded once per worker process by _init_worker
+_worker_models = None
+_worker_catalog = None
+
+def _init_worker(model_path, catalog=None):
+    global _worker_models, _worker_catalog
+    _worker_models = HarvestIQModels()
+    _worker_models.load_models(model_path)
+    _worker_catalog = catalog
+
+def score_features(models, features, top_n=10, catalog=None):
+    """
+    Score a bulk feature frame and keep the top-N products per customer.
+
+    As in HarvestIQRecommender, the surplus bonus uses the catalog's current
+    surplus ratios when a catalog is given, and the historical
+    product_surplus_ratio feature otherwise.
+
+    Parameters:
+    - models: Trained HarvestIQModels
+    - features: Candidate features for any number of customers
+    - top_n: Recommendations kept per customer
+    - catalog: Optional ProductCatalog supplying surplus ratios
+
+    Returns:
+    - pd.DataFrame: Top recommendations with scores
+    """
+    prob_7d, prob_14d, qty = models.predict_batch(features)
+    if catalog is not None:
+        surplus_ratio = catalog.surplus_ratios(features['product_id'])
+    else:
+        surplus_ratio = features['product_surplus_ratio'].to_numpy()
+    scored = features[['customer_id', 'product_id']].assign(
+        score=recommendation_score(prob_7d, prob_14d, qty, qty, surplus_ratio),
+        prob_7d=prob_7d,
+        prob_14d=prob_14d,
+        qty_7d=qty,
+        qty_14d=qty
+    )
+    scored = scored.sort_values(['customer_id', 'score'], ascending=[True, False], kind='stable')
+    return scored.groupby('customer_id', sort=False).head(top_n).reset_index(drop=True)
+
+def _score_shard(shard_id, shard_df, product_features, prediction_date, top_n, output_dir):
+    features = feature_engineering(shard_df, prediction_date, product_features=product_features)
+    recommendations = score_features(_worker_models, features, top_n, _worker_catalog)
+    recommendations.to_parquet(os.path.join(output_dir, f'part-{shard_id:05d}.parquet'), index=False)
+    return features['customer_id'].nunique(), len(recommendations)
+
+def score_all_customers(historical_df, prediction_date, output_dir, model_path='harvestiq/models/',
+                        top_n=10, n_workers=None, n_shards=None, catalog=None):
+    """
+    Write top-N recommendations for every customer, sharded across a process pool.
+
+    Customers are assigned to shards by a hash of customer_id. Each worker
+    builds features for a whole shard at once, scores it with one predict call
+    per model and writes one Parquet file per shard. Product features are
+    computed once over all customers and shared with every shard. Shards are
+    cut and submitted as workers free up, so only about one shard per worker
+    is copied and queued for pickling at a time, on top of historical_df.
+
+    Only products a customer has bought are ranked. The API's embedding and
+    co-occurrence retrieval stages (add_retrieved_candidates) are deliberately
+    left out, so these lists hold repeat purchases only.
+
+    Parameters:
+    - historical_df: Historical transactions
+    - prediction_date: Prediction date
+    - output_dir: Directory for part-NNNNN.parquet files
+    - model_path: Models directory
+    - top_n: Recommendations kept per customer
+    - n_workers: Worker processes (default: all cores)
+    - n_shards: Number of output shards (default: 4 per worker)
+    - catalog: ProductCatalog whose surplus ratios are scored, as the API does
+      (default: the historical product_surplus_ratio feature); sent to each worker once
+
+    Returns:
+    - dict: Customers, rows, seconds and customers_per_second
+    """
+    start = time.perf_counter()
+    n_workers = n_workers or os.cpu_count()
+    n_shards = n_shards or 4 * n_workers
+
+    historical_df = historical_df[historical_df['purchase_date'] <= prediction_date]
+    product_features = product_level_features(historical_df)
+    shard_ids = pd.util.hash_pandas_object(historical_df['customer_id'], index=False).to_numpy() % n_shards
+
+    os.makedirs(output_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(output_dir, 'part-*.parquet')):
+        os.remove(stale)
+
+    customers = rows = 0
+
+    def collect(done):
+        nonlocal customers, rows
+        for future in done:
+            shard_customers, shard_rows = future.result()
+            customers += shard_customers
+            rows += shard_rows
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                             initargs=(model_path, catalog)) as pool:
+        # One shard running per worker plus one waiting, so no worker idles between shards
+        pending = set()
+        for shard_id, shard_df in historical_df.groupby(shard_ids):
+            if len(pending) > n_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(_score_shard, int(shard_id), shard_df, product_features,
+                                    prediction_date, top_n, output_dir))
+        collect(wait(pending).done)
+
+    seconds = time.perf_counter() - start
+    return {'workers': n_workers, 'customers': customers, 'rows': rows,
+            'seconds': seconds, 'customers_per_second': customers / seconds}
+
+def scaling_report(historical_df, prediction_date, output_dir, model_path='harvestiq/models/',
+                   top_n=10, max_workers=None, catalog=None):
+    """
+    Measure batch scoring throughput as worker processes are added.
+
+    Parameters:
+    - historical_df: Historical transactions
+    - prediction_date: Prediction date
+    - output_dir: Directory for part-NNNNN.parquet files
+    - model_path: Models directory
+    - top_n: Recommendations kept per customer
+    - max_workers: Largest worker count; 1, 2, 4, ... up to it are tried (default: all cores)
+    - catalog: ProductCatalog supplying surplus ratios (see score_all_customers)
+
+    Returns:
+    - pd.DataFrame: One row per worker count with customers_per_second and speedup
+    """
+    max_workers = max_workers or os.cpu_count()
+    worker_counts = sorted({min(2 ** i, max_workers) for i in range(max_workers.bit_length() + 1)})
+
+    results = pd.DataFrame([
+        score_all_customers(historical_df, prediction_date, output_dir, model_path, top_n,
+                            n_workers=n, n_shards=4 * max(worker_counts), catalog=catalog)
+        for n in worker_counts
+    ])
+    results['speedup'] = results['customers_per_second'] / results['customers_per_second'].iloc[0]
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score every customer and write sharded top-N recommendations.")
+    parser.add_argument('--data', default='harvestiq/data/transactions')
+    parser.add_argument('--models', default='harvestiq/models/')
+    parser.add_argument('--output', default='harvestiq/output/recommendations')
+    parser.add_argument('--prediction-date', default='2024-11-01')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--scaling', action='store_true', help="Report throughput for 1, 2, 4, ... --workers")
+    args = parser.parse_args()
+
+    prediction_date = pd.to_datetime(args.prediction_date)
+    df = load_data(args.data, columns=FEATURE_COLUMNS, end_date=prediction_date)
+    # The API derives surplus ratios from the same history; product records only override flags and categories
+    catalog = ProductCatalog.from_transactions(df)
+    if args.scaling:
+        print(scaling_report(df, prediction_date, args.output, args.models, args.top_n,
+                             args.workers, catalog).to_string(index=False))
+    else:
+        summary = score_all_customers(df, prediction_date, args.output, args.models, args.top_n, args.workers,
+                                      catalog=catalog)
+        print(f"Scored {summary['customers']} customers in {summary['seconds']:.1f}s "
+              f"({summary['customers_per_second']:.0f} customers/s) -> {args.output}")
@@ -0,0 +1,291 @@
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import sklearn
+from .generate_data import iter_dummy_data_chunks
+from .models import HarvestIQModels
+from .preprocessing import create_labels, feature_engineering
+from .recommendations import HarvestIQRecommender
+
+# Transactions per scale; customers and products grow with the data
+SCALES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+STAGES = ['generate', 'feature_engineering', 'create_labels', 'train', 'predict', 'recommend']
+
+PREDICTION_DATE = pd.Timestamp('2024-11-01')
+
+def scale_config(num_transactions, seed=42):
+    """
+    Synthetic data settings for a benchmark scale.
+
+    Parameters:
+    - num_transactions: Number of transactions
+    - seed: Generator seed
+
+    Returns:
+    - dict: Keyword arguments for iter_dummy_data_chunks
+    """
+    return {
+        'num_transactions': num_transactions,
+        'num_customers': max(100, num_transactions // 100),
+        'num_products': max(50, min(5000, num_transactions // 2000)),
+        'seed': seed,
+        'customer_skew': 0.8,
+        'product_skew': 1.1,
+        'seasonality': 0.4,
+    }
+
+def _rss_mb(field):
+    """Read VmRSS or VmHWM (peak) of this process in MB from /proc; None elsewhere."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux); False if unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+@contextmanager
+def measure():
+    """
+    Time a block and record how far its peak resident memory rose above the start.
+
+    On Linux the peak counter is reset first, so the peak belongs to this
+    block. Elsewhere it falls back to the process-wide maximum RSS, which
+    can include earlier stages.
+
+    Yields:
+    - dict: Filled with seconds and peak_memory_mb when the block exits
+    """
+    result = {}
+    resettable = _reset_peak_rss()
+    before = _rss_mb('VmRSS') if resettable else None
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
+        if resettable and before is not None:
+            result['peak_memory_mb'] = max(0.0, _rss_mb('VmHWM') - before)
+        else:
+            # ru_maxrss is in KB on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            result['peak_memory_mb'] = peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def _record(results, scale, stage, rows, unit, runs):
+    """Reduce repeated runs to the fastest time and the highest peak."""
+    seconds = min(run['seconds'] for run in runs)
+    results.append({
+        'scale': scale,
+        'stage': stage,
+        'rows': int(rows),
+        'unit': unit,
+        'seconds': round(seconds, 4),
+        'peak_memory_mb': round(max(run['peak_memory_mb'] for run in runs), 1),
+        'throughput': round(rows / seconds, 1) if seconds else None,
+    })
+    print(f"{scale:>4} {stage:<20} {seconds:9.3f}s {results[-1]['peak_memory_mb']:9.1f} MB "
+          f"{results[-1]['throughput'] or 0:14,.0f} {unit}/s", flush=True)
+
+def _run(stage_fn, repeat):
+    runs, value = [], None
+    for _ in range(repeat):
+        with measure() as run:
+            value = stage_fn()
+        runs.append(run)
+    return value, runs
+
+def run_scale(scale, num_transactions, stages=STAGES, repeat=1, seed=42, max_train_rows=200_000,
+              max_predict_rows=100_000, num_requests=200):
+    """
+    Benchmark every stage of the pipeline on one synthetic dataset.
+
+    Training uses at most max_train_rows feature rows and prediction at most
+    max_predict_rows, sampled with the seed, so the forests stay comparable
+    between scales and large scales finish in reasonable time. Stages that a
+    requested stage depends on are run (untimed) when not requested.
+
+    Parameters:
+    - scale: Label of the scale, e.g. '1m'
+    - num_transactions: Transactions to generate
+    - stages: Stages to time, from STAGES
+    - repeat: Runs per stage; the fastest time and highest peak are kept
+    - seed: Seed for data generation and sampling
+    - max_train_rows: Training rows cap
+    - max_predict_rows: Prediction batch size cap
+    - num_requests: recommend_for_customer calls timed
+
+    Returns:
+    - list: One result dict per stage
+    """
+    results = []
+    rng = np.random.default_rng(seed)
+    config = scale_config(num_transactions, seed)
+
+    def generate():
+        return pd.concat(iter_dummy_data_chunks(**config), ignore_index=True)
+
+    def timed(stage, fn, rows, unit):
+        if stage not in stages:
+            return fn()
+        value, runs = _run(fn, repeat)
+        _record(results, scale, stage, rows() if callable(rows) else rows, unit, runs)
+        return value
+
+    df = timed('generate', generate, num_transactions, 'transactions')
+    historical_df = df[df['purchase_date'] <= PREDICTION_DATE]
+
+    features = None
+    if set(stages) - {'generate'}:
+        features = timed('feature_engineering', lambda: feature_engineering(df, PREDICTION_DATE),
+                         len(historical_df), 'transactions')
+
+    needs_models = set(stages) & {'train', 'predict', 'recommend'}
+    labeled = None
+    if 'create_labels' in stages or needs_models:
+        labeled = timed('create_labels', lambda: (create_labels(df, features, PREDICTION_DATE, 7),
+                                                  create_labels(df, features, PREDICTION_DATE, 14)),
+                        len(features), 'pairs')
+
+    models = None
+    if needs_models:
+        train_rows = np.sort(rng.choice(len(features), size=min(max_train_rows, len(features)), replace=False))
+        data_7d, data_14d = (data.iloc[train_rows].reset_index(drop=True) for data in labeled)
+
+        def train():
+            trained = HarvestIQModels()
+            # Metrics are not part of the benchmark output
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                trained.train_parallel(data_7d, data_14d)
+            trained.compile()
+            return trained
+
+        models = timed('train', train, len(train_rows), 'rows')
+
+    if 'predict' in stages:
+        predict_rows = rng.choice(len(features), size=min(max_predict_rows, len(features)), replace=False)
+        batch = features.iloc[predict_rows]
+        timed('predict', lambda: models.predict(batch, 7), len(batch), 'rows')
+
+    if 'recommend' in stages:
+        recommender = HarvestIQRecommender(models=models)
+        recommender.build_candidate_index(historical_df, PREDICTION_DATE)  # Built once per data version, untimed
+        customers = historical_df['customer_id'].unique()
+        requested = rng.choice(customers, size=min(num_requests, len(customers)), replace=False)
+
+        def recommend():
+            for customer_id in requested:
+                recommender.recommend_for_customer(None, customer_id, PREDICTION_DATE, top_n=10)
+
+        timed('recommend', recommend, len(requested), 'requests')
+
+    return results
+
+def environment():
+    """Versions and hardware the results were measured on."""
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def run_benchmarks(scales=('10k', '1m', '10m'), **kwargs):
+    """
+    Run run_scale for each scale.
+
+    Parameters:
+    - scales: Keys of SCALES
+    - **kwargs: Passed through to run_scale
+
+    Returns:
+    - dict: {'environment': ..., 'settings': ..., 'results': [...]}
+    """
+    results = []
+    for scale in scales:
+        results.extend(run_scale(scale, SCALES[scale], **kwargs))
+    return {'environment': environment(), 'settings': {'scales': list(scales), **kwargs}, 'results': results}
+
+def compare_results(baseline, current, threshold=0.2, min_seconds=0.05, min_memory_mb=8.0):
+    """
+    Compare two benchmark runs stage by stage.
+
+    A stage regresses when its time or peak memory grows by more than
+    threshold (relative) over the baseline. Growth below min_seconds or
+    min_memory_mb is timer and allocator noise and is never flagged.
+
+    Parameters:
+    - baseline: Earlier run_benchmarks output
+    - current: New run_benchmarks output
+    - threshold: Allowed relative increase, e.g. 0.2 for 20%
+    - min_seconds: Smallest absolute slowdown flagged
+    - min_memory_mb: Smallest absolute memory growth flagged
+
+    Returns:
+    - pd.DataFrame: One row per stage present in both runs, with time and
+      memory ratios and a regression flag
+    """
+    keys = ['scale', 'stage']
+    old = pd.DataFrame(baseline['results'])
+    new = pd.DataFrame(current['results'])
+    if old.empty or new.empty:
+        return pd.DataFrame(columns=keys + ['time_ratio', 'memory_ratio', 'regression'])
+    merged = old.merge(new, on=keys, suffixes=('_baseline', '_current'))
+    merged['time_ratio'] = merged['seconds_current'] / merged['seconds_baseline']
+    merged['memory_ratio'] = merged['peak_memory_mb_current'] / merged['peak_memory_mb_baseline']
+    slower = ((merged['time_ratio'] > 1 + threshold) &
+              (merged['seconds_current'] - merged['seconds_baseline'] >= min_seconds))
+    larger = ((merged['memory_ratio'] > 1 + threshold) &
+              (merged['peak_memory_mb_current'] - merged['peak_memory_mb_baseline'] >= min_memory_mb))
+    merged['regression'] = slower | larger
+    return merged[keys + ['seconds_baseline', 'seconds_current', 'time_ratio',
+                          'peak_memory_mb_baseline', 'peak_memory_mb_current', 'memory_ratio', 'regression']]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark HarvestIQ pipeline stages on seeded synthetic data.")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['10k', '1m', '10m'])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='harvestiq/benchmarks/results.json')
+    parser.add_argument('--baseline', default=None, help="Earlier results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown or memory growth flagged as a regression")
+    args = parser.parse_args()
+
+    run = run_benchmarks(args.scales, stages=args.stages, repeat=args.repeat, seed=args.seed)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare_results(json.load(f), run, args.threshold)
+        print(comparison.to_string(index=False, float_format='{:.3f}'.format))
+        regressions = comparison[comparison['regression']]
+        if not regressions.empty:
+            print(f"{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,119 @@
+import threading
+import numpy as np
+import pandas as pd
+from .preprocessing import feature_engineering
+
+PRODUCT_FEATURE_COLUMNS = ['product_total_sales', 'product_avg_price', 'product_surplus_ratio']
+# Customer-product features of a pair with no purchases; cp_recency_days is set per index
+UNSEEN_PAIR_FEATURES = {'cp_total_purchases': 0, 'cp_avg_quantity': 0.0, 'cp_purchase_count': 0,
+                        'cp_days_since_first': 0, 'cp_avg_interval': 0.0, 'cp_last_month': 0}
+
+class CandidateIndex:
+    """
+    Candidate feature rows for every customer, built once per data version.
+
+    The full feature frame (customer-product rows already joined with customer
+    and product aggregates) is kept sorted by customer, and each customer maps
+    to the slice of rows that belongs to them.
+    """
+
+    def __init__(self, features, prediction_date, data_version=None):
+        self.features = features.sort_values('customer_id', kind='stable').reset_index(drop=True)
+        self.prediction_date = prediction_date
+        self.data_version = data_version
+
+        customers = self.features['customer_id'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, customers[1:] != customers[:-1]]) if len(customers) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(customers)]
+        self.offsets = dict(zip(customers[starts], zip(starts.tolist(), ends.tolist())))
+
+        # Product aggregates are the same on every row of a product
+        self.products = self.features.drop_duplicates('product_id').set_index('product_id')[PRODUCT_FEATURE_COLUMNS]
+        # Pairs never bought are scored as if last bought longer ago than any real pair
+        self.never_recency = int(self.features['cp_recency_days'].max()) + 1 if len(self.features) else 0
+
+    @classmethod
+    def build(cls, historical_df, prediction_date, data_version=None):
+        """
+        Build the index from transaction history.
+
+        Parameters:
+        - historical_df: Historical transactions
+        - prediction_date: Prediction date
+        - data_version: Identifier of the data the index was built from
+
+        Returns:
+        - CandidateIndex: Index over all customers
+        """
+        return cls(feature_engineering(historical_df, prediction_date), prediction_date, data_version)
+
+    def matches(self, prediction_date, data_version=None):
+        """Return True if the index was built for this prediction date and data version."""
+        return self.prediction_date == prediction_date and self.data_version == data_version
+
+    def get(self, customer_id):
+        """
+        Return the candidate feature block for a customer.
+
+        Parameters:
+        - customer_id: Customer ID
+
+        Returns:
+        - pd.DataFrame: Candidate features (empty for unknown customers)
+        """
+        span = self.offsets.get(customer_id)
+        if span is None:
+            return pd.DataFrame()
+        return self.features.iloc[span[0]:span[1]].reset_index(drop=True)
+
+    def unseen(self, customer_id, product_ids):
+        """
+        Candidate feature rows for products a customer has never bought.
+
+        Customer features are copied from the customer's own rows, product
+        features from the index, and pair features describe an empty history.
+
+        Parameters:
+        - customer_id: Customer ID (must have rows in the index)
+        - product_ids: Products to build rows for
+
+        Returns:
+        - pd.DataFrame: One row per product, with the columns of get()
+        """
+        span = self.offsets.get(customer_id)
+        if span is None or len(product_ids) == 0:
+            return pd.DataFrame(columns=self.features.columns)
+        rows = self.features.iloc[np.full(len(product_ids), span[0])].reset_index(drop=True)
+        rows['product_id'] = np.asarray(product_ids, dtype=object)
+        for col, value in UNSEEN_PAIR_FEATURES.items():
+            rows[col] = value
+        rows['cp_recency_days'] = self.never_recency
+        rows['cp_last_purchase_date'] = pd.NaT
+        products = self.products.reindex(rows['product_id']).fillna(0)
+        for col in PRODUCT_FEATURE_COLUMNS:
+            rows[col] = products[col].to_numpy()
+        return rows
+
+    def __len__(self):
+        return len(self.features)
+
+_index_lock = threading.Lock()
+_index = None
+
+def get_candidate_index(prediction_date, data_version, load_history):
+    """
+    Return the process-wide candidate index, rebuilding it when the data changes.
+
+    Parameters:
+    - prediction_date: Prediction date
+    - data_version: Identifier of the current transaction data
+    - load_history: Zero-argument callable returning the history; only called on rebuild
+
+    Returns:
+    - CandidateIndex: Index for this prediction date and data version
+    """
+    global _index
+    with _index_lock:
+        if _index is None or not _index.matches(prediction_date, data_version):
+            _index = CandidateIndex.build(load_history(), prediction_date, data_version)
+        return _index
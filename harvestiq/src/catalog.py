@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+def _take(values, rows, fill):
+    """Gather values at rows, using fill where rows is -1."""
+    result = np.full(len(rows), fill, dtype=values.dtype)
+    known = rows >= 0
+    result[known] = values[rows[known]]
+    return result
+
+class ProductCatalog:
+    """
+    Product attributes held as arrays aligned with a product_id index.
+
+    A lookup hashes each product_id once to a row position and gathers the
+    attribute arrays, so the cost is independent of the number of transactions.
+    """
+
+    def __init__(self, product_ids, category, surplus_flag, surplus_ratio, version=None):
+        self.index = pd.Index(product_ids, name='product_id')
+        self.category = np.asarray(category, dtype=object)
+        self.surplus_flag = np.asarray(surplus_flag, dtype=bool)
+        self.surplus_ratio = np.asarray(surplus_ratio, dtype=np.float64)
+        self.version = version
+
+    @classmethod
+    def from_transactions(cls, df, version=None):
+        """
+        Derive the catalog from transaction history.
+
+        The surplus flag is that of each product's most recent transaction and
+        the surplus ratio is the share of its transactions flagged as surplus.
+
+        Parameters:
+        - df: Transactions with product_id, purchase_date and surplus_flag
+          (product_category is used when present)
+        - version: Identifier of the data the catalog is built from
+
+        Returns:
+        - ProductCatalog: Catalog of every product in df
+        """
+        latest = df.sort_values('purchase_date', kind='stable').groupby('product_id').tail(1).set_index('product_id')
+        ratio = df.groupby('product_id')['surplus_flag'].mean()
+        latest = latest.reindex(ratio.index)
+        category = latest['product_category'] if 'product_category' in latest else pd.Series('', index=ratio.index)
+        return cls(ratio.index, category.to_numpy(), latest['surplus_flag'].to_numpy(), ratio.to_numpy(), version)
+
+    def with_products(self, products, version=None):
+        """
+        Overlay authoritative product records on this catalog.
+
+        Category and surplus flag come from the records; the surplus ratio is
+        kept from this catalog (0 for products without history).
+
+        Parameters:
+        - products: DataFrame with product_id, category and surplus_flag
+        - version: Version of the combined catalog
+
+        Returns:
+        - ProductCatalog: New catalog covering both sets of products
+        """
+        index = self.index.union(pd.Index(products['product_id']))
+        rows = self.index.get_indexer(index)
+        category = _take(self.category, rows, '')
+        surplus_flag = _take(self.surplus_flag, rows, False)
+        surplus_ratio = _take(self.surplus_ratio, rows, 0.0)
+
+        positions = index.get_indexer(products['product_id'])
+        category[positions] = products['category'].to_numpy()
+        surplus_flag[positions] = products['surplus_flag'].to_numpy(dtype=bool)
+        return ProductCatalog(index, category, surplus_flag, surplus_ratio, version)
+
+    def positions(self, product_ids):
+        """
+        Row positions of product IDs, -1 for unknown products.
+
+        Parameters:
+        - product_ids: Array-like of product IDs
+
+        Returns:
+        - np.ndarray: Positions into the attribute arrays
+        """
+        return self.index.get_indexer(product_ids)
+
+    def lookup(self, product_ids):
+        """
+        Category, surplus flag and surplus ratio of each product.
+
+        Unknown products get an empty category, no surplus flag and a 0 ratio.
+
+        Parameters:
+        - product_ids: Array-like of product IDs
+
+        Returns:
+        - pd.DataFrame: One row per requested product, in request order
+        """
+        rows = self.positions(product_ids)
+        return pd.DataFrame({
+            'product_id': np.asarray(product_ids),
+            'category': _take(self.category, rows, ''),
+            'surplus_flag': _take(self.surplus_flag, rows, False),
+            'surplus_ratio': _take(self.surplus_ratio, rows, 0.0),
+        })
+
+    def surplus_ratios(self, product_ids):
+        """
+        Surplus ratio of each product (0 for unknown products).
+
+        Parameters:
+        - product_ids: Array-like of product IDs
+
+        Returns:
+        - np.ndarray: Ratios in request order
+        """
+        return _take(self.surplus_ratio, self.positions(product_ids), 0.0)
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_integer_dtype
+from .storage import load_transactions
+
+# Compact purchase dates count days from this date
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+CODE_DTYPE = np.int32
+
+def day_number(date):
+    """Day number of a date (time of day is dropped)."""
+    return int((np.datetime64(pd.Timestamp(date), 'D') - EPOCH).astype(np.int64))
+
+def to_day_numbers(dates):
+    """
+    Convert datetimes to int32 day numbers.
+
+    Parameters:
+    - dates: Datetime Series or array
+
+    Returns:
+    - np.ndarray: int32 days since EPOCH
+    """
+    return (np.asarray(dates, dtype='datetime64[D]') - EPOCH).astype(np.int32)
+
+def from_day_numbers(days):
+    """
+    Convert day numbers back to datetimes at midnight.
+
+    Parameters:
+    - days: Integer array of days since EPOCH
+
+    Returns:
+    - np.ndarray: datetime64 values
+    """
+    return (EPOCH + np.asarray(days, dtype=np.int64).astype('timedelta64[D]')).astype('datetime64[ns]')
+
+def is_compact(df):
+    """True when df['purchase_date'] holds day numbers rather than datetimes."""
+    return is_integer_dtype(df['purchase_date'])
+
+class IdCodes:
+    """
+    Reversible mapping between customer/product IDs and dense integer codes.
+
+    Code i stands for the i-th ID in customer_ids (or product_ids). IDs first
+    seen when encoding further data are appended, so existing codes never change
+    and frames encoded with the same IdCodes can be joined on their codes.
+    Codes of the IDs added by one encoding follow the IDs' sort order.
+    """
+
+    def __init__(self, customer_ids=(), product_ids=()):
+        self.customer_ids = pd.Index(customer_ids, dtype=object)
+        self.product_ids = pd.Index(product_ids, dtype=object)
+
+    @staticmethod
+    def _encode(ids, values):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Encode each category once, then map the categorical's own codes
+            ids, category_codes = IdCodes._encode(ids, pd.Series(values.cat.categories.astype(object)))
+            return ids, np.append(category_codes, -1)[values.cat.codes.to_numpy()].astype(CODE_DTYPE)
+        codes = ids.get_indexer(values)
+        new = codes < 0
+        if new.any():
+            # New IDs get codes in sorted order, so on a fresh mapping grouping by
+            # code orders rows exactly as grouping by ID would
+            ids = ids.append(pd.Index(np.sort(pd.unique(np.asarray(values, dtype=object)[new])), dtype=object))
+            codes = ids.get_indexer(values)
+        return ids, codes.astype(CODE_DTYPE)
+
+    def encode_customers(self, values):
+        """Codes of customer IDs, adding unseen IDs."""
+        self.customer_ids, codes = self._encode(self.customer_ids, values)
+        return codes
+
+    def encode_products(self, values):
+        """Codes of product IDs, adding unseen IDs."""
+        self.product_ids, codes = self._encode(self.product_ids, values)
+        return codes
+
+    def decode_customers(self, codes):
+        """Customer IDs of codes."""
+        return self.customer_ids.take(np.asarray(codes))
+
+    def decode_products(self, codes):
+        """Product IDs of codes."""
+        return self.product_ids.take(np.asarray(codes))
+
+    def decode(self, df):
+        """
+        Restore IDs and dates in a frame derived from compact transactions.
+
+        Parameters:
+        - df: DataFrame with coded customer_id/product_id and day-number date columns
+
+        Returns:
+        - pd.DataFrame: Copy with string IDs and datetime purchase dates
+        """
+        df = df.copy()
+        if 'customer_id' in df:
+            df['customer_id'] = self.decode_customers(df['customer_id']).to_numpy()
+        if 'product_id' in df:
+            df['product_id'] = self.decode_products(df['product_id']).to_numpy()
+        for col in ['purchase_date', 'cp_last_purchase_date', 'last_purchase_date']:
+            if col in df and is_integer_dtype(df[col]):
+                df[col] = from_day_numbers(df[col])
+        return df
+
+def compact_transactions(df, codes=None):
+    """
+    Convert transactions to the compact representation.
+
+    - customer_id / product_id: int32 codes from codes
+    - purchase_date: int32 days since EPOCH (time of day is dropped)
+    - quantity: smallest integer type that holds every value
+    - price: float32
+    - surplus_flag: bool
+    Other columns (e.g. product_category) are kept, categories as pandas categoricals.
+
+    Parameters:
+    - df: Transactions as load_data returns them (IDs may be categoricals)
+    - codes: IdCodes to extend (default: a new one)
+
+    Returns:
+    - tuple: (compact DataFrame, IdCodes)
+    """
+    codes = IdCodes() if codes is None else codes
+    compact = {}
+    for col in df.columns:
+        values = df[col]
+        if col == 'customer_id':
+            compact[col] = codes.encode_customers(values)
+        elif col == 'product_id':
+            compact[col] = codes.encode_products(values)
+        elif col == 'purchase_date':
+            compact[col] = to_day_numbers(values)
+        elif col == 'quantity':
+            compact[col] = pd.to_numeric(values, downcast='integer').to_numpy()
+        elif col == 'price':
+            compact[col] = values.to_numpy(dtype=np.float32)
+        elif col == 'surplus_flag':
+            compact[col] = values.to_numpy(dtype=bool)
+        elif col == 'product_category':
+            compact[col] = values.astype('category')
+        elif col == 'month':
+            compact[col] = values.to_numpy(dtype=np.int8)
+        else:
+            compact[col] = values
+    return pd.DataFrame(compact, index=pd.RangeIndex(len(df))), codes
+
+def load_compact(filepath, columns=None, start_date=None, end_date=None, codes=None):
+    """
+    load_data in the compact representation.
+
+    Parameters:
+    - filepath: Path to the CSV file or store directory
+    - columns: Columns to read (default: all)
+    - start_date: Earliest purchase_date to include (inclusive)
+    - end_date: Latest purchase_date to include (inclusive)
+    - codes: IdCodes shared with other loads (default: a new one)
+
+    Returns:
+    - tuple: (compact DataFrame, IdCodes)
+    """
+    # IDs are read as categoricals, so one string per distinct ID is held, not one per row
+    df = load_transactions(filepath, columns=columns, start_date=start_date, end_date=end_date,
+                           categorical_ids=True)
+    return compact_transactions(df, codes)
+
+def memory_report(frames):
+    """
+    Memory used by each column of one or more frames, strings included.
+
+    Parameters:
+    - frames: dict of name -> DataFrame
+
+    Returns:
+    - pd.DataFrame: Megabytes per column and frame, with a total row
+    """
+    report = pd.DataFrame({name: df.memory_usage(deep=True, index=False) / 2**20 for name, df in frames.items()})
+    report.loc['total'] = report.sum()
+    return report.round(2)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from .preprocessing import feature_engineering
+
+    parser = argparse.ArgumentParser(description="Compare memory and feature timing of the compact representation.")
+    parser.add_argument('path', nargs='?', default='harvestiq/data/transactions.csv')
+    parser.add_argument('--prediction-date', default='2024-11-01')
+    args = parser.parse_args()
+
+    df = load_transactions(args.path)
+    compact, codes = load_compact(args.path)
+    report = memory_report({'standard': df, 'compact': compact})
+    report['ratio'] = (report['standard'] / report['compact']).round(1)
+    print(report.to_string())
+
+    prediction_date = pd.to_datetime(args.prediction_date)
+    for name, frame in [('standard', df), ('compact', compact)]:
+        start = time.perf_counter()
+        feature_engineering(frame, prediction_date)
+        print(f"feature_engineering on {name}: {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+from .models import BACKENDS, HarvestIQModels
+
+LABEL_COLUMNS = ['future_quantity', 'future_purchases', 'will_buy', 'window']
+
+def artifact_size_mb(path):
+    """Total size of the files under path in MB."""
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 2**20
+
+def predict_latencies(models, features, customer_ids):
+    """
+    Time predict_batch on one customer's feature rows at a time, as a recommendation request does.
+
+    Parameters:
+    - models: Trained HarvestIQModels
+    - features: Feature rows of many customers
+    - customer_ids: Customers to time, one call each
+
+    Returns:
+    - np.ndarray: Seconds per call
+    """
+    rows = features.groupby('customer_id', sort=False).indices
+    models.predict_batch(features.iloc[rows[customer_ids[0]]])  # Warm-up (first-call imports and allocations)
+    latencies = []
+    for customer_id in customer_ids:
+        batch = features.iloc[rows[customer_id]]
+        start = time.perf_counter()
+        models.predict_batch(batch)
+        latencies.append(time.perf_counter() - start)
+    return np.asarray(latencies)
+
+def compare_backends(data_7d, data_14d, backends=tuple(BACKENDS), max_train_rows=None, num_requests=500,
+                     seed=42, workdir=None):
+    """
+    Train every backend on the same data and measure what serving it would cost.
+
+    Each backend is trained with train_parallel, saved with save_models
+    (including the compiled forests where the backend has them), loaded back
+    into a fresh HarvestIQModels, and timed on single-customer predictions
+    from the loaded copy.
+
+    Parameters:
+    - data_7d: preprocess_data output for the 7-day window
+    - data_14d: preprocess_data output for the 14-day window (same rows)
+    - backends: Keys of BACKENDS
+    - max_train_rows: Train on at most this many rows, sampled with the seed (default: all)
+    - num_requests: Customers timed
+    - seed: Seed for row and customer sampling
+    - workdir: Directory to save the models in (default: a temporary directory)
+
+    Returns:
+    - pd.DataFrame: One row per backend with auc_7d, auc_14d, mae, train_seconds,
+      artifact_mb, load_seconds and p50_ms/p99_ms predict latency
+    """
+    rng = np.random.default_rng(seed)
+    if max_train_rows is not None and len(data_7d) > max_train_rows:
+        rows = np.sort(rng.choice(len(data_7d), size=max_train_rows, replace=False))
+        train_7d = data_7d.iloc[rows].reset_index(drop=True)
+        train_14d = data_14d.iloc[rows].reset_index(drop=True)
+    else:
+        train_7d, train_14d = data_7d, data_14d
+
+    features = data_7d.drop(columns=LABEL_COLUMNS, errors='ignore')
+    customers = features['customer_id'].unique()
+    requested = rng.choice(customers, size=min(num_requests, len(customers)), replace=False)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            models = HarvestIQModels(backend)
+            start = time.perf_counter()
+            # Metrics are returned below rather than printed
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                metrics = models.train_parallel(train_7d, train_14d)
+            train_seconds = time.perf_counter() - start
+
+            path = os.path.join(workdir or tmp, backend) + '/'
+            models.save_models(path)
+
+            start = time.perf_counter()
+            loaded = HarvestIQModels()
+            loaded.load_models(path)
+            load_seconds = time.perf_counter() - start
+
+            latencies = predict_latencies(loaded, features, requested) * 1000
+            results.append({
+                'backend': backend,
+                'auc_7d': metrics['classifier_7d']['auc'],
+                'auc_14d': metrics['classifier_14d']['auc'],
+                'mae': metrics['regressor']['mae'],
+                'train_seconds': train_seconds,
+                'artifact_mb': artifact_size_mb(path),
+                'load_seconds': load_seconds,
+                'p50_ms': np.percentile(latencies, 50),
+                'p99_ms': np.percentile(latencies, 99),
+            })
+            print(f"{backend:<24} AUC7 {results[-1]['auc_7d']:.4f}  p50 {results[-1]['p50_ms']:.2f} ms  "
+                  f"p99 {results[-1]['p99_ms']:.2f} ms", flush=True)
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    import argparse
+    from .preprocessing import preprocess_data
+
+    parser = argparse.ArgumentParser(description="Compare model backends on accuracy, artifact size and latency.")
+    parser.add_argument('--data', default='harvestiq/data/transactions')
+    parser.add_argument('--prediction-date', default='2024-11-01')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--max-train-rows', type=int, default=200_000)
+    parser.add_argument('--requests', type=int, default=500, help="Single-customer predictions timed per backend")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default=None, help="Keep the saved models here instead of a temporary directory")
+    args = parser.parse_args()
+
+    preprocessed = preprocess_data(args.data, args.prediction_date)
+    report = compare_backends(preprocessed['7d'], preprocessed['14d'], args.backends, args.max_train_rows,
+                              args.requests, args.seed, args.workdir)
+    print(report.to_string(index=False, float_format='{:.4f}'.format))
@@ -0,0 +1,351 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from .preprocessing import load_data
+
+# Transactions of one customer on one day form a basket
+BASKET_COLUMNS = ['customer_id', 'product_id', 'purchase_date']
+
+DEFAULT_TOP_K = 50
+
+class CooccurrenceIndex:
+    """
+    Sparse item-item co-occurrence counts with the top-K neighbours of every product.
+
+    counts[i, j] is the number of baskets (one customer, one day) holding both
+    products i and j. Neighbours are ranked by cosine similarity,
+    counts[i, j] / sqrt(baskets[i] * baskets[j]), so popular products do not
+    crowd out everything else. Retrieval for a customer reads the neighbour
+    lists of the products they bought, costing O(history x K) regardless of
+    catalog size.
+
+    The baskets of the latest day (the watermark's) are also kept as rows in
+    open_day. When more rows of that day arrive, its contribution is
+    subtracted and the whole day is counted again, so a basket split across
+    updates still counts once.
+    """
+
+    def __init__(self, top_k=DEFAULT_TOP_K):
+        self.top_k = top_k
+        self.products = pd.Index([], dtype=object, name='product_id')  # Code -> product_id
+        self.counts = sp.csr_matrix((0, 0), dtype=np.int64)
+        self.basket_counts = np.zeros(0, dtype=np.int64)  # Baskets holding each product
+        self.neighbors = np.full((0, top_k), -1, dtype=np.int32)  # Product codes, -1 padded
+        self.scores = np.zeros((0, top_k), dtype=np.float32)
+        self.open_day = None  # Basket rows of the watermark's day
+        self.watermark = None  # Latest purchase_date applied so far
+
+    @classmethod
+    def from_transactions(cls, df, top_k=DEFAULT_TOP_K):
+        """
+        Build the index from a transaction history.
+
+        Parameters:
+        - df: Transactions with customer_id, product_id and purchase_date
+        - top_k: Neighbours kept per product
+
+        Returns:
+        - CooccurrenceIndex: Index over df
+        """
+        return cls(top_k).apply(df)
+
+    def _product_codes(self, product_ids):
+        codes = self.products.get_indexer(product_ids)
+        new = codes < 0
+        if new.any():
+            self.products = self.products.append(
+                pd.Index(pd.unique(np.asarray(product_ids, dtype=object)[new]), dtype=object, name='product_id'))
+            codes = self.products.get_indexer(product_ids)
+        return codes
+
+    def _basket_cooccurrence(self, rows):
+        """
+        Co-occurrence and basket counts of the baskets in rows.
+
+        Parameters:
+        - rows: Transactions with customer_id, product_id and purchase_date (products already coded)
+
+        Returns:
+        - tuple: (counts with an empty diagonal, baskets holding each product)
+        """
+        product_codes = self.products.get_indexer(rows['product_id'].to_numpy())
+        n = len(self.products)
+        customer_codes, _ = pd.factorize(rows['customer_id'])
+        day_codes, days = pd.factorize(rows['purchase_date'].dt.normalize())
+        basket_codes, _ = pd.factorize(customer_codes.astype(np.int64) * len(days) + day_codes)
+
+        # Basket x product incidence, each product counted once per basket
+        cells = np.unique(basket_codes.astype(np.int64) * n + product_codes)
+        incidence = sp.csr_matrix((np.ones(len(cells), dtype=np.int64), (cells // n, cells % n)),
+                                  shape=(basket_codes.max() + 1, n))
+        counts = (incidence.T @ incidence).tocsr()
+        baskets = counts.diagonal()
+        counts.setdiag(0)
+        counts.eliminate_zeros()
+        return counts, baskets
+
+    def apply(self, delta):
+        """
+        Add the baskets of new transactions and refresh the neighbour lists.
+
+        Only the new rows are scanned, plus the open day's rows when delta
+        holds more of that day: the day is then subtracted and counted again
+        with the new rows, so its baskets are not counted twice.
+
+        Parameters:
+        - delta: Transactions with customer_id, product_id and purchase_date
+
+        Returns:
+        - CooccurrenceIndex: self
+        """
+        if delta.empty:
+            return self
+
+        delta = delta[BASKET_COLUMNS]
+        days = delta['purchase_date'].dt.normalize()
+        reopened = None
+        if self.open_day is not None:
+            open_day = self.open_day['purchase_date'].iloc[0].normalize()
+            if (days == open_day).any():
+                reopened = self.open_day
+                delta = pd.concat([reopened, delta], ignore_index=True)
+                days = delta['purchase_date'].dt.normalize()
+
+        self._product_codes(delta['product_id'].to_numpy())
+        n = len(self.products)
+        delta_counts, delta_baskets = self._basket_cooccurrence(delta)
+        if reopened is not None:
+            open_counts, open_baskets = self._basket_cooccurrence(reopened)
+            delta_counts = delta_counts - open_counts
+            delta_baskets = delta_baskets - open_baskets
+
+        self.counts.resize((n, n))
+        self.counts = (self.counts + delta_counts).tocsr()
+        self.counts.eliminate_zeros()
+        self.basket_counts = np.concatenate([self.basket_counts,
+                                             np.zeros(n - len(self.basket_counts), dtype=np.int64)])
+        self.basket_counts += delta_baskets
+
+        latest_day = days.max()
+        if self.open_day is None or latest_day >= self.open_day['purchase_date'].iloc[0].normalize():
+            # One row per basket and product is all a recount needs
+            self.open_day = delta[(days == latest_day).to_numpy()].drop_duplicates(
+                ['customer_id', 'product_id']).reset_index(drop=True)
+
+        latest = delta['purchase_date'].max()
+        self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+        self._select_neighbors()
+        return self
+
+    def _select_neighbors(self):
+        """Rank every product's co-occurring products and keep the top K (one sort over the non-zeros)."""
+        counts = self.counts
+        counts.sort_indices()
+        n = counts.shape[0]
+        rows = np.repeat(np.arange(n), np.diff(counts.indptr))
+        cols = counts.indices
+        similarity = counts.data / np.sqrt(self.basket_counts[rows] * self.basket_counts[cols])
+
+        # Grouped by row, best first; ties go to the lower product code
+        order = np.lexsort((cols, -similarity, rows))
+        rank = np.arange(len(order)) - counts.indptr[rows[order]]
+        keep = order[rank < self.top_k]
+        keep_rank = rank[rank < self.top_k]
+
+        self.neighbors = np.full((n, self.top_k), -1, dtype=np.int32)
+        self.scores = np.zeros((n, self.top_k), dtype=np.float32)
+        self.neighbors[rows[keep], keep_rank] = cols[keep]
+        self.scores[rows[keep], keep_rank] = similarity[keep]
+
+    def update_from(self, filepath, end_date=None):
+        """
+        Apply every transaction in a CSV or Parquet store from the watermark's day on.
+
+        The watermark's day is read again in full and recounted (see apply),
+        so rows of that day that arrived after the previous update are included.
+
+        Parameters:
+        - filepath: Path to the CSV file or store directory
+        - end_date: Latest purchase_date to include (inclusive)
+
+        Returns:
+        - CooccurrenceIndex: self
+        """
+        if self.watermark is None:
+            return self.apply(load_data(filepath, columns=BASKET_COLUMNS, end_date=end_date))
+        df = load_data(filepath, columns=BASKET_COLUMNS, start_date=self.watermark.normalize(), end_date=end_date)
+        if self.open_day is None:
+            # Saved before the open day was kept: its rows are counted and cannot be recounted
+            df = df[df['purchase_date'] > self.watermark]
+        return self.apply(df)
+
+    def neighbors_of(self, product_id):
+        """
+        Top-K co-purchased products of one product.
+
+        Parameters:
+        - product_id: Product ID
+
+        Returns:
+        - pd.DataFrame: product_id and similarity, best first (empty for unknown products)
+        """
+        code = self.products.get_indexer([product_id])[0]
+        if code < 0:
+            return pd.DataFrame({'product_id': [], 'similarity': []})
+        found = self.neighbors[code] >= 0
+        return pd.DataFrame({'product_id': self.products.take(self.neighbors[code][found]).to_numpy(),
+                             'similarity': self.scores[code][found]})
+
+    def candidates(self, product_ids, weights=None, n=20):
+        """
+        Products co-purchased with a customer's history that the customer has not bought.
+
+        The neighbour lists of the history products are merged, summing each
+        candidate's similarity weighted by its source product's weight.
+
+        Parameters:
+        - product_ids: Products the customer bought
+        - weights: Weight per history product, e.g. purchase counts (default: 1)
+        - n: Candidates to return
+
+        Returns:
+        - pd.DataFrame: product_id and cooccurrence_score, best first
+        """
+        codes = self.products.get_indexer(product_ids)
+        known = codes >= 0
+        weights = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=np.float64)
+        codes, weights = codes[known], weights[known]
+
+        neighbors = self.neighbors[codes].ravel()
+        scores = (self.scores[codes] * weights[:, None]).ravel()
+        found = (neighbors >= 0) & ~np.isin(neighbors, codes)
+        unique, inverse = np.unique(neighbors[found], return_inverse=True)
+        totals = np.bincount(inverse, weights=scores[found], minlength=len(unique))
+
+        best = np.lexsort((unique, -totals))[:n]
+        return pd.DataFrame({'product_id': self.products.take(unique[best]).to_numpy(),
+                             'cooccurrence_score': totals[best]})
+
+    def save(self, path):
+        """
+        Persist the counts, product IDs and watermark.
+
+        Parameters:
+        - path: Directory to save the index in
+        """
+        os.makedirs(path, exist_ok=True)
+        sp.save_npz(os.path.join(path, 'counts.npz'), self.counts)
+        np.save(os.path.join(path, 'basket_counts.npy'), self.basket_counts)
+        pd.DataFrame({'product_id': self.products}).to_parquet(os.path.join(path, 'products.parquet'), index=False)
+        open_day_path = os.path.join(path, 'open_day.parquet')
+        if self.open_day is not None:
+            self.open_day.to_parquet(open_day_path, index=False)
+        elif os.path.exists(open_day_path):
+            os.remove(open_day_path)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'top_k': self.top_k,
+                       'watermark': self.watermark.isoformat() if self.watermark is not None else None}, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save(); neighbour lists are recomputed from the counts.
+
+        Parameters:
+        - path: Directory the index was saved in
+
+        Returns:
+        - CooccurrenceIndex: Loaded index
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        index = cls(meta['top_k'])
+        index.products = pd.Index(pd.read_parquet(os.path.join(path, 'products.parquet'))['product_id'],
+                                  dtype=object, name='product_id')
+        index.counts = sp.load_npz(os.path.join(path, 'counts.npz')).tocsr()
+        index.basket_counts = np.load(os.path.join(path, 'basket_counts.npy'))
+        open_day_path = os.path.join(path, 'open_day.parquet')
+        if os.path.exists(open_day_path):
+            index.open_day = pd.read_parquet(open_day_path)
+        index.watermark = pd.Timestamp(meta['watermark']) if meta['watermark'] else None
+        index._select_neighbors()
+        return index
+
+    def __len__(self):
+        return len(self.products)
+
+# Where the nightly update persists the index
+INDEX_PATH = 'harvestiq/data/cooccurrence'
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+def load_or_build_index(data_path, end_date=None, index_path=INDEX_PATH):
+    """
+    Bring the persisted index up to date with data_path, or build one from scratch.
+
+    The persisted index only needs the baskets after its watermark. It cannot
+    be used when it already holds baskets after end_date; the index is then
+    built from the history up to end_date.
+
+    Parameters:
+    - data_path: Transactions CSV or store
+    - end_date: Latest purchase_date to include (inclusive)
+    - index_path: Directory of the persisted index
+
+    Returns:
+    - CooccurrenceIndex: Index over data_path up to end_date
+    """
+    if os.path.isdir(index_path):
+        index = CooccurrenceIndex.load(index_path)
+        if index.watermark is None or end_date is None or index.watermark <= pd.Timestamp(end_date):
+            return index.update_from(data_path, end_date=end_date)
+    return CooccurrenceIndex.from_transactions(
+        load_data(data_path, columns=BASKET_COLUMNS, end_date=end_date))
+
+def get_cooccurrence_index(data_version, data_path, end_date=None, index_path=INDEX_PATH):
+    """
+    Return the process-wide co-occurrence index, refreshing it when the data changes.
+
+    A refresh loads the index persisted by the nightly update and applies
+    only the newer baskets (see load_or_build_index). The served index is
+    replaced rather than updated in place, so requests still holding it are
+    unaffected.
+
+    Parameters:
+    - data_version: Identifier of the current transaction data
+    - data_path: Transactions CSV or store
+    - end_date: Latest purchase_date to include (inclusive)
+    - index_path: Directory of the persisted index
+
+    Returns:
+    - CooccurrenceIndex: Index over the current data
+    """
+    global _index, _index_version
+    with _index_lock:
+        if _index is None or _index_version != data_version:
+            _index = load_or_build_index(data_path, end_date, index_path)
+            _index_version = data_version
+        return _index
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Add baskets newer than the watermark to the persisted index.")
+    parser.add_argument('--data', default='harvestiq/data/transactions')
+    parser.add_argument('--index', default=INDEX_PATH)
+    parser.add_argument('--end-date', default=None,
+                        help="Latest purchase date to include, e.g. the API's prediction date (default: all)")
+    args = parser.parse_args()
+
+    end_date = pd.to_datetime(args.end_date) if args.end_date else None
+    index = load_or_build_index(args.data, end_date, args.index)
+    index.save(args.index)
+    if index.watermark is None:
+        print(f"Co-occurrence index saved to {args.index}; no transactions found")
+    else:
+        print(f"Co-occurrence index over {len(index)} products updated through {index.watermark.date()}")
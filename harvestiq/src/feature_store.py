@@ -0,0 +1,385 @@
+import json
+import os
+import pandas as pd
+import numpy as np
+from .preprocessing import load_data
+from .storage import FEATURE_COLUMNS, iter_transactions
+
+PAIR_KEY = ['customer_id', 'product_id']
+
+# How partial aggregates of the same key are combined
+PAIR_AGGREGATES = {'cp_total_purchases': 'sum', 'cp_purchase_count': 'sum',
+                   'cp_first_purchase_date': 'min', 'cp_last_purchase_date': 'max'}
+PRODUCT_AGGREGATES = {'product_total_sales': 'sum', 'purchase_count': 'sum', 'price_sum': 'sum',
+                      'surplus_sum': 'sum'}
+
+def _upsert(table, delta, sum_cols=(), min_cols=(), max_cols=()):
+    """
+    Merge per-key delta aggregates into a running aggregate table.
+
+    Existing keys are located with an index lookup and updated in place; new
+    keys are appended. The work is proportional to the size of the delta.
+
+    Parameters:
+    - table: Running aggregates indexed by key (or None for an empty table)
+    - delta: Aggregates of the new transactions, same index names and columns
+    - sum_cols: Columns combined by addition
+    - min_cols: Columns combined by minimum
+    - max_cols: Columns combined by maximum
+
+    Returns:
+    - tuple: (updated table, boolean mask of delta rows that were new keys)
+    """
+    if table is None:
+        return delta.copy(), np.ones(len(delta), dtype=bool)
+
+    pos = table.index.get_indexer(delta.index)
+    known = pos >= 0
+    if known.any():
+        rows = pos[known]
+        for col, combine in ([(c, np.add) for c in sum_cols] +
+                             [(c, np.minimum) for c in min_cols] +
+                             [(c, np.maximum) for c in max_cols]):
+            j = table.columns.get_loc(col)
+            current = table.iloc[rows, j].to_numpy()
+            table.iloc[rows, j] = combine(current, delta[col].to_numpy()[known])
+    if not known.all():
+        table = pd.concat([table, delta[~known]])
+    return table, ~known
+
+class FeatureStore:
+    """
+    Persisted running aggregates from which feature_engineering's frame can be
+    rebuilt for any cutoff at or after the latest applied transaction.
+
+    Transactions of the latest day (the watermark's) are kept raw in
+    open_rows rather than folded into the aggregates. Rows of that day that
+    arrive late are then merged by re-reading the whole day (update_from),
+    and the day is folded in once a later day arrives.
+    """
+
+    def __init__(self):
+        self.customers = None  # total_purchases, purchase_count, num_unique_products, last_purchase_date
+        self.products = None   # product_total_sales, purchase_count, price_sum, surplus_sum
+        self.pairs = None      # cp_total_purchases, cp_purchase_count, cp_first/last_purchase_date
+        self.open_rows = None  # Transactions of the watermark's day, not yet in the aggregates
+        self.watermark = None  # Latest purchase_date applied so far
+
+    @classmethod
+    def from_transactions(cls, df):
+        """
+        Build a feature store from a full transaction history.
+
+        Parameters:
+        - df: Transaction DataFrame
+
+        Returns:
+        - FeatureStore: Store holding aggregates of df
+        """
+        store = cls()
+        store.apply(df)
+        return store
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Build a feature store from transactions that arrive in chunks, e.g. iter_transactions.
+
+        Each chunk is reduced to partial aggregates per customer-product pair
+        and per product (sums, counts, first/last date). Partials are merged
+        with a groupby of the same reductions once they outgrow the merged
+        table, so every pair is re-reduced only a logarithmic number of times.
+        Customer aggregates, distinct product counts included, are derived
+        from the pairs at the end. Memory is bounded by the number of pairs
+        and products plus one chunk, never by the length of the history.
+
+        Parameters:
+        - chunks: Iterable of transaction DataFrames
+
+        Returns:
+        - FeatureStore: Store holding aggregates of all chunks
+        """
+        def combine(tables, level, aggregates):
+            if len(tables) == 1:
+                return tables[0]
+            return pd.concat(tables).groupby(level=level, sort=False).agg(aggregates)
+
+        store = cls()
+        pairs = products = None
+        pending_pairs, pending_products, pending_rows = [], [], 0
+        for chunk in chunks:
+            # Rows of the latest day seen so far are held back as the store's open day
+            if store.open_rows is not None:
+                chunk = pd.concat([store.open_rows, chunk], ignore_index=True)
+            if chunk.empty:
+                continue
+            days = chunk['purchase_date'].dt.normalize()
+            latest_day = days == days.max()
+            store.open_rows = chunk[latest_day].reset_index(drop=True)
+            chunk = chunk[~latest_day]
+            if chunk.empty:
+                continue
+
+            pending_pairs.append(chunk.groupby(PAIR_KEY, sort=False).agg(
+                cp_total_purchases=('quantity', 'sum'),
+                cp_purchase_count=('quantity', 'count'),
+                cp_first_purchase_date=('purchase_date', 'min'),
+                cp_last_purchase_date=('purchase_date', 'max')
+            ))
+            pending_products.append(chunk.groupby('product_id', sort=False).agg(
+                product_total_sales=('quantity', 'sum'),
+                purchase_count=('quantity', 'count'),
+                price_sum=('price', 'sum'),
+                surplus_sum=('surplus_flag', 'sum')
+            ))
+            pending_rows += len(pending_pairs[-1])
+
+            if pending_rows >= (0 if pairs is None else len(pairs)):
+                pairs = combine(([] if pairs is None else [pairs]) + pending_pairs, PAIR_KEY, PAIR_AGGREGATES)
+                products = combine(([] if products is None else [products]) + pending_products, 'product_id',
+                                   PRODUCT_AGGREGATES)
+                pending_pairs, pending_products, pending_rows = [], [], 0
+
+        if store.open_rows is not None:
+            store.watermark = store.open_rows['purchase_date'].max()
+        if pairs is None:
+            return store
+        store.pairs = combine([pairs] + pending_pairs, PAIR_KEY, PAIR_AGGREGATES)
+        store.products = combine([products] + pending_products, 'product_id', PRODUCT_AGGREGATES)
+        store.customers = store.pairs.groupby(level='customer_id').agg(
+            total_purchases=('cp_total_purchases', 'sum'),
+            purchase_count=('cp_purchase_count', 'sum'),
+            last_purchase_date=('cp_last_purchase_date', 'max'),
+            num_unique_products=('cp_purchase_count', 'size')
+        )
+        return store
+
+    @classmethod
+    def stream(cls, filepath, end_date=None, chunk_size=1_000_000):
+        """
+        Build a feature store by reading a CSV file or Parquet store chunk by chunk.
+
+        Parameters:
+        - filepath: Path to the CSV file or store directory
+        - end_date: Latest purchase_date to include (inclusive), e.g. the prediction date
+        - chunk_size: Transactions read per chunk
+
+        Returns:
+        - FeatureStore: Store holding aggregates of the history
+        """
+        return cls.from_chunks(iter_transactions(filepath, columns=FEATURE_COLUMNS, end_date=end_date,
+                                                 chunk_size=chunk_size))
+
+    def apply(self, delta):
+        """
+        Add a batch of new transactions.
+
+        Rows of the latest day present (in delta or open_rows) become the open
+        day; all earlier rows are folded into the aggregates.
+
+        Parameters:
+        - delta: Transaction DataFrame with the new rows only
+
+        Returns:
+        - FeatureStore: self
+        """
+        if delta.empty:
+            return self
+
+        rows = delta if self.open_rows is None else pd.concat([self.open_rows, delta], ignore_index=True)
+        days = rows['purchase_date'].dt.normalize()
+        latest_day = (days == days.max()).to_numpy()
+        self._fold(rows[~latest_day])
+        self.open_rows = rows[latest_day].reset_index(drop=True)
+
+        latest = delta['purchase_date'].max()
+        self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+        return self
+
+    def _fold(self, delta):
+        """Merge transactions into the aggregates."""
+        if delta.empty:
+            return
+
+        pair_delta = delta.groupby(PAIR_KEY).agg(
+            cp_total_purchases=('quantity', 'sum'),
+            cp_purchase_count=('quantity', 'count'),
+            cp_first_purchase_date=('purchase_date', 'min'),
+            cp_last_purchase_date=('purchase_date', 'max')
+        )
+        self.pairs, new_pairs = _upsert(self.pairs, pair_delta,
+                                        sum_cols=['cp_total_purchases', 'cp_purchase_count'],
+                                        min_cols=['cp_first_purchase_date'],
+                                        max_cols=['cp_last_purchase_date'])
+
+        # A customer's distinct products grow by the number of pairs seen for the first time
+        customer_delta = delta.groupby('customer_id').agg(
+            total_purchases=('quantity', 'sum'),
+            purchase_count=('quantity', 'count'),
+            last_purchase_date=('purchase_date', 'max')
+        )
+        new_pair_counts = pair_delta.index[new_pairs].get_level_values('customer_id').value_counts()
+        customer_delta['num_unique_products'] = (
+            new_pair_counts.reindex(customer_delta.index, fill_value=0).astype('int64')
+        )
+        self.customers, _ = _upsert(self.customers, customer_delta,
+                                    sum_cols=['total_purchases', 'purchase_count', 'num_unique_products'],
+                                    max_cols=['last_purchase_date'])
+
+        product_delta = delta.groupby('product_id').agg(
+            product_total_sales=('quantity', 'sum'),
+            purchase_count=('quantity', 'count'),
+            price_sum=('price', 'sum'),
+            surplus_sum=('surplus_flag', 'sum')
+        )
+        self.products, _ = _upsert(self.products, product_delta,
+                                   sum_cols=['product_total_sales', 'purchase_count', 'price_sum', 'surplus_sum'])
+
+    def _with_open_day(self):
+        """Copy of the aggregates with the open day folded in."""
+        if self.open_rows is None or self.open_rows.empty:
+            return self
+        combined = FeatureStore()
+        for name in ['customers', 'products', 'pairs']:
+            table = getattr(self, name)
+            setattr(combined, name, None if table is None else table.copy())
+        combined._fold(self.open_rows)
+        return combined
+
+    def update_from(self, filepath, end_date=None):
+        """
+        Apply every transaction in a CSV or Parquet store from the watermark's day on.
+
+        The open day is read again in full and replaces open_rows, so rows of
+        that day that arrived after the previous update are included.
+
+        Parameters:
+        - filepath: Path to the CSV file or store directory
+        - end_date: Latest purchase_date to include (inclusive)
+
+        Returns:
+        - FeatureStore: self
+        """
+        if self.watermark is None:
+            return self.apply(load_data(filepath, end_date=end_date))
+        open_day = self.watermark.normalize()
+        df = load_data(filepath, start_date=open_day, end_date=end_date)
+        if self.open_rows is None:
+            # Saved before the open day was kept apart: its rows are already in the aggregates
+            df = df[df['purchase_date'] > self.watermark]
+        else:
+            self.open_rows = None
+        return self.apply(df)
+
+    def to_features(self, prediction_date):
+        """
+        Produce the feature frame feature_engineering would build at prediction_date.
+
+        Parameters:
+        - prediction_date: Feature cutoff; must not precede the latest applied transaction
+
+        Returns:
+        - pd.DataFrame: Feature-engineered data
+        """
+        if self.watermark is None:
+            raise ValueError("Feature store is empty")
+        if prediction_date < self.watermark:
+            raise ValueError(f"Feature store holds transactions up to {self.watermark.date()}, "
+                             f"after the requested cutoff {prediction_date.date()}")
+
+        store = self._with_open_day()
+        pairs = store.pairs.sort_index()
+        features = pairs.reset_index()
+        features['cp_avg_quantity'] = features['cp_total_purchases'] / features['cp_purchase_count']
+        features['cp_recency_days'] = (prediction_date - features['cp_last_purchase_date']).dt.days
+        features['cp_days_since_first'] = (
+            features['cp_last_purchase_date'] - features.pop('cp_first_purchase_date')
+        ).dt.days
+        features['cp_avg_interval'] = (
+            features['cp_days_since_first'] / (features['cp_purchase_count'] - 1)
+        ).where(features['cp_purchase_count'] > 1, 0.0)
+        features['cp_last_month'] = features['cp_last_purchase_date'].dt.month
+
+        customer_features = store.customers.reset_index()
+        customer_features['avg_quantity'] = (customer_features['total_purchases'] /
+                                             customer_features.pop('purchase_count'))
+        customer_features['recency_days'] = (prediction_date - customer_features['last_purchase_date']).dt.days
+
+        product_features = store.products.reset_index()
+        product_count = product_features.pop('purchase_count')
+        product_features['product_avg_price'] = product_features.pop('price_sum') / product_count
+        product_features['product_surplus_ratio'] = product_features.pop('surplus_sum') / product_count
+
+        features = features[['customer_id', 'product_id', 'cp_total_purchases', 'cp_avg_quantity',
+                             'cp_purchase_count', 'cp_last_purchase_date', 'cp_recency_days',
+                             'cp_days_since_first', 'cp_avg_interval', 'cp_last_month']]
+
+        # Left joins on customer_id/product_id: look up each distinct index level
+        # value once, then gather rows through the MultiIndex codes
+        customer_rows = store.customers.index.get_indexer(pairs.index.levels[0])[pairs.index.codes[0]]
+        product_rows = store.products.index.get_indexer(pairs.index.levels[1])[pairs.index.codes[1]]
+        joined = {}
+        for col in ['total_purchases', 'avg_quantity', 'num_unique_products', 'last_purchase_date', 'recency_days']:
+            joined[col] = customer_features[col].to_numpy()[customer_rows]
+        for col in ['product_total_sales', 'product_avg_price', 'product_surplus_ratio']:
+            joined[col] = product_features[col].to_numpy()[product_rows]
+        features = pd.concat([features, pd.DataFrame(joined, index=features.index)], axis=1)
+
+        # Fill NaN for new customers/products
+        features = features.fillna(0)
+
+        return features
+
+    def save(self, path):
+        """
+        Persist the store as Parquet tables plus a small metadata file.
+
+        Parameters:
+        - path: Directory to save the store in
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ['customers', 'products', 'pairs']:
+            table_path = os.path.join(path, f'{name}.parquet')
+            table = getattr(self, name)
+            if table is not None:
+                table.reset_index().to_parquet(table_path, index=False)
+            elif os.path.exists(table_path):
+                os.remove(table_path)
+        if self.open_rows is not None:
+            self.open_rows.to_parquet(os.path.join(path, 'open.parquet'), index=False)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'watermark': self.watermark.isoformat()}, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a store saved with save().
+
+        Parameters:
+        - path: Directory the store was saved in
+
+        Returns:
+        - FeatureStore: Loaded store
+        """
+        store = cls()
+        for name, key in [('customers', 'customer_id'), ('products', 'product_id'), ('pairs', PAIR_KEY)]:
+            table_path = os.path.join(path, f'{name}.parquet')
+            if os.path.exists(table_path):
+                setattr(store, name, pd.read_parquet(table_path).set_index(key))
+        open_path = os.path.join(path, 'open.parquet')
+        if os.path.exists(open_path):
+            # Stores saved before the open day was kept apart have none
+            store.open_rows = pd.read_parquet(open_path)
+        with open(os.path.join(path, 'meta.json')) as f:
+            store.watermark = pd.Timestamp(json.load(f)['watermark'])
+        return store
+
+if __name__ == "__main__":
+    # Nightly update: fold transactions newer than the watermark into the persisted store
+    store_path = 'harvestiq/data/feature_store'
+    if os.path.isdir(store_path):
+        store = FeatureStore.load(store_path).update_from('harvestiq/data/transactions')
+    else:
+        store = FeatureStore.from_transactions(load_data('harvestiq/data/transactions'))
+    store.save(store_path)
+    print(f"Feature store updated through {store.watermark.date()}")
@@ -54,8 +54,158 @@ def generate_dummy_data(num_customers=1000, num_products=50, num_transactions=10
     df['purchase_date'] = pd.to_datetime(df['purchase_date'])  # Ensure datetime
     return df
 
+def popularity_weights(n, skew, rng):
+    """
+    Build Zipf-like popularity weights for n entities.
+
+    Parameters:
+    - n: Number of entities
+    - skew: Zipf exponent (0 gives uniform popularity)
+    - rng: np.random.Generator used to shuffle which entity gets which rank
+
+    Returns:
+    - np.ndarray: Probabilities summing to 1
+    """
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    rng.shuffle(weights)  # Popular entities are not always the lowest IDs
+    return weights / weights.sum()
+
+def seasonal_day_weights(start_date, num_days, amplitude=0.0, peak_day_of_year=180):
+    """
+    Build sampling weights for purchase dates with a yearly seasonal cycle.
+
+    Parameters:
+    - start_date: First date of the range
+    - num_days: Number of days in the range
+    - amplitude: Strength of the seasonal cycle, 0 (flat) to 1 (no sales at the trough)
+    - peak_day_of_year: Day of year with the most traffic
+
+    Returns:
+    - np.ndarray: Probabilities summing to 1
+    """
+    if not 0 <= amplitude <= 1:
+        # Above 1 the trough weights turn negative
+        raise ValueError(f"Seasonal amplitude must be between 0 and 1, got {amplitude}")
+    day_of_year = pd.date_range(start_date, periods=num_days, freq='D').dayofyear.to_numpy()
+    weights = 1.0 + amplitude * np.cos(2 * np.pi * (day_of_year - peak_day_of_year) / 365.25)
+    return weights / weights.sum()
+
+def iter_dummy_data_chunks(num_customers=1000, num_products=50, num_transactions=10000,
+                           chunk_size=1_000_000, seed=42, customer_skew=0.0, product_skew=0.0,
+                           seasonality=0.0, peak_day_of_year=180):
+    """
+    Generate dummy transactions column-wise in fixed-size chunks.
+
+    Every column of a chunk is drawn with a single vectorized NumPy call, so the
+    cost per row is a few nanoseconds and memory is bounded by chunk_size. Each
+    chunk gets its own child seed, which makes the output reproducible for a
+    given (seed, chunk_size) pair.
+
+    Parameters:
+    - num_customers: Number of unique customers
+    - num_products: Number of unique products
+    - num_transactions: Total number of transactions
+    - chunk_size: Rows per yielded chunk
+    - seed: Seed for reproducibility
+    - customer_skew: Zipf exponent for customer activity (0 is uniform)
+    - product_skew: Zipf exponent for product popularity (0 is uniform)
+    - seasonality: Amplitude of the yearly purchase cycle (0 is flat)
+    - peak_day_of_year: Day of year with the most purchases
+
+    Yields:
+    - pd.DataFrame: Chunk of dummy transaction data
+    """
+    if not 0 <= seasonality <= 1:
+        raise ValueError(f"seasonality must be between 0 and 1, got {seasonality}")
+    catalog_seed, *chunk_seeds = np.random.SeedSequence(seed).spawn(
+        1 + -(-num_transactions // chunk_size)
+    )
+    catalog_rng = np.random.default_rng(catalog_seed)
+
+    # Catalog: IDs, categories and popularity are shared by all chunks
+    customers = np.array([f'CUST_{i:04d}' for i in range(1, num_customers + 1)], dtype=object)
+    products = np.array([f'PROD_{i:03d}' for i in range(1, num_products + 1)], dtype=object)
+    categories = np.array(['Fruits', 'Vegetables', 'Herbs', 'Leafy Greens'], dtype=object)
+    product_categories = categories[catalog_rng.integers(0, len(categories), num_products)]
+    customer_p = popularity_weights(num_customers, customer_skew, catalog_rng) if customer_skew else None
+    product_p = popularity_weights(num_products, product_skew, catalog_rng) if product_skew else None
+
+    start_date = np.datetime64('2023-01-01')
+    num_days = (np.datetime64('2024-12-31') - start_date).astype(int)
+    day_p = seasonal_day_weights(start_date, num_days, seasonality, peak_day_of_year) if seasonality else None
+
+    for chunk_index, chunk_seed in enumerate(chunk_seeds):
+        rng = np.random.default_rng(chunk_seed)
+        n = min(chunk_size, num_transactions - chunk_index * chunk_size)
+
+        customer_idx = rng.choice(num_customers, size=n, p=customer_p)
+        product_idx = rng.choice(num_products, size=n, p=product_p)
+        purchase_date = start_date + rng.choice(num_days, size=n, p=day_p).astype('timedelta64[D]')
+
+        yield pd.DataFrame({
+            'customer_id': customers[customer_idx],
+            'product_id': products[product_idx],
+            'product_category': product_categories[product_idx],
+            'purchase_date': pd.to_datetime(purchase_date),
+            'quantity': rng.poisson(2, n) + 1,  # Poisson distribution for quantity, min 1
+            'price': rng.uniform(1.0, 10.0, n),
+            'surplus_flag': (rng.random(n) < 0.2).astype(int),  # 20% chance of surplus
+            'month': (purchase_date.astype('datetime64[M]').astype(int) % 12 + 1)
+        })
+
+def write_dummy_data(filepath, chunk_size=1_000_000, **kwargs):
+    """
+    Stream generated transactions to a CSV file chunk by chunk.
+
+    Parameters:
+    - filepath: Output CSV path
+    - chunk_size: Rows generated and written per chunk
+    - **kwargs: Passed through to iter_dummy_data_chunks
+
+    Returns:
+    - int: Number of rows written
+    """
+    rows = 0
+    for i, chunk in enumerate(iter_dummy_data_chunks(chunk_size=chunk_size, **kwargs)):
+        chunk.to_csv(filepath, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        rows += len(chunk)
+    return rows
+
 if __name__ == "__main__":
-    # Generate and save dummy data
-    df = generate_dummy_data()
-    df.to_csv('harvestiq/data/transactions.csv', index=False)
-    print("Dummy dataset generated and saved to harvestiq/data/transactions.csv")
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate HarvestIQ dummy transactions.")
+    parser.add_argument('--output', default='harvestiq/data/transactions.csv')
+    parser.add_argument('--rows', type=int, default=None,
+                        help="Use the chunked vectorized generator for this many rows")
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=50)
+    # Options of the chunked generator only (default None marks them as not given)
+    parser.add_argument('--chunk-size', type=int, default=None, help="Rows per chunk (default: 1000000)")
+    parser.add_argument('--seed', type=int, default=None, help="Seed (default: 42)")
+    parser.add_argument('--customer-skew', type=float, default=None, help="Zipf exponent (default: 0, uniform)")
+    parser.add_argument('--product-skew', type=float, default=None, help="Zipf exponent (default: 0, uniform)")
+    parser.add_argument('--seasonality', type=float, default=None,
+                        help="Yearly cycle amplitude from 0 (flat, the default) to 1")
+    args = parser.parse_args()
+
+    chunked_only = {'--chunk-size': args.chunk_size, '--seed': args.seed, '--customer-skew': args.customer_skew,
+                    '--product-skew': args.product_skew, '--seasonality': args.seasonality}
+    if args.rows is None:
+        given = [option for option, value in chunked_only.items() if value is not None]
+        if given:
+            parser.error(f"{', '.join(given)} only apply with --rows")
+    if args.seasonality is not None and not 0 <= args.seasonality <= 1:
+        parser.error("--seasonality must be between 0 and 1")
+
+    if args.rows is None:
+        # Generate and save dummy data
+        df = generate_dummy_data(num_customers=args.customers, num_products=args.products)
+        df.to_csv(args.output, index=False)
+    else:
+        write_dummy_data(args.output, chunk_size=args.chunk_size or 1_000_000, num_customers=args.customers,
+                         num_products=args.products, num_transactions=args.rows,
+                         seed=42 if args.seed is None else args.seed,
+                         customer_skew=args.customer_skew or 0.0, product_skew=args.product_skew or 0.0,
+                         seasonality=args.seasonality or 0.0)
+    print(f"Dummy dataset generated and saved to {args.output}")
\ No newline at end of file
@@ -3,8 +3,9 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from src.generate_data import generate_dummy_data
+from src.storage import write_transaction_store
 from src.preprocessing import preprocess_data
-from src.models import HarvestIQModels
+from src.models import HarvestIQModels, publish_models
 from src.recommendations import HarvestIQRecommender
 
 def main():
@@ -17,11 +18,12 @@ def main():
     print("Generating dummy dataset...")
     df = generate_dummy_data()
     df.to_csv('harvestiq/data/transactions.csv', index=False)
+    write_transaction_store(df, 'harvestiq/data/transactions')
     print("Dummy data saved.")
 
     # Step 2: Preprocess data
     print("Preprocessing data...")
-    preprocessed = preprocess_data('harvestiq/data/transactions.csv')
+    preprocessed = preprocess_data('harvestiq/data/transactions')
     data_7d = preprocessed['7d']
     data_14d = preprocessed['14d']
     print("Preprocessing complete.")
@@ -29,9 +31,9 @@ def main():
     # Step 3: Train models
     print("Training models...")
     models = HarvestIQModels()
-    models.train_classifiers(data_7d, data_14d)
-    models.train_regressor(data_7d, data_14d)
-    models.save_models()
+    models.train_parallel(data_7d, data_14d)
+    models.train_embeddings(df[df['purchase_date'] <= pd.to_datetime('2024-11-01')])
+    publish_models(models)
     print("Models trained and saved.")
 
     # Step 4: Generate recommendations for a sample customer
@@ -39,6 +41,7 @@ def main():
     recommender = HarvestIQRecommender()
     sample_customer = df['customer_id'].iloc[0]  # First customer
     prediction_date = pd.to_datetime('2024-11-01')  # Same as in preprocessing
+    recommender.build_candidate_index(df, prediction_date)
     recommendations = recommender.recommend_for_customer(df, sample_customer, prediction_date, top_n=5)
 
     print(f"Top 5 recommendations for customer {sample_customer}:")
@@ -1,14 +1,115 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.ensemble import (HistGradientBoostingClassifier, HistGradientBoostingRegressor,
+                              RandomForestClassifier, RandomForestRegressor)
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, mean_absolute_error
 import joblib
+from .embeddings import EmbeddingTables, ImplicitALS
+from .tree_engine import compile_models, feature_matrix, is_compilable, load_compiled, save_compiled
+
+MODEL_FILES = ['classifier_7d.pkl', 'classifier_14d.pkl', 'regressor.pkl']
+
+# Estimator backend -> (classifier factory, regressor factory)
+BACKENDS = {
+    # 100 unbounded trees: the original models, large pickles and deep trees to walk
+    'random_forest': (lambda: RandomForestClassifier(n_estimators=100, random_state=42),
+                      lambda: RandomForestRegressor(n_estimators=100, random_state=42)),
+    'shallow_forest': (lambda: RandomForestClassifier(n_estimators=100, max_depth=10, min_samples_leaf=20,
+                                                      random_state=42),
+                       lambda: RandomForestRegressor(n_estimators=100, max_depth=10, min_samples_leaf=20,
+                                                     random_state=42)),
+    'hist_gradient_boosting': (lambda: HistGradientBoostingClassifier(random_state=42),
+                               lambda: HistGradientBoostingRegressor(random_state=42)),
+    # Linear baseline; quantities are fitted with ridge regression
+    'logistic_regression': (lambda: make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000)),
+                            lambda: make_pipeline(StandardScaler(), Ridge())),
+}
+
+DEFAULT_BACKEND = 'random_forest'
+
+def resolve_model_version(path='harvestiq/models/'):
+    """
+    Find the model set currently published under path.
+
+    Published sets live in versions/<version>/ and the CURRENT file names the
+    live one. Directories with only the flat pickles (from save_models) are
+    reported as a 'legacy-' version derived from the files' modification times.
+
+    Parameters:
+    - path: Models directory
+
+    Returns:
+    - tuple: (version, directory), or (None, None) if no models exist
+    """
+    try:
+        with open(os.path.join(path, 'CURRENT')) as f:
+            version = f.read().strip()
+        return version, os.path.join(path, 'versions', version) + '/'
+    except FileNotFoundError:
+        pass
+
+    try:
+        mtime = max(os.stat(os.path.join(path, name)).st_mtime_ns for name in MODEL_FILES)
+    except FileNotFoundError:
+        return None, None
+    return f'legacy-{mtime}', path
+
+def publish_models(models, path='harvestiq/models/', keep_versions=3):
+    """
+    Save a trained model set as a new version and make it current atomically.
+
+    The three pickles are written to a fresh versions/<version>/ directory first;
+    CURRENT is then swapped with os.replace, so readers see either the old set
+    or the new one, never a mix.
+
+    Parameters:
+    - models: Trained HarvestIQModels
+    - path: Models directory
+    - keep_versions: Number of most recent versions kept on disk
+
+    Returns:
+    - str: New version
+    """
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    versions_dir = os.path.join(path, 'versions')
+    models.save_models(os.path.join(versions_dir, version) + '/')
+
+    tmp_path = os.path.join(path, f'CURRENT.{uuid.uuid4().hex}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(path, 'CURRENT'))
+
+    # Drop the oldest versions, never the one just made current
+    older = sorted((v for v in os.listdir(versions_dir) if v != version),
+                   key=lambda v: os.path.getmtime(os.path.join(versions_dir, v)))
+    for old_version in older[:max(len(older) - (keep_versions - 1), 0)]:
+        shutil.rmtree(os.path.join(versions_dir, old_version), ignore_errors=True)
+    return version
 
 class HarvestIQModels:
-    def __init__(self):
-        self.classifier_7d = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.classifier_14d = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.regressor = RandomForestRegressor(n_estimators=100, random_state=42)
+    def __init__(self, backend=DEFAULT_BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend {backend!r}; choose from {sorted(BACKENDS)}")
+        self.backend = backend
+        make_classifier, make_regressor = BACKENDS[backend]
+        self.classifier_7d = make_classifier()
+        self.classifier_14d = make_classifier()
+        self.regressor = make_regressor()
+        # Array-backed copies of forests (see tree_engine), set by save/load/compile; None for other backends
+        self.compiled = None
+        # Optional EmbeddingTables for retrieving candidates the customer never bought
+        self.embeddings = None
 
     def prepare_features(self, df):
         """
@@ -41,6 +142,8 @@ class HarvestIQModels:
         - data_7d: Preprocessed data for 7-day window
         - data_14d: Preprocessed data for 14-day window
         """
+        self.compiled = None  # Retraining invalidates compiled forests
+
         # 7-day model
         X_7d, y_7d, _ = self.prepare_features(data_7d)
         X_train_7d, X_test_7d, y_train_7d, y_test_7d = train_test_split(X_7d, y_7d, test_size=0.2, random_state=42)
@@ -68,6 +171,8 @@ class HarvestIQModels:
         - data_7d: Preprocessed data for 7-day window
         - data_14d: Preprocessed data for 14-day window
         """
+        self.compiled = None  # Retraining invalidates compiled forests
+
         # Combine positive samples from both windows
         pos_7d = data_7d[data_7d['will_buy'] == 1]
         pos_14d = data_14d[data_14d['will_buy'] == 1]
@@ -82,6 +187,80 @@ class HarvestIQModels:
         mae = mean_absolute_error(y_test_reg, y_pred_reg)
         print(f"Regressor MAE: {mae:.4f}")
 
+    def train_parallel(self, data_7d, data_14d, n_jobs=None):
+        """
+        Train both classifiers and the regressor at the same time.
+
+        data_7d and data_14d hold the same feature rows with different labels,
+        so the feature matrix and train/test split are prepared once and shared.
+        The three fits run on threads (tree building releases the GIL) and the
+        cores are divided between forests. Every tree is seeded from random_state,
+        so the fitted models are the same as with train_classifiers/train_regressor.
+
+        Parameters:
+        - data_7d: Preprocessed data for 7-day window
+        - data_14d: Preprocessed data for 14-day window
+        - n_jobs: Cores to use in total (default: all)
+
+        Returns:
+        - dict: Per model, its metric and wall-clock training seconds
+        """
+        self.compiled = None  # Retraining invalidates compiled forests
+
+        X, y_7d, _ = self.prepare_features(data_7d)
+        _, y_14d, _ = self.prepare_features(data_14d)
+        keys = ['customer_id', 'product_id']
+        if not data_7d[keys].reset_index(drop=True).equals(data_14d[keys].reset_index(drop=True)):
+            raise ValueError("data_7d and data_14d must hold the same customer-product rows")
+        X = X.astype(np.float32)  # Trees work in float32; convert once for all three
+
+        # Same split train_test_split(X, y, ...) produces in train_classifiers
+        train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+        X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+
+        # Positive samples from both windows, as in train_regressor
+        pos_7d = np.flatnonzero(y_7d.to_numpy() == 1)
+        pos_14d = np.flatnonzero(y_14d.to_numpy() == 1)
+        positives = np.concatenate([pos_7d, pos_14d])
+        y_reg = np.concatenate([data_7d['future_quantity'].to_numpy()[pos_7d],
+                                data_14d['future_quantity'].to_numpy()[pos_14d]])
+        X_train_reg, X_test_reg, y_train_reg, y_test_reg = train_test_split(
+            X.iloc[positives], y_reg, test_size=0.2, random_state=42)
+
+        tasks = {
+            'classifier_7d': (self.classifier_7d, X_train, y_7d.iloc[train_idx], X_test, y_7d.iloc[test_idx]),
+            'classifier_14d': (self.classifier_14d, X_train, y_14d.iloc[train_idx], X_test, y_14d.iloc[test_idx]),
+            'regressor': (self.regressor, X_train_reg, y_train_reg, X_test_reg, y_test_reg),
+        }
+        cores_per_model = max(1, (n_jobs or os.cpu_count()) // len(tasks))
+
+        def fit(model, X_fit, y_fit, X_eval, y_eval):
+            start = time.perf_counter()
+            if 'n_jobs' not in model.get_params(deep=False):
+                model.fit(X_fit, y_fit)  # Gradient boosting uses OpenMP threads itself
+            else:
+                default_n_jobs = model.n_jobs
+                model.set_params(n_jobs=cores_per_model)
+                try:
+                    model.fit(X_fit, y_fit)
+                finally:
+                    model.set_params(n_jobs=default_n_jobs)  # Keep single-request prediction single-threaded
+            seconds = time.perf_counter() - start
+            if hasattr(model, 'predict_proba'):
+                return {'auc': roc_auc_score(y_eval, model.predict_proba(X_eval)[:, 1]), 'seconds': seconds}
+            return {'mae': mean_absolute_error(y_eval, model.predict(X_eval)), 'seconds': seconds}
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = {name: pool.submit(fit, *task) for name, task in tasks.items()}
+            results = {name: future.result() for name, future in futures.items()}
+
+        print(f"7-day Classifier AUC: {results['classifier_7d']['auc']:.4f} "
+              f"({results['classifier_7d']['seconds']:.2f}s)")
+        print(f"14-day Classifier AUC: {results['classifier_14d']['auc']:.4f} "
+              f"({results['classifier_14d']['seconds']:.2f}s)")
+        print(f"Regressor MAE: {results['regressor']['mae']:.4f} ({results['regressor']['seconds']:.2f}s)")
+        return results
+
     def predict(self, features_df, window):
         """
         Make predictions for given features.
@@ -94,6 +273,13 @@ class HarvestIQModels:
         - prob: Purchase probability
         - qty: Predicted quantity (if prob > 0)
         """
+        if self.compiled is not None:
+            X = feature_matrix(features_df, self.compiled['regressor'].feature_names)
+            if window not in (7, 14):
+                raise ValueError("Window must be 7 or 14")
+            prob = self.compiled[f'classifier_{window}d'].predict(X)
+            return prob, self.compiled['regressor'].predict(X)
+
         X = features_df.drop(columns=['customer_id', 'product_id', 'cp_last_purchase_date', 'last_purchase_date'], errors='ignore')
 
         if window == 7:
@@ -108,6 +294,55 @@ class HarvestIQModels:
 
         return prob, qty
 
+    def predict_batch(self, features_df, timer=None):
+        """
+        Run each model once over a batch of features.
+
+        Parameters:
+        - features_df: DataFrame with features
+        - timer: Optional callable taking a stage name ('predict_7d', 'predict_14d',
+          'predict_quantity') and returning a context manager that times it
+
+        Returns:
+        - prob_7d, prob_14d, qty: 7-day and 14-day purchase probabilities and predicted quantity
+        """
+        timer = timer or (lambda stage: nullcontext())
+        if self.compiled is not None:
+            # One float32 matrix feeds all three compiled forests
+            X = feature_matrix(features_df, self.compiled['regressor'].feature_names)
+            with timer('predict_7d'):
+                prob_7d = self.compiled['classifier_7d'].predict(X)
+            with timer('predict_14d'):
+                prob_14d = self.compiled['classifier_14d'].predict(X)
+            with timer('predict_quantity'):
+                qty = self.compiled['regressor'].predict(X)
+            return prob_7d, prob_14d, qty
+
+        X = features_df.drop(columns=['customer_id', 'product_id', 'cp_last_purchase_date', 'last_purchase_date'], errors='ignore')
+
+        with timer('predict_7d'):
+            prob_7d = self.classifier_7d.predict_proba(X)[:, 1]
+        with timer('predict_14d'):
+            prob_14d = self.classifier_14d.predict_proba(X)[:, 1]
+        with timer('predict_quantity'):
+            qty = self.regressor.predict(X)
+
+        return prob_7d, prob_14d, qty
+
+    def train_embeddings(self, historical_df, **params):
+        """
+        Train customer and product embeddings for candidate retrieval.
+
+        Parameters:
+        - historical_df: Transactions up to the prediction date (customer_id, product_id, quantity)
+        - **params: ImplicitALS settings (factors, regularization, alpha, iterations, ...)
+
+        Returns:
+        - EmbeddingTables: The trained embeddings, also kept on the model set
+        """
+        self.embeddings = ImplicitALS(**params).fit(historical_df)
+        return self.embeddings
+
     def save_models(self, path='harvestiq/models/'):
         """
         Save trained models.
@@ -115,22 +350,54 @@ class HarvestIQModels:
         Parameters:
         - path: Directory to save models
         """
-        import os
         os.makedirs(path, exist_ok=True)
         joblib.dump(self.classifier_7d, f'{path}classifier_7d.pkl')
         joblib.dump(self.classifier_14d, f'{path}classifier_14d.pkl')
         joblib.dump(self.regressor, f'{path}regressor.pkl')
+        with open(f'{path}meta.json', 'w') as f:
+            json.dump({'backend': self.backend}, f)
+
+        # Export step for the array-backed inference engine
+        self.compile()
+        if self.compiled is not None:
+            save_compiled(self.compiled, path)
+        else:
+            # Never serve forests left by an earlier save to the same directory
+            shutil.rmtree(f'{path}compiled', ignore_errors=True)
+
+        if self.embeddings is not None:
+            self.embeddings.save(f'{path}embeddings')
+
+    def compile(self):
+        """
+        Flatten the trained forests into contiguous arrays and use them for prediction.
+
+        Other backends keep predicting with their scikit-learn estimators.
+        """
+        self.compiled = compile_models(self) if is_compilable(self) else None
 
     def load_models(self, path='harvestiq/models/'):
         """
         Load trained models.
 
         Parameters:
-        - path: Directory to load models from
+        - path: Directory to load models from (the CURRENT version if one was published)
         """
+        _, path = resolve_model_version(path)
+        if path is None:
+            raise FileNotFoundError("No trained models found. Please train models first.")
         self.classifier_7d = joblib.load(f'{path}classifier_7d.pkl')
         self.classifier_14d = joblib.load(f'{path}classifier_14d.pkl')
         self.regressor = joblib.load(f'{path}regressor.pkl')
+        try:
+            with open(f'{path}meta.json') as f:
+                self.backend = json.load(f)['backend']
+        except FileNotFoundError:
+            self.backend = DEFAULT_BACKEND  # Saved before backends were configurable
+        self.compiled = load_compiled(path)
+        # Model sets trained before embeddings existed serve without retrieval
+        embeddings_path = f'{path}embeddings'
+        self.embeddings = EmbeddingTables.load(embeddings_path) if os.path.isdir(embeddings_path) else None
 
 if __name__ == "__main__":
     # Example training (would need preprocessed data)
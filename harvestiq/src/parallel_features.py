@@ -0,0 +1,255 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import pandas as pd
+from .compact import compact_transactions, day_number, is_compact, load_compact
+from .preprocessing import feature_engineering, horizon_label_table, join_horizon_labels, product_level_features
+from .storage import FEATURE_COLUMNS
+
+class SharedColumns:
+    """
+    Numeric columns copied into named shared memory blocks.
+
+    Other processes attach to the blocks by name (see attach_columns), so a
+    frame crosses process boundaries as a short list of names, dtypes and
+    lengths instead of being pickled. Rows can be reordered on the way in
+    (order), which writes straight into the shared block without a private copy.
+    """
+
+    def __init__(self, columns, order=None):
+        self.blocks = []
+        self.spec = []
+        try:
+            for name, values in columns.items():
+                values = np.asarray(values)
+                length = len(values) if order is None else len(order)
+                block = SharedMemory(create=True, size=max(length * values.itemsize, 1))
+                self.blocks.append(block)
+                shared = np.ndarray((length,), values.dtype, buffer=block.buf)
+                if order is None:
+                    shared[:] = values
+                else:
+                    np.take(values, order, out=shared)
+                del shared  # The mapping cannot close while a view exists
+                self.spec.append((name, block.name, values.dtype.str, length))
+        except BaseException:
+            self.close(unlink=True)
+            raise
+
+    def close(self, unlink=False):
+        """Release this process's mapping; unlink also frees the memory for every process."""
+        for block in self.blocks:
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close(unlink=True)
+
+def _read_columns(spec, rows=slice(None), unlink=False):
+    """Copy the selected rows of shared columns into private arrays."""
+    columns = {}
+    for name, block_name, dtype, length in spec:
+        block = SharedMemory(name=block_name)
+        try:
+            view = np.ndarray((length,), np.dtype(dtype), buffer=block.buf)
+            columns[name] = view[rows].copy()
+            del view  # The mapping cannot close while a view exists
+        finally:
+            block.close()
+            if unlink:
+                block.unlink()
+    return columns
+
+def attach_columns(spec, rows=slice(None), unlink=False):
+    """
+    Copy rows of shared columns into a DataFrame.
+
+    Parameters:
+    - spec: SharedColumns.spec
+    - rows: Slice or positions of the rows to copy (default: all)
+    - unlink: Free the blocks afterwards (for results handed over by a worker)
+
+    Returns:
+    - pd.DataFrame: Private copy of the rows
+    """
+    return pd.DataFrame(_read_columns(spec, rows, unlink))
+
+def _shard_features(columns_spec, start, stop, prediction_date, product_features, horizons):
+    """Worker: features (and label table) of the customer shard in rows start:stop, returned through shared memory."""
+    shard_df = attach_columns(columns_spec, slice(start, stop))
+    features = feature_engineering(shard_df, prediction_date, product_features=product_features)
+    results = [features]
+    if horizons:
+        results.append(horizon_label_table(shard_df, prediction_date, horizons))
+    specs = []
+    for frame in results:
+        shared = SharedColumns({col: frame[col].to_numpy() for col in frame.columns})
+        shared.close()  # The parent unlinks after copying
+        specs.append(shared.spec)
+    return specs
+
+def _concat_shards(specs):
+    """Move shard results out of shared memory and stack them column by column."""
+    parts = [_read_columns(spec, unlink=True) for spec in specs]
+    return {col: np.concatenate([part[col] for part in parts]) for col in parts[0]}
+
+def sharded_features(df, prediction_date, horizons=(), n_workers=None, n_shards=None, codes=None):
+    """
+    Build feature_engineering's frame (and horizon labels) in a process pool, sharded by customer.
+
+    Every feature except the product aggregates depends on one customer's
+    transactions only. Transactions are converted to the compact
+    representation and copied once into shared memory, grouped by shard (a
+    hash of customer_id) with a stable sort. Each worker is given the start
+    and stop row of its shard and copies only that slice, so no frame is
+    pickled and no worker scans the others' rows. Product features are computed once over
+    all customers and passed to every shard. Workers hand their results back
+    through shared memory too. Each shard's features are already ordered by
+    (customer_id, product_id) and a customer lives in one shard, so a stable
+    sort by customer_id restores feature_engineering's row order.
+
+    Parameters:
+    - df: Transactions, standard (as load_data returns them) or compact
+    - prediction_date: Feature cutoff
+    - horizons: Label windows in days; empty for features only
+    - n_workers: Worker processes (default: all cores)
+    - n_shards: Customer shards (default: 4 per worker)
+    - codes: IdCodes of a compact df (e.g. from load_compact), or to extend for a standard one
+
+    Returns:
+    - tuple: (features, horizon_label_table or None, IdCodes or None); frames are in the
+      compact representation, and the IdCodes decode them (None for a compact df without codes)
+    """
+    n_workers = n_workers or os.cpu_count()
+    n_shards = n_shards or 4 * n_workers
+
+    if is_compact(df):
+        df = df[FEATURE_COLUMNS]
+    else:
+        # Reading IDs as categoricals (load_compact) makes this step much cheaper
+        df, codes = compact_transactions(df[FEATURE_COLUMNS], codes)
+    product_features = product_level_features(df[df['purchase_date'] <= day_number(prediction_date)])
+
+    # Hash each distinct customer once; the shard of a row follows from its customer code
+    customer_codes = df['customer_id'].to_numpy()
+    if codes is not None:
+        customer_ids, customer_rows = codes.customer_ids, customer_codes
+    else:
+        customer_ids = pd.Index(np.unique(customer_codes))
+        customer_rows = customer_ids.get_indexer(customer_codes)
+    shard_of_customer = pd.util.hash_pandas_object(pd.Series(customer_ids), index=False).to_numpy() % n_shards
+    shard_of_row = shard_of_customer.astype(np.int32)[customer_rows]
+    # Stable, so rows keep their order within a shard
+    order = np.argsort(shard_of_row, kind='stable')
+    bounds = np.r_[0, np.cumsum(np.bincount(shard_of_row, minlength=n_shards))]
+    shards = np.flatnonzero(bounds[1:] > bounds[:-1])
+    del shard_of_row
+
+    futures = []
+    try:
+        with SharedColumns({col: df[col].to_numpy() for col in df.columns}, order) as shared:
+            del order
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = [pool.submit(_shard_features, shared.spec, int(bounds[shard]), int(bounds[shard + 1]),
+                                       prediction_date, product_features, tuple(horizons))
+                           for shard in shards]
+                result_specs = [future.result() for future in futures]
+    except BaseException:
+        # The pool waits for every submitted shard on exit; free the results of those that succeeded
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                for spec in future.result():
+                    _read_columns(spec, slice(0), unlink=True)
+        raise
+
+    features = _concat_shards([specs[0] for specs in result_specs])
+    order = np.argsort(features['customer_id'], kind='stable')
+    features = pd.DataFrame({col: values[order] for col, values in features.items()})
+    labels = pd.DataFrame(_concat_shards([specs[1] for specs in result_specs])) if horizons else None
+    return features, labels, codes
+
+def parallel_feature_engineering(df, prediction_date, n_workers=None, n_shards=None):
+    """
+    feature_engineering computed by customer shards in a process pool.
+
+    Parameters:
+    - df: Transaction DataFrame (as load_data returns it)
+    - prediction_date: Date up to which to use historical data
+    - n_workers: Worker processes (default: all cores)
+    - n_shards: Customer shards (default: 4 per worker)
+
+    Returns:
+    - pd.DataFrame: Feature-engineered data, equal to feature_engineering(df, prediction_date)
+    """
+    features, _, codes = sharded_features(df, prediction_date, n_workers=n_workers, n_shards=n_shards)
+    return codes.decode(features) if codes is not None else features
+
+def parallel_horizon_labels(df, prediction_date, horizons=(7, 14), n_workers=None, n_shards=None, codes=None):
+    """
+    Features and labels for several horizons, computed by customer shards in a process pool.
+
+    Parameters:
+    - df: Transaction DataFrame up to the end of the longest horizon
+    - prediction_date: Date of prediction
+    - horizons: Windows in days
+    - n_workers: Worker processes (default: all cores)
+    - n_shards: Customer shards (default: 4 per worker)
+    - codes: IdCodes of a compact df, used to decode the results
+
+    Returns:
+    - dict: Horizon -> features with labels, as create_horizon_labels returns
+    """
+    features, labels, codes = sharded_features(df, prediction_date, horizons, n_workers, n_shards, codes)
+    labeled = join_horizon_labels(features, labels, horizons)
+    if codes is not None:
+        labeled = {horizon: codes.decode(frame) for horizon, frame in labeled.items()}
+    return labeled
+
+def scaling_report(df, prediction_date, max_workers=None):
+    """
+    Time feature engineering as worker processes are added.
+
+    Parameters:
+    - df: Transaction DataFrame, standard or compact
+    - prediction_date: Feature cutoff
+    - max_workers: Largest worker count; 1, 2, 4, ... up to it are tried (default: all cores)
+
+    Returns:
+    - pd.DataFrame: One row per worker count with seconds and speedup over feature_engineering
+    """
+    max_workers = max_workers or os.cpu_count()
+    worker_counts = sorted({min(2 ** i, max_workers) for i in range(max_workers.bit_length() + 1)})
+
+    start = time.perf_counter()
+    feature_engineering(df, prediction_date)
+    baseline = time.perf_counter() - start
+
+    rows = [{'workers': 0, 'seconds': baseline}]  # 0: single-process feature_engineering
+    for n in worker_counts:
+        start = time.perf_counter()
+        parallel_feature_engineering(df, prediction_date, n_workers=n, n_shards=4 * max(worker_counts))
+        rows.append({'workers': n, 'seconds': time.perf_counter() - start})
+    results = pd.DataFrame(rows)
+    results['speedup'] = baseline / results['seconds']
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time customer-sharded feature engineering across worker counts.")
+    parser.add_argument('--data', default='harvestiq/data/transactions')
+    parser.add_argument('--prediction-date', default='2024-11-01')
+    parser.add_argument('--workers', type=int, default=None, help="Largest worker count tried")
+    args = parser.parse_args()
+
+    prediction_date = pd.to_datetime(args.prediction_date)
+    # Both sides run on the compact representation, so only the sharding is compared
+    df, _ = load_compact(args.data, columns=FEATURE_COLUMNS, end_date=prediction_date)
+    print(scaling_report(df, prediction_date, args.workers).to_string(index=False))
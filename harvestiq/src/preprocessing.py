@@ -1,66 +1,115 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from .storage import load_transactions
+from .compact import day_number, is_compact, load_compact
 
-def load_data(filepath):
+def load_data(filepath, columns=None, start_date=None, end_date=None):
     """
-    Load transaction data from CSV.
+    Load transaction data from a CSV file or a Parquet transaction store.
 
     Parameters:
-    - filepath: Path to the CSV file
+    - filepath: Path to the CSV file or store directory
+    - columns: Columns to read (default: all)
+    - start_date: Earliest purchase_date to include (inclusive)
+    - end_date: Latest purchase_date to include (inclusive)
 
     Returns:
     - pd.DataFrame: Loaded data
     """
-    df = pd.read_csv(filepath, parse_dates=['purchase_date'])
+    df = load_transactions(filepath, columns=columns, start_date=start_date, end_date=end_date)
     return df
 
-def feature_engineering(df, prediction_date):
+# The functions below accept both standard and compact transactions (see compact.py);
+# these helpers express dates and day counts in the frame's own representation
+
+def _cutoff(df, date):
+    """date as purchase_date values of df are compared with it."""
+    return day_number(date) if is_compact(df) else date
+
+def _days(n, df):
+    """A span of n days in the units of df's purchase dates."""
+    return n if is_compact(df) else timedelta(days=n)
+
+def _whole_days(delta):
+    """Whole days of a timedelta Series, or of a difference of day numbers."""
+    return delta.dt.days if hasattr(delta, 'dt') else delta.astype('int64')
+
+def _month(dates):
+    """Calendar month of datetimes or day numbers."""
+    if hasattr(dates, 'dt'):
+        return dates.dt.month
+    months = dates.to_numpy().astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    return pd.Series((months % 12 + 1).astype(np.int32), index=dates.index)
+
+def product_level_features(historical_df):
+    """
+    Compute product-level features.
+
+    Parameters:
+    - historical_df: Transactions up to the prediction date
+
+    Returns:
+    - pd.DataFrame: One row per product_id
+    """
+    return historical_df.groupby('product_id').agg(
+        product_total_sales=('quantity', 'sum'),
+        product_avg_price=('price', 'mean'),
+        product_surplus_ratio=('surplus_flag', 'mean')  # Proportion of surplus
+    ).reset_index().astype({'product_avg_price': 'float64'})  # Compact prices are float32
+
+def feature_engineering(df, prediction_date, product_features=None):
     """
     Perform feature engineering for the dataset.
 
     Parameters:
-    - df: Transaction DataFrame
+    - df: Transaction DataFrame, standard or compact
     - prediction_date: Date up to which to use historical data
+    - product_features: Precomputed product-level features; pass these when df
+      holds only a subset of customers so product aggregates stay global
 
     Returns:
     - pd.DataFrame: Feature-engineered data
     """
     # Filter data up to prediction_date
-    historical_df = df[df['purchase_date'] <= prediction_date].copy()
+    cutoff = _cutoff(df, prediction_date)
+    historical_df = df[df['purchase_date'] <= cutoff]
 
-    # Sort by customer and date
-    historical_df = historical_df.sort_values(['customer_id', 'purchase_date'])
+    # Only built-in groupby reductions are used below; date-derived features are
+    # computed column-wise from the aggregated min/max dates afterwards.
 
     # Customer-level features
     customer_features = historical_df.groupby('customer_id').agg(
         total_purchases=('quantity', 'sum'),
         avg_quantity=('quantity', 'mean'),
         num_unique_products=('product_id', 'nunique'),
-        last_purchase_date=('purchase_date', 'max'),
-        recency_days=('purchase_date', lambda x: (prediction_date - x.max()).days)
-    ).reset_index()
+        last_purchase_date=('purchase_date', 'max')
+    ).reset_index().astype({'total_purchases': 'int64'})  # Sums of narrow compact quantities keep their dtype
+    customer_features['recency_days'] = _whole_days(cutoff - customer_features['last_purchase_date'])
 
     # Product-level features
-    product_features = historical_df.groupby('product_id').agg(
-        product_total_sales=('quantity', 'sum'),
-        product_avg_price=('price', 'mean'),
-        product_surplus_ratio=('surplus_flag', 'mean')  # Proportion of surplus
-    ).reset_index()
+    if product_features is None:
+        product_features = product_level_features(historical_df)
 
     # Customer-product interaction features
     interaction_features = historical_df.groupby(['customer_id', 'product_id']).agg(
         cp_total_purchases=('quantity', 'sum'),
         cp_avg_quantity=('quantity', 'mean'),
         cp_purchase_count=('quantity', 'count'),
-        cp_last_purchase_date=('purchase_date', 'max'),
-        cp_recency_days=('purchase_date', lambda x: (prediction_date - x.max()).days),
-        cp_days_since_first=('purchase_date', lambda x: (x.max() - x.min()).days if len(x) > 1 else 0),
-        cp_avg_interval=('purchase_date', lambda x: np.mean(np.diff(sorted(x))) if len(x) > 1 else 0)
-    ).reset_index()
+        cp_first_purchase_date=('purchase_date', 'min'),
+        cp_last_purchase_date=('purchase_date', 'max')
+    ).reset_index().astype({'cp_total_purchases': 'int64'})
+    interaction_features['cp_recency_days'] = _whole_days(cutoff - interaction_features['cp_last_purchase_date'])
+    interaction_features['cp_days_since_first'] = _whole_days(
+        interaction_features['cp_last_purchase_date'] - interaction_features.pop('cp_first_purchase_date')
+    )
+    # Mean gap between consecutive purchases telescopes to span / (count - 1), in days
+    interaction_features['cp_avg_interval'] = (
+        interaction_features['cp_days_since_first'] / (interaction_features['cp_purchase_count'] - 1)
+    ).where(interaction_features['cp_purchase_count'] > 1, 0.0)
 
     # Seasonality: month of last purchase
-    interaction_features['cp_last_month'] = interaction_features['cp_last_purchase_date'].dt.month
+    interaction_features['cp_last_month'] = _month(interaction_features['cp_last_purchase_date'])
 
     # Merge features
     features = interaction_features.merge(customer_features, on='customer_id', how='left')
@@ -84,8 +133,9 @@ def create_labels(df, features, prediction_date, window_days):
     Returns:
     - pd.DataFrame: Features with labels
     """
-    future_df = df[(df['purchase_date'] > prediction_date) &
-                   (df['purchase_date'] <= prediction_date + timedelta(days=window_days))]
+    cutoff = _cutoff(df, prediction_date)
+    future_df = df[(df['purchase_date'] > cutoff) &
+                   (df['purchase_date'] <= cutoff + _days(window_days, df))]
 
     # Aggregate future purchases per customer-product
     future_agg = future_df.groupby(['customer_id', 'product_id']).agg(
@@ -101,31 +151,164 @@ def create_labels(df, features, prediction_date, window_days):
 
     return labeled_features
 
-def preprocess_data(filepath, prediction_date_str='2024-11-01'):
+def horizon_label_table(df, prediction_date, horizons):
+    """
+    Future quantity and purchase count per customer-product for several horizons.
+
+    Purchases in the longest horizon are sorted once by pair and date. With a
+    running quantity sum over that order, the totals for any horizon are a
+    binary search for the horizon's end inside each pair's run, so extra
+    horizons cost one search per pair rather than another filter and groupby.
+
+    Parameters:
+    - df: Transaction DataFrame
+    - prediction_date: Date of prediction
+    - horizons: Windows in days
+
+    Returns:
+    - pd.DataFrame: customer_id, product_id and future_quantity_<h>d /
+      future_purchases_<h>d per horizon, for pairs bought within the longest horizon
+    """
+    horizons = sorted(horizons)
+    cutoff = _cutoff(df, prediction_date)
+    future_df = df[(df['purchase_date'] > cutoff) &
+                   (df['purchase_date'] <= cutoff + _days(horizons[-1], df))]
+    if future_df.empty:
+        # No purchases in the window: no pair has a label (join_horizon_labels fills zeros)
+        labels = future_df[['customer_id', 'product_id']].reset_index(drop=True)
+        for horizon in horizons:
+            labels[f'future_quantity_{horizon}d'] = np.zeros(0, dtype=future_df['quantity'].dtype)
+            labels[f'future_purchases_{horizon}d'] = np.zeros(0, dtype=np.int64)
+        return labels
+
+    customer_codes, customers = pd.factorize(future_df['customer_id'])
+    product_codes, products = pd.factorize(future_df['product_id'])
+    pair_codes = customer_codes.astype(np.int64) * len(products) + product_codes
+    # Dense rank of the purchase time keeps the combined sort key small
+    dates = future_df['purchase_date'].to_numpy()
+    offsets, time_rank = np.unique(dates - (np.int64(cutoff) if is_compact(df) else np.datetime64(cutoff)),
+                                   return_inverse=True)
+    keys = pair_codes * len(offsets) + time_rank.reshape(-1)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    cumulative = np.concatenate([[0], np.cumsum(future_df['quantity'].to_numpy()[order])])
+
+    pairs = pair_codes[order]
+    starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]])
+    pair_codes = pairs[starts]
+    labels = pd.DataFrame({
+        'customer_id': customers.take(pair_codes // len(products)),
+        'product_id': products.take(pair_codes % len(products)),
+    })
+    for horizon in horizons:
+        # First position at or after the horizon's end, within each pair's run
+        horizon_span = horizon if is_compact(df) else np.timedelta64(timedelta(days=horizon))
+        horizon_rank = np.searchsorted(offsets, horizon_span, side='right')
+        ends = np.searchsorted(keys, pair_codes * len(offsets) + horizon_rank, side='left')
+        labels[f'future_quantity_{horizon}d'] = cumulative[ends] - cumulative[starts]
+        labels[f'future_purchases_{horizon}d'] = ends - starts
+    return labels
+
+def create_horizon_labels(df, features, prediction_date, horizons=(3, 7, 14, 28)):
+    """
+    Create labels for any number of horizons with a single sort and join.
+
+    Parameters:
+    - df: Full transaction DataFrame
+    - features: Feature DataFrame
+    - prediction_date: Date of prediction
+    - horizons: Windows in days
+
+    Returns:
+    - dict: Horizon -> features with labels, as create_labels(..., horizon) returns
+    """
+    return join_horizon_labels(features, horizon_label_table(df, prediction_date, horizons), horizons)
+
+def join_horizon_labels(features, labels, horizons):
+    """
+    Attach the label columns of a horizon_label_table to the features, one frame per horizon.
+
+    Parameters:
+    - features: Feature DataFrame
+    - labels: horizon_label_table output covering the features' customers
+    - horizons: Windows in days, all present in labels
+
+    Returns:
+    - dict: Horizon -> features with labels
+    """
+    joined = features[['customer_id', 'product_id']].merge(labels, on=['customer_id', 'product_id'], how='left')
+
+    labeled = {}
+    for horizon in horizons:
+        labeled_features = features.copy()
+        labeled_features['future_quantity'] = joined[f'future_quantity_{horizon}d'].fillna(0).to_numpy(dtype=float)
+        labeled_features['future_purchases'] = joined[f'future_purchases_{horizon}d'].fillna(0).to_numpy(dtype=float)
+        labeled_features['will_buy'] = (labeled_features['future_purchases'] > 0).astype(int)
+        labeled[horizon] = labeled_features
+    return labeled
+
+def preprocess_data(filepath, prediction_date_str='2024-11-01', feature_store=None, horizons=(7, 14),
+                    compact=False, chunk_size=None, n_workers=None):
     """
     Full preprocessing pipeline.
 
     Parameters:
-    - filepath: Path to data
+    - filepath: Path to a CSV file or Parquet transaction store
     - prediction_date_str: String date for prediction cutoff
+    - feature_store: Optional FeatureStore holding the history up to the cutoff;
+      features then come from its running aggregates and only the label window is read
+    - horizons: Label windows in days, e.g. (3, 7, 14, 28)
+    - compact: Load and process the transactions in the compact representation
+      (integer codes, narrow dtypes, day numbers); IDs and dates are decoded at the end
+    - chunk_size: Stream the history up to the cutoff in chunks of this many
+      transactions into a FeatureStore instead of loading it whole, for histories
+      larger than memory; only the label window is loaded at once
+    - n_workers: Build features and labels in this many processes, sharded by
+      customer (see parallel_features.sharded_features)
 
     Returns:
-    - dict: Features for 7-day and 14-day predictions
+    - dict: Features for each window, keyed '7d', '14d', ...
     """
-    df = load_data(filepath)
+    if compact and feature_store is not None:
+        raise ValueError("compact=True builds features from the transactions; it cannot be combined with a feature store")
+    if chunk_size is not None and (compact or feature_store is not None):
+        raise ValueError("chunk_size streams the history into a new feature store; "
+                         "it cannot be combined with compact or feature_store")
+    if n_workers is not None and (compact or feature_store is not None or chunk_size is not None):
+        raise ValueError("n_workers builds features from the loaded transactions; "
+                         "it cannot be combined with compact, feature_store or chunk_size")
     prediction_date = pd.to_datetime(prediction_date_str)
+    if chunk_size is not None:
+        from .feature_store import FeatureStore  # feature_store imports this module
+        feature_store = FeatureStore.stream(filepath, end_date=prediction_date, chunk_size=chunk_size)
+    # Nothing after the longest label window is used
+    label_end = prediction_date + timedelta(days=max(horizons))
 
-    features = feature_engineering(df, prediction_date)
-
-    # For 7-day window
-    features_7d = create_labels(df, features, prediction_date, 7)
-    features_7d['window'] = 7
+    codes = None
+    if n_workers is not None:
+        from .parallel_features import parallel_horizon_labels  # parallel_features imports this module
+        df, codes = load_compact(filepath, end_date=label_end)
+        labeled = parallel_horizon_labels(df, prediction_date, horizons, n_workers=n_workers, codes=codes)
+        for horizon, labeled_features in labeled.items():
+            labeled_features['window'] = horizon
+        return {f'{horizon}d': labeled_features for horizon, labeled_features in labeled.items()}
+    if compact:
+        df, codes = load_compact(filepath, end_date=label_end)
+        features = feature_engineering(df, prediction_date)
+    elif feature_store is None:
+        df = load_data(filepath, end_date=label_end)
+        features = feature_engineering(df, prediction_date)
+    else:
+        df = load_data(filepath, start_date=prediction_date, end_date=label_end)
+        features = feature_store.to_features(prediction_date)
 
-    # For 14-day window
-    features_14d = create_labels(df, features, prediction_date, 14)
-    features_14d['window'] = 14
+    labeled = create_horizon_labels(df, features, prediction_date, horizons)
+    for horizon, labeled_features in labeled.items():
+        if codes is not None:
+            labeled_features = labeled[horizon] = codes.decode(labeled_features)
+        labeled_features['window'] = horizon
 
-    return {'7d': features_7d, '14d': features_14d}
+    return {f'{horizon}d': labeled_features for horizon, labeled_features in labeled.items()}
 
 if __name__ == "__main__":
     # Example usage
@@ -1,12 +1,82 @@
+from contextlib import nullcontext
 import pandas as pd
 import numpy as np
 from .models import HarvestIQModels
 from .preprocessing import feature_engineering
+from .candidate_index import CandidateIndex
+
+def recommendation_score(prob_7d, prob_14d, qty_7d, qty_14d, surplus_ratio):
+    """
+    Compute recommendation scores; works element-wise on scalars or NumPy arrays.
+
+    Score = weighted prob * predicted qty * surplus bonus
+
+    Parameters:
+    - prob_7d, prob_14d: Probabilities
+    - qty_7d, qty_14d: Predicted quantities
+    - surplus_ratio: Product surplus ratio
+
+    Returns:
+    - float or np.ndarray: Score
+    """
+    # Weighted probability (more weight on 7d)
+    weighted_prob = 0.6 * prob_7d + 0.4 * prob_14d
+    # Average quantity
+    avg_qty = (qty_7d + qty_14d) / 2
+    # Surplus bonus: higher for surplus products
+    surplus_bonus = 1 + surplus_ratio  # e.g., 1.2 if 20% surplus
+
+    return weighted_prob * avg_qty * surplus_bonus
+
+def top_n_indices(scores, top_n):
+    """
+    Return positions of the top_n highest scores, best first.
+
+    Uses a partial sort, so only the selected positions are fully ordered.
+
+    Parameters:
+    - scores: 1-D array of scores
+    - top_n: Number of positions to return
+
+    Returns:
+    - np.ndarray: Indices into scores
+    """
+    if top_n < len(scores):
+        top = np.argpartition(-scores, top_n - 1)[:top_n]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind='stable')]
 
 class HarvestIQRecommender:
-    def __init__(self, model_path='harvestiq/models/'):
-        self.models = HarvestIQModels()
-        self.models.load_models(model_path)
+    def __init__(self, model_path='harvestiq/models/', models=None):
+        if models is None:
+            models = HarvestIQModels()
+            models.load_models(model_path)
+        self.models = models
+        self.candidate_index = None
+        self.catalog = None  # Optional ProductCatalog for surplus ratios and product attributes
+        self.cooccurrence = None  # Optional CooccurrenceIndex adding never-bought products as candidates
+        self.num_cooccurrence_candidates = 20
+        self.num_retrieval_candidates = 200  # Products retrieved by embedding similarity
+        # Optional callable taking a stage name and returning a context manager that times it
+        self.timer = None
+
+    def _stage(self, name):
+        return self.timer(name) if self.timer is not None else nullcontext()
+
+    def build_candidate_index(self, historical_df, prediction_date, data_version=None):
+        """
+        Precompute candidate features for every customer in one vectorized pass.
+
+        Once built, recommend_for_customer serves this prediction date with a
+        dictionary lookup instead of scanning historical_df per request.
+
+        Parameters:
+        - historical_df: Historical transactions
+        - prediction_date: Prediction date
+        - data_version: Identifier of the data the index is built from
+        """
+        self.candidate_index = CandidateIndex.build(historical_df, prediction_date, data_version)
 
     def generate_candidate_products(self, historical_df, customer_id, prediction_date):
         """
@@ -46,7 +116,7 @@ class HarvestIQRecommender:
                 'cp_last_purchase_date': cp_hist['purchase_date'].max(),
                 'cp_recency_days': (prediction_date - cp_hist['purchase_date'].max()).days,
                 'cp_days_since_first': (cp_hist['purchase_date'].max() - cp_hist['purchase_date'].min()).days if len(cp_hist) > 1 else 0,
-                'cp_avg_interval': np.mean(np.diff(sorted(cp_hist['purchase_date']))) if len(cp_hist) > 1 else 0,
+                'cp_avg_interval': (cp_hist['purchase_date'].max() - cp_hist['purchase_date'].min()).days / (len(cp_hist) - 1) if len(cp_hist) > 1 else 0.0,
                 'cp_last_month': cp_hist['purchase_date'].max().month,
                 # Add customer and product level (would need to compute globally)
                 # For simplicity, assume we have precomputed
@@ -55,6 +125,43 @@ class HarvestIQRecommender:
 
         return pd.DataFrame(candidate_features)
 
+    def add_retrieved_candidates(self, candidates, customer_id):
+        """
+        Append products the customer has never bought, from the retrieval stages.
+
+        - Embedding retrieval (when the model set has embeddings): the
+          num_retrieval_candidates products with the highest customer-product
+          dot product.
+        - Co-purchase retrieval (when a co-occurrence index is set): neighbours
+          of the customer's history, weighted by how often they bought each product.
+
+        The new rows carry the customer's own features and an empty pair
+        history, so the models score them as first purchases. Ranking cost is
+        set by the history and these counts, not by the catalog size.
+
+        Parameters:
+        - candidates: Candidate features from the candidate index
+        - customer_id: Customer ID
+
+        Returns:
+        - pd.DataFrame: candidates followed by the retrieved products' rows
+        """
+        retrieved = []
+        if self.models.embeddings is not None:
+            retrieved.append(self.models.embeddings.retrieve_one(
+                customer_id, n=self.num_retrieval_candidates, exclude=candidates['product_id'])['product_id'])
+        if self.cooccurrence is not None:
+            retrieved.append(self.cooccurrence.candidates(
+                candidates['product_id'], weights=candidates['cp_purchase_count'],
+                n=self.num_cooccurrence_candidates)['product_id'])
+        if not retrieved:
+            return candidates
+        product_ids = pd.unique(np.concatenate([ids.to_numpy(dtype=object) for ids in retrieved]))
+        if len(product_ids) == 0:
+            return candidates
+        unseen = self.candidate_index.unseen(customer_id, product_ids)
+        return pd.concat([candidates, unseen], ignore_index=True)
+
     def compute_recommendation_score(self, prob_7d, prob_14d, qty_7d, qty_14d, surplus_ratio):
         """
         Compute final recommendation score.
@@ -69,22 +176,14 @@ class HarvestIQRecommender:
         Returns:
         - float: Score
         """
-        # Weighted probability (more weight on 7d)
-        weighted_prob = 0.6 * prob_7d + 0.4 * prob_14d
-        # Average quantity
-        avg_qty = (qty_7d + qty_14d) / 2
-        # Surplus bonus: higher for surplus products
-        surplus_bonus = 1 + surplus_ratio  # e.g., 1.2 if 20% surplus
-
-        score = weighted_prob * avg_qty * surplus_bonus
-        return score
+        return recommendation_score(prob_7d, prob_14d, qty_7d, qty_14d, surplus_ratio)
 
     def recommend_for_customer(self, historical_df, customer_id, prediction_date, top_n=10):
         """
         Generate top-N recommendations for a customer.
 
         Parameters:
-        - historical_df: Full historical data
+        - historical_df: Full historical data (unused when a candidate index for prediction_date is set)
         - customer_id: Customer ID
         - prediction_date: Date for prediction
         - top_n: Number of recommendations
@@ -92,37 +191,43 @@ class HarvestIQRecommender:
         Returns:
         - pd.DataFrame: Top recommendations with scores
         """
-        candidates = self.generate_candidate_products(historical_df, customer_id, prediction_date)
+        with self._stage('candidates'):
+            if self.candidate_index is not None and self.candidate_index.prediction_date == prediction_date:
+                candidates = self.candidate_index.get(customer_id)
+                if not candidates.empty:
+                    candidates = self.add_retrieved_candidates(candidates, customer_id)
+            else:
+                candidates = self.generate_candidate_products(historical_df, customer_id, prediction_date)
 
         if candidates.empty:
             return pd.DataFrame()
 
-        # Predict for 7d and 14d
-        prob_7d, qty_7d = self.models.predict(candidates, 7)
-        prob_14d, qty_14d = self.models.predict(candidates, 14)
+        # Each model runs once over all candidates
+        prob_7d, prob_14d, qty = self.models.predict_batch(candidates, timer=self.timer)
 
-        # Assume surplus_ratio is available (from preprocessing)
-        # For now, dummy, but in real, merge from product_features
-        candidates['surplus_ratio'] = 0.2  # Placeholder
+        with self._stage('scoring'):
+            if self.catalog is not None:
+                surplus_ratio = self.catalog.surplus_ratios(candidates['product_id'])
+            else:
+                surplus_ratio = candidates['product_surplus_ratio'].to_numpy()
 
-        # Compute scores
-        scores = []
-        for i in range(len(candidates)):
-            score = self.compute_recommendation_score(
-                prob_7d[i], prob_14d[i], qty_7d[i], qty_14d[i], candidates.iloc[i]['surplus_ratio']
-            )
-            scores.append(score)
+            scores = recommendation_score(prob_7d, prob_14d, qty, qty, surplus_ratio)
+            top = top_n_indices(scores, top_n)
 
-        candidates['score'] = scores
-        candidates['prob_7d'] = prob_7d
-        candidates['prob_14d'] = prob_14d
-        candidates['qty_7d'] = qty_7d
-        candidates['qty_14d'] = qty_14d
+        recommendations = candidates[['customer_id', 'product_id']].iloc[top].assign(
+            score=scores[top],
+            prob_7d=prob_7d[top],
+            prob_14d=prob_14d[top],
+            qty_7d=qty[top],
+            qty_14d=qty[top]  # A single quantity model serves both windows
+        ).reset_index(drop=True)
 
-        # Sort by score descending
-        recommendations = candidates.sort_values('score', ascending=False).head(top_n)
+        if self.catalog is not None:
+            attributes = self.catalog.lookup(recommendations['product_id'])
+            recommendations['category'] = attributes['category'].to_numpy()
+            recommendations['surplus_flag'] = attributes['surplus_flag'].to_numpy()
 
-        return recommendations[['customer_id', 'product_id', 'score', 'prob_7d', 'prob_14d', 'qty_7d', 'qty_14d']]
+        return recommendations
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,107 @@
+import pandas as pd
+import numpy as np
+from datetime import timedelta
+from .feature_store import FeatureStore
+from .preprocessing import create_horizon_labels, load_data
+
+def weekly_cutoffs(start_date, end_date, freq='7D'):
+    """
+    Evenly spaced snapshot cutoffs.
+
+    Parameters:
+    - start_date: First cutoff
+    - end_date: Last possible cutoff (inclusive)
+    - freq: Spacing between cutoffs
+
+    Returns:
+    - pd.DatetimeIndex: Cutoff dates
+    """
+    return pd.date_range(start_date, end_date, freq=freq)
+
+def iter_snapshots(df, cutoffs, windows=(7, 14)):
+    """
+    Yield labelled feature snapshots for many cutoffs in one sweep over the data.
+
+    Transactions are sorted by date once. Walking the cutoffs in order, only
+    the rows since the previous cutoff are folded into a FeatureStore, so each
+    transaction is aggregated once no matter how many cutoffs there are. Label
+    windows are contiguous slices of the sorted frame located by binary search.
+    Each snapshot equals feature_engineering plus create_labels at its cutoff.
+
+    Parameters:
+    - df: Transaction DataFrame covering the cutoffs and their label windows
+    - cutoffs: Snapshot prediction dates
+    - windows: Label windows in days
+
+    Yields:
+    - tuple: (cutoff, {'<window>d': labelled features with a snapshot_date column})
+    """
+    df = df.sort_values('purchase_date', kind='stable').reset_index(drop=True)
+    dates = df['purchase_date'].to_numpy()
+    longest = timedelta(days=max(windows))
+
+    store = FeatureStore()
+    applied = 0
+    for cutoff in pd.DatetimeIndex(sorted(pd.to_datetime(cutoffs))):
+        end = np.searchsorted(dates, cutoff.to_datetime64(), side='right')
+        store.apply(df.iloc[applied:end])
+        applied = end
+        if store.watermark is None:
+            continue  # No history before this cutoff yet
+
+        features = store.to_features(cutoff)
+        label_end = np.searchsorted(dates, (cutoff + longest).to_datetime64(), side='right')
+        future_df = df.iloc[end:label_end]
+        snapshot = {}
+        for window, labeled in create_horizon_labels(future_df, features, cutoff, windows).items():
+            labeled['window'] = window
+            labeled['snapshot_date'] = cutoff
+            snapshot[f'{window}d'] = labeled
+        yield cutoff, snapshot
+
+def build_snapshots(df, cutoffs, windows=(7, 14)):
+    """
+    Stack the snapshots of iter_snapshots into one training set per window.
+
+    Every snapshot holds all customer-product pairs seen so far, so the result
+    grows with pairs x cutoffs; use iter_snapshots to write them out one at a time.
+
+    Parameters:
+    - df: Transaction DataFrame covering the cutoffs and their label windows
+    - cutoffs: Snapshot prediction dates
+    - windows: Label windows in days
+
+    Returns:
+    - dict: '<window>d' -> stacked labelled features with a snapshot_date column
+    """
+    frames = {f'{window}d': [] for window in windows}
+    for _, snapshot in iter_snapshots(df, cutoffs, windows):
+        for key, labeled in snapshot.items():
+            frames[key].append(labeled)
+    return {key: pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+            for key, parts in frames.items()}
+
+def preprocess_snapshots(filepath, start_date_str='2024-01-01', end_date_str='2024-11-01', freq='7D',
+                         horizons=(7, 14)):
+    """
+    Rolling-snapshot version of preprocess_data.
+
+    Parameters:
+    - filepath: Path to a CSV file or Parquet transaction store
+    - start_date_str: First cutoff
+    - end_date_str: Last cutoff
+    - freq: Spacing between cutoffs
+    - horizons: Label windows in days
+
+    Returns:
+    - dict: Stacked features for each window, keyed '7d', '14d', ...
+    """
+    cutoffs = weekly_cutoffs(start_date_str, end_date_str, freq)
+    # Nothing after the last cutoff's longest label window is used
+    df = load_data(filepath, end_date=cutoffs[-1] + timedelta(days=max(horizons)))
+    return build_snapshots(df, cutoffs, horizons)
+
+if __name__ == "__main__":
+    data = preprocess_snapshots('harvestiq/data/transactions')
+    print(f"Built {data['7d']['snapshot_date'].nunique()} snapshots, "
+          f"{len(data['7d'])} rows per window.")
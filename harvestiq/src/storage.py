@@ -0,0 +1,253 @@
+import os
+import shutil
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+# Columns needed to build features and labels
+FEATURE_COLUMNS = ['customer_id', 'product_id', 'purchase_date', 'quantity', 'price', 'surplus_flag']
+
+# Hive-style partition key, stored as an integer like 202411
+PARTITION_COLUMN = 'purchase_month'
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.int32())]), flavor='hive')
+
+def _month_key(date):
+    """Return the integer YYYYMM partition key for a timestamp."""
+    date = pd.Timestamp(date)
+    return date.year * 100 + date.month
+
+def write_transaction_store(df, root, append=False):
+    """
+    Write transactions to a Parquet store partitioned by month of purchase_date.
+
+    Parameters:
+    - df: Transaction DataFrame
+    - root: Store directory
+    - append: Add files next to existing ones instead of replacing touched months
+
+    Returns:
+    - str: Store directory
+    """
+    df = df.assign(**{PARTITION_COLUMN: (df['purchase_date'].dt.year * 100 +
+                                         df['purchase_date'].dt.month).astype('int32')})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table, root, format='parquet', partitioning=PARTITIONING,
+        basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore' if append else 'delete_matching'
+    )
+    return root
+
+# Written into stores made by convert_csv_to_store; the leading underscore keeps
+# Arrow's dataset discovery from reading it as data
+SOURCE_VERSION_FILE = '_source_version'
+
+def convert_csv_to_store(csv_path, root, chunksize=1_000_000):
+    """
+    Convert a transactions CSV into a Parquet store without loading it whole.
+
+    The store is built in a temporary directory next to root and swapped in
+    once complete, so nothing from a previous conversion survives. The CSV's
+    data_version is recorded in the store (see store_source_version).
+
+    Parameters:
+    - csv_path: Source CSV file
+    - root: Store directory
+    - chunksize: CSV rows parsed per chunk
+
+    Returns:
+    - str: Store directory
+    """
+    source_version = data_version(csv_path)
+    target = os.path.normpath(root)
+    tmp_root = os.path.join(os.path.dirname(target) or '.', f'.{os.path.basename(target)}.{uuid.uuid4().hex}.tmp')
+    try:
+        for chunk in pd.read_csv(csv_path, parse_dates=['purchase_date'], chunksize=chunksize):
+            write_transaction_store(chunk, tmp_root, append=True)
+        os.makedirs(tmp_root, exist_ok=True)  # A CSV without rows still makes a store
+        with open(os.path.join(tmp_root, SOURCE_VERSION_FILE), 'w') as f:
+            f.write(source_version)
+
+        # os.replace cannot replace a non-empty directory; move the old store aside first
+        old_root = f'{tmp_root}.old'
+        if os.path.isdir(target):
+            os.rename(target, old_root)
+        os.rename(tmp_root, target)
+        shutil.rmtree(old_root, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        raise
+    return root
+
+def store_source_version(root):
+    """
+    Return the data_version of the CSV a store was converted from.
+
+    Parameters:
+    - root: Store directory
+
+    Returns:
+    - str or None: Version recorded by convert_csv_to_store; None if the store is
+      missing or was not converted from a CSV
+    """
+    try:
+        with open(os.path.join(root, SOURCE_VERSION_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def _date_filter(start_date, end_date):
+    """Build an Arrow filter on purchase_date plus the matching partition filter."""
+    expr = None
+    if start_date is not None:
+        expr = ((ds.field(PARTITION_COLUMN) >= _month_key(start_date)) &
+                (ds.field('purchase_date') >= pd.Timestamp(start_date).to_pydatetime()))
+    if end_date is not None:
+        upper = ((ds.field(PARTITION_COLUMN) <= _month_key(end_date)) &
+                 (ds.field('purchase_date') <= pd.Timestamp(end_date).to_pydatetime()))
+        expr = upper if expr is None else expr & upper
+    return expr
+
+def open_transaction_store(root, memory_map=True):
+    """
+    Open a Parquet transaction store as an Arrow dataset.
+
+    Parameters:
+    - root: Store directory
+    - memory_map: Memory-map the Parquet files instead of buffered reads
+
+    Returns:
+    - pyarrow.dataset.Dataset: Partitioned dataset
+    """
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING,
+                      filesystem=pafs.LocalFileSystem(use_mmap=memory_map))
+
+# Columns that can be read as pandas categoricals instead of one string object per row
+ID_COLUMNS = ['customer_id', 'product_id']
+
+def load_transaction_store(root, columns=None, start_date=None, end_date=None, memory_map=True,
+                           categorical_ids=False):
+    """
+    Load transactions from a Parquet store, reading only what is needed.
+
+    Month partitions outside [start_date, end_date] are skipped without being
+    opened, and only the requested columns are decoded.
+
+    Parameters:
+    - root: Store directory
+    - columns: Columns to read (default: all transaction columns)
+    - start_date: Earliest purchase_date to include (inclusive)
+    - end_date: Latest purchase_date to include (inclusive)
+    - memory_map: Memory-map the Parquet files
+    - categorical_ids: Read customer_id and product_id as categoricals
+
+    Returns:
+    - pd.DataFrame: Transactions
+    """
+    dataset = open_transaction_store(root, memory_map=memory_map)
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != PARTITION_COLUMN]
+    table = dataset.to_table(columns=list(columns), filter=_date_filter(start_date, end_date))
+    if categorical_ids:
+        for name in ID_COLUMNS:
+            if name in table.column_names:
+                i = table.column_names.index(name)
+                table = table.set_column(i, name, table.column(i).dictionary_encode())
+    return table.to_pandas()
+
+def load_transactions(filepath, columns=None, start_date=None, end_date=None, categorical_ids=False):
+    """
+    Load transactions from either a Parquet store directory or a CSV file.
+
+    Parameters:
+    - filepath: Store directory or CSV path
+    - columns: Columns to read (default: all)
+    - start_date: Earliest purchase_date to include (inclusive)
+    - end_date: Latest purchase_date to include (inclusive)
+    - categorical_ids: Read customer_id and product_id as categoricals
+
+    Returns:
+    - pd.DataFrame: Transactions
+    """
+    if os.path.isdir(filepath):
+        return load_transaction_store(filepath, columns=columns, start_date=start_date, end_date=end_date,
+                                      categorical_ids=categorical_ids)
+
+    dtype = {name: 'category' for name in ID_COLUMNS} if categorical_ids else None
+    df = pd.read_csv(filepath, usecols=columns, parse_dates=['purchase_date'], dtype=dtype)
+    if start_date is not None:
+        df = df[df['purchase_date'] >= start_date]
+    if end_date is not None:
+        df = df[df['purchase_date'] <= end_date]
+    return df
+
+def iter_transactions(filepath, columns=None, start_date=None, end_date=None, chunk_size=1_000_000):
+    """
+    Yield transactions from a Parquet store or CSV file in chunks, never loading the whole history.
+
+    Parameters:
+    - filepath: Store directory or CSV path
+    - columns: Columns to read (default: all)
+    - start_date: Earliest purchase_date to include (inclusive)
+    - end_date: Latest purchase_date to include (inclusive)
+    - chunk_size: Maximum rows per chunk
+
+    Yields:
+    - pd.DataFrame: Up to chunk_size transactions
+    """
+    if os.path.isdir(filepath):
+        dataset = open_transaction_store(filepath)
+        if columns is None:
+            columns = [name for name in dataset.schema.names if name != PARTITION_COLUMN]
+        # Scans yield a batch per file or row group, often far smaller than chunk_size;
+        # they are gathered up to chunk_size rows so per-chunk work is amortized
+        pending, pending_rows = [], 0
+        for batch in dataset.to_batches(columns=list(columns), filter=_date_filter(start_date, end_date),
+                                        batch_size=chunk_size):
+            if pending_rows + batch.num_rows > chunk_size and pending:
+                yield pa.Table.from_batches(pending).to_pandas()
+                pending, pending_rows = [], 0
+            if batch.num_rows:
+                pending.append(batch)
+                pending_rows += batch.num_rows
+        if pending:
+            yield pa.Table.from_batches(pending).to_pandas()
+        return
+
+    for chunk in pd.read_csv(filepath, usecols=columns, parse_dates=['purchase_date'], chunksize=chunk_size):
+        if start_date is not None:
+            chunk = chunk[chunk['purchase_date'] >= start_date]
+        if end_date is not None:
+            chunk = chunk[chunk['purchase_date'] <= end_date]
+        if not chunk.empty:
+            yield chunk
+
+def data_version(filepath):
+    """
+    Return an identifier that changes whenever the transaction data changes.
+
+    Built from file count, sizes and modification times, so no data is read.
+
+    Parameters:
+    - filepath: Store directory or CSV path
+
+    Returns:
+    - str: Data version
+    """
+    if os.path.isdir(filepath):
+        stats = [os.stat(os.path.join(root, name)) for root, _, names in os.walk(filepath) for name in names]
+    else:
+        stats = [os.stat(filepath)]
+    return f"{len(stats)}-{sum(st.st_size for st in stats)}-{max((st.st_mtime_ns for st in stats), default=0)}"
+
+def store_path_for(csv_path):
+    """Return the Parquet store directory that sits next to a transactions CSV."""
+    return os.path.splitext(csv_path)[0]
+
+if __name__ == "__main__":
+    # Convert the default CSV into a monthly-partitioned Parquet store
+    csv_path = 'harvestiq/data/transactions.csv'
+    convert_csv_to_store(csv_path, store_path_for(csv_path))
+    print(f"Transaction store written to {store_path_for(csv_path)}")
@@ -0,0 +1,199 @@
+import json
+import os
+import numpy as np
+
+MODEL_NAMES = ['classifier_7d', 'classifier_14d', 'regressor']
+ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+class CompiledForest:
+    """
+    A fitted scikit-learn random forest flattened into contiguous NumPy arrays.
+
+    All trees share one node table. Leaves point to themselves as both
+    children, so a batch walks every tree at once with a fixed number of
+    vectorized steps and no per-tree Python calls.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, feature_names):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.feature_names = list(feature_names)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """
+        Flatten a fitted RandomForestClassifier or RandomForestRegressor.
+
+        Classifier leaves store the positive-class probability, regressor leaves
+        the predicted value, so predict() matches predict_proba(X)[:, 1] or
+        predict(X) respectively.
+
+        Parameters:
+        - forest: Fitted forest
+
+        Returns:
+        - CompiledForest: Flattened forest
+        """
+        is_classifier = hasattr(forest, 'classes_')
+        if is_classifier:
+            positive = list(forest.classes_).index(1) if 1 in forest.classes_ else None
+
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            left.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            right.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+            if not is_classifier:
+                value.append(tree.value[:, 0, 0])
+            elif positive is None:
+                value.append(np.zeros(tree.node_count))
+            else:
+                counts = tree.value[:, 0, :]
+                value.append(counts[:, positive] / counts.sum(axis=1))
+            offset += tree.node_count
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            value=np.concatenate(value).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max(estimator.tree_.max_depth for estimator in forest.estimators_),
+            feature_names=forest.feature_names_in_
+        )
+
+    def predict(self, X):
+        """
+        Evaluate every tree on a batch and average the leaf values.
+
+        Parameters:
+        - X: DataFrame with feature_names columns, or a 2-D array in that order
+
+        Returns:
+        - np.ndarray: One prediction per row
+        """
+        if hasattr(X, 'columns'):
+            X = feature_matrix(X, self.feature_names)
+        # scikit-learn compares float32 features with float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            next_node = np.where(go_left, self.left[node], self.right[node])
+            if np.array_equal(next_node, node):
+                break  # Every row has reached a leaf in every tree
+            node = next_node
+
+        return self.value[node].mean(axis=1)
+
+    def save(self, path):
+        """
+        Export the arrays as .npy files so they can be memory-mapped on load.
+
+        Parameters:
+        - path: Directory to write to
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'max_depth': int(self.max_depth), 'feature_names': self.feature_names}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a forest exported with save().
+
+        Parameters:
+        - path: Directory written by save()
+        - mmap_mode: np.load memory-map mode (None reads into memory)
+
+        Returns:
+        - CompiledForest: Loaded forest
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(max_depth=meta['max_depth'], feature_names=meta['feature_names'], **arrays)
+
+def feature_matrix(features_df, feature_names):
+    """
+    Stack the model's feature columns into a float32 matrix, column by column.
+
+    Parameters:
+    - features_df: DataFrame with features
+    - feature_names: Columns in model order
+
+    Returns:
+    - np.ndarray: (rows, features) float32 matrix
+    """
+    X = np.empty((len(features_df), len(feature_names)), dtype=np.float32)
+    for j, name in enumerate(feature_names):
+        X[:, j] = features_df[name].to_numpy()
+    return X
+
+def is_compilable(models):
+    """
+    Whether every model of a HarvestIQModels instance is a forest CompiledForest can flatten.
+
+    Parameters:
+    - models: HarvestIQModels
+
+    Returns:
+    - bool: True for random forests, False for other backends
+    """
+    return all(hasattr(getattr(models, name), 'estimators_')
+               and all(hasattr(estimator, 'tree_') for estimator in getattr(models, name).estimators_)
+               for name in MODEL_NAMES)
+
+def compile_models(models):
+    """
+    Flatten the three forests of a HarvestIQModels instance.
+
+    Parameters:
+    - models: Trained HarvestIQModels
+
+    Returns:
+    - dict: Model name -> CompiledForest
+    """
+    return {name: CompiledForest.from_sklearn(getattr(models, name)) for name in MODEL_NAMES}
+
+def save_compiled(compiled, path):
+    """
+    Export compiled forests under path/compiled/<model name>/.
+
+    Parameters:
+    - compiled: Dict returned by compile_models
+    - path: Models directory
+    """
+    for name, forest in compiled.items():
+        forest.save(os.path.join(path, 'compiled', name))
+
+def load_compiled(path):
+    """
+    Load compiled forests exported with save_compiled, if present.
+
+    Parameters:
+    - path: Models directory
+
+    Returns:
+    - dict or None: Model name -> CompiledForest
+    """
+    if not all(os.path.isdir(os.path.join(path, 'compiled', name)) for name in MODEL_NAMES):
+        return None
+    return {name: CompiledForest.load(os.path.join(path, 'compiled', name)) for name in MODEL_NAMES}
@@ -0,0 +1,4 @@
+import sys
+import os
+# Tests import the pipeline as `src`, like the Django app does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.cooccurrence import BASKET_COLUMNS, CooccurrenceIndex, load_or_build_index
+from src.generate_data import generate_dummy_data
+
+@pytest.fixture(scope='module')
+def transactions():
+    return generate_dummy_data(num_customers=100, num_products=20, num_transactions=4000)[BASKET_COLUMNS]
+
+def assert_same_index(result, expected):
+    order = expected.products.get_indexer(result.products)
+    assert (order >= 0).all() and len(order) == len(expected.products)
+    np.testing.assert_array_equal(result.basket_counts, expected.basket_counts[order])
+    np.testing.assert_array_equal(result.counts.toarray(), expected.counts.toarray()[np.ix_(order, order)])
+    assert result.watermark == expected.watermark
+
+def test_persisted_index_is_updated_past_its_watermark(transactions, tmp_path):
+    csv_path, index_path = str(tmp_path / 'transactions.csv'), str(tmp_path / 'cooccurrence')
+    transactions.to_csv(csv_path, index=False)
+    end_date = pd.Timestamp('2024-11-01')
+    CooccurrenceIndex.from_transactions(transactions[transactions['purchase_date'] <= '2024-06-30']).save(index_path)
+
+    result = load_or_build_index(csv_path, end_date, index_path)
+    assert_same_index(result, CooccurrenceIndex.from_transactions(
+        transactions[transactions['purchase_date'] <= end_date]))
+
+def test_late_rows_of_the_watermark_day_are_counted_once(transactions, tmp_path):
+    csv_path, index_path = str(tmp_path / 'transactions.csv'), str(tmp_path / 'cooccurrence')
+    transactions.to_csv(csv_path, index=False)
+    df = pd.read_csv(csv_path, parse_dates=['purchase_date'])
+    last_day = df['purchase_date'].dt.normalize().iloc[len(df) // 2]
+    on_last_day = (df['purchase_date'].dt.normalize() == last_day).to_numpy()
+    # Half of the day's rows are in the persisted index; the rest, and a repeat of the first half, come later
+    half_day = on_last_day & (on_last_day.cumsum() <= on_last_day.sum() // 2)
+    CooccurrenceIndex.from_transactions(df[(df['purchase_date'] < last_day) | half_day]).save(index_path)
+
+    result = CooccurrenceIndex.load(index_path).update_from(csv_path)
+    assert_same_index(result, CooccurrenceIndex.from_transactions(df))
+
+def test_index_past_end_date_is_rebuilt(transactions, tmp_path):
+    csv_path, index_path = str(tmp_path / 'transactions.csv'), str(tmp_path / 'cooccurrence')
+    transactions.to_csv(csv_path, index=False)
+    CooccurrenceIndex.from_transactions(transactions).save(index_path)
+
+    end_date = pd.Timestamp('2024-06-30')
+    result = load_or_build_index(csv_path, end_date, index_path)
+    assert_same_index(result, CooccurrenceIndex.from_transactions(
+        transactions[transactions['purchase_date'] <= end_date]))
+
+def test_build_without_persisted_index(transactions, tmp_path):
+    csv_path = str(tmp_path / 'transactions.csv')
+    transactions.to_csv(csv_path, index=False)
+    result = load_or_build_index(csv_path, index_path=str(tmp_path / 'missing'))
+    assert_same_index(result, CooccurrenceIndex.from_transactions(transactions))
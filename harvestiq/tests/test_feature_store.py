@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+from src.feature_store import FeatureStore
+from src.generate_data import generate_dummy_data
+from src.preprocessing import feature_engineering, load_data
+
+@pytest.fixture(scope='module')
+def transactions_csv(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('data') / 'transactions.csv')
+    generate_dummy_data(num_customers=100, num_products=20, num_transactions=4000).to_csv(path, index=False)
+    return path
+
+def assert_matches_feature_engineering(store, df, prediction_date):
+    result = store.to_features(prediction_date).sort_values(['customer_id', 'product_id'], ignore_index=True)
+    expected = feature_engineering(df, prediction_date).sort_values(['customer_id', 'product_id'], ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected[result.columns], check_dtype=False)
+
+def test_update_includes_late_rows_of_the_watermark_day(transactions_csv, tmp_path):
+    df = load_data(transactions_csv)
+    last_day = df['purchase_date'].dt.normalize().iloc[len(df) // 2]
+    on_last_day = (df['purchase_date'].dt.normalize() == last_day).to_numpy()
+    # The first half of the day's rows are in when the store is built, the rest arrive later
+    half_day = on_last_day & (on_last_day.cumsum() <= on_last_day.sum() // 2)
+    FeatureStore.from_transactions(df[(df['purchase_date'] < last_day) | half_day]).save(str(tmp_path / 'store'))
+
+    store = FeatureStore.load(str(tmp_path / 'store')).update_from(transactions_csv)
+    assert_matches_feature_engineering(store, df, df['purchase_date'].max())
+
+def test_update_moves_past_the_watermark_day(transactions_csv):
+    df = load_data(transactions_csv)
+    cutoff = df['purchase_date'].iloc[len(df) // 3]
+    store = FeatureStore.from_transactions(df[df['purchase_date'] <= cutoff]).update_from(transactions_csv)
+    assert store.watermark == df['purchase_date'].max()
+    assert_matches_feature_engineering(store, df, df['purchase_date'].max())
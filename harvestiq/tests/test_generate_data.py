@@ -0,0 +1,11 @@
+import pytest
+from src.generate_data import iter_dummy_data_chunks, seasonal_day_weights
+
+@pytest.mark.parametrize('seasonality', [-0.1, 1.5])
+def test_seasonality_outside_unit_range_is_rejected(seasonality):
+    with pytest.raises(ValueError):
+        next(iter_dummy_data_chunks(num_transactions=100, seasonality=seasonality))
+
+def test_full_seasonality_keeps_weights_non_negative():
+    weights = seasonal_day_weights('2023-01-01', 730, amplitude=1.0)
+    assert (weights >= 0).all()
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+from src.generate_data import generate_dummy_data
+from src.parallel_features import parallel_feature_engineering, parallel_horizon_labels
+from src.preprocessing import create_horizon_labels, feature_engineering
+
+PREDICTION_DATE = pd.Timestamp('2024-11-01')
+
+@pytest.fixture(scope='module')
+def transactions():
+    df = generate_dummy_data(num_customers=200, num_products=30, num_transactions=5000)
+    # The sharded path runs on compact transactions, whose day numbers decode to nanosecond dates
+    return df.astype({'purchase_date': 'datetime64[ns]'})
+
+def test_parallel_features_match_feature_engineering(transactions):
+    expected = feature_engineering(transactions, PREDICTION_DATE)
+    result = parallel_feature_engineering(transactions, PREDICTION_DATE, n_workers=2, n_shards=8)
+    pd.testing.assert_frame_equal(result, expected)
+
+@pytest.mark.parametrize('horizons', [(7, 14), (1,)])
+def test_parallel_labels_with_empty_shards(transactions, horizons):
+    # With 64 shards and a one-day window most shards have no label rows
+    features = feature_engineering(transactions, PREDICTION_DATE)
+    expected = create_horizon_labels(transactions, features, PREDICTION_DATE, horizons)
+    result = parallel_horizon_labels(transactions, PREDICTION_DATE, horizons, n_workers=2, n_shards=64)
+    for horizon in horizons:
+        pd.testing.assert_frame_equal(result[horizon], expected[horizon])
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.generate_data import generate_dummy_data
+from src.preprocessing import create_horizon_labels, create_labels, feature_engineering, horizon_label_table
+
+PREDICTION_DATE = pd.Timestamp('2024-11-01')
+
+@pytest.fixture(scope='module')
+def transactions():
+    return generate_dummy_data(num_customers=200, num_products=30, num_transactions=5000)
+
+def reference_feature_engineering(df, prediction_date):
+    """feature_engineering as it was before vectorization, with per-group lambdas."""
+    historical_df = df[df['purchase_date'] <= prediction_date].copy()
+    historical_df = historical_df.sort_values(['customer_id', 'purchase_date'])
+
+    customer_features = historical_df.groupby('customer_id').agg(
+        total_purchases=('quantity', 'sum'),
+        avg_quantity=('quantity', 'mean'),
+        num_unique_products=('product_id', 'nunique'),
+        last_purchase_date=('purchase_date', 'max'),
+        recency_days=('purchase_date', lambda x: (prediction_date - x.max()).days)
+    ).reset_index()
+
+    product_features = historical_df.groupby('product_id').agg(
+        product_total_sales=('quantity', 'sum'),
+        product_avg_price=('price', 'mean'),
+        product_surplus_ratio=('surplus_flag', 'mean')
+    ).reset_index()
+
+    interaction_features = historical_df.groupby(['customer_id', 'product_id']).agg(
+        cp_total_purchases=('quantity', 'sum'),
+        cp_avg_quantity=('quantity', 'mean'),
+        cp_purchase_count=('quantity', 'count'),
+        cp_last_purchase_date=('purchase_date', 'max'),
+        cp_recency_days=('purchase_date', lambda x: (prediction_date - x.max()).days),
+        cp_days_since_first=('purchase_date', lambda x: (x.max() - x.min()).days if len(x) > 1 else 0),
+        cp_avg_interval=('purchase_date', lambda x: np.mean(np.diff(sorted(x))) if len(x) > 1 else 0)
+    ).reset_index()
+    interaction_features['cp_last_month'] = interaction_features['cp_last_purchase_date'].dt.month
+
+    features = interaction_features.merge(customer_features, on='customer_id', how='left')
+    features = features.merge(product_features, on='product_id', how='left')
+    return features.fillna(0)
+
+def test_feature_engineering_matches_reference(transactions):
+    expected = reference_feature_engineering(transactions, PREDICTION_DATE)
+    result = feature_engineering(transactions, PREDICTION_DATE)
+
+    # The lambda returned Timedelta intervals (0 for single purchases); the vectorized version returns days
+    intervals = expected['cp_avg_interval']
+    assert (intervals[expected['cp_purchase_count'] == 1] == 0).all()
+    expected['cp_avg_interval'] = [pd.Timedelta(value) / pd.Timedelta(days=1) if value != 0 else 0.0
+                                   for value in intervals]
+
+    single = result['cp_purchase_count'] == 1
+    assert single.any() and (~single).any()
+    assert (result.loc[single, 'cp_avg_interval'] == 0).all()
+    pd.testing.assert_frame_equal(result, expected)
+
+@pytest.mark.parametrize('prediction_date', ['2024-12-31', '2025-02-01'])
+def test_horizon_labels_empty_window(transactions, prediction_date):
+    # The generated data ends on 2024-12-30, so the label window holds no purchases
+    prediction_date = pd.Timestamp(prediction_date)
+    labels = horizon_label_table(transactions, prediction_date, (7, 14))
+    assert labels.empty
+    assert list(labels.columns) == ['customer_id', 'product_id', 'future_quantity_7d', 'future_purchases_7d',
+                                    'future_quantity_14d', 'future_purchases_14d']
+
+    features = feature_engineering(transactions, prediction_date)
+    labeled = create_horizon_labels(transactions, features, prediction_date, (7, 14))
+    for horizon in (7, 14):
+        expected = create_labels(transactions, features, prediction_date, horizon)
+        assert (labeled[horizon]['will_buy'] == 0).all()
+        pd.testing.assert_frame_equal(labeled[horizon], expected)
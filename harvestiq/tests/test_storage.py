@@ -0,0 +1,23 @@
+import os
+from src.generate_data import generate_dummy_data
+from src.storage import convert_csv_to_store, data_version, load_transaction_store, store_source_version
+
+def test_reconverting_replaces_every_month(tmp_path):
+    df = generate_dummy_data(num_customers=50, num_products=10, num_transactions=3000).sort_values('purchase_date')
+    csv_path, root = str(tmp_path / 'transactions.csv'), str(tmp_path / 'transactions')
+    df.to_csv(csv_path, index=False)
+
+    # Date-sorted chunks: each month after the first chunk is written by a later chunk
+    convert_csv_to_store(csv_path, root, chunksize=500)
+    convert_csv_to_store(csv_path, root, chunksize=500)
+    assert len(load_transaction_store(root)) == len(df)
+    assert store_source_version(root) == data_version(csv_path)
+
+    df.iloc[:1000].to_csv(csv_path, index=False)
+    assert store_source_version(root) != data_version(csv_path)
+    convert_csv_to_store(csv_path, root, chunksize=500)
+    assert len(load_transaction_store(root)) == 1000
+    assert sorted(os.listdir(tmp_path)) == ['transactions', 'transactions.csv']
+
+def test_store_source_version_missing(tmp_path):
+    assert store_source_version(str(tmp_path / 'missing')) is None